@@ -1,17 +1,62 @@
-from fastapi import APIRouter, Request # Import Request
-from app.services.chat_bot_route import chat_bot_route
-from app.models.chat_bot_model import ChatBotRequest, ChatBotResponse
-from slowapi import Limiter
-from slowapi.util import get_remote_address
+from fastapi import APIRouter, Depends, Request # Import Request
+from fastapi.responses import StreamingResponse
+from app.services.chat_bot_route import chat_bot_route, chat_bot_batch, chat_bot_stream, FAQ_SERVICE
+from app.models.chat_bot_model import ChatBotRequest, ChatBotResponse, ChatBotBatchRequest, ChatBotBatchResponse
+from app.services.answer_cache import answer_cache
+from app.services.product_engine import product_engine
+from app.services.product_search import product_search
+from app.services.sql_query import FAST_PATH_STATS, SQL_PLAN_CACHE, SQL_RESULT_CACHE
+from app.services.llm_gateway import llm_gateway
+from app.core.config import metrics_config, rate_limit_config
+from app.core.metrics import request_trace
+from app.core.rate_limit import rate_limited
 
-# This assumes you want a local limiter or import it from your main app
-limiter = Limiter(key_func=get_remote_address)
 router = APIRouter()
 
-@router.post("/chat", response_model=ChatBotResponse)
-# 1. Add the @limiter.limit decorator ("5 per minute", etc)
-@limiter.limit("5/minute")
-# 2. Ensure 'request: Request' is an argument
+def wants_trace(request: Request) -> bool:
+    header = metrics_config.METRICS_DEBUG_HEADER
+    return bool(header) and request.headers.get(header, "").lower() in ("1", "true", "yes")
+
+@router.post("/chat", response_model=ChatBotResponse, response_model_exclude_none=True,
+             # Limit per client IP ("5 per minute", etc)
+             dependencies=[Depends(rate_limited(rate_limit_config.RATE_LIMIT_CHAT))])
 async def chat_bot_endpoint(request: Request, chat_request: ChatBotRequest):
-    answer = chat_bot_route(chat_request)
-    return ChatBotResponse(answer=answer)
\ No newline at end of file
+    with request_trace("chat") as trace:
+        answer = await chat_bot_route(chat_request)
+    return ChatBotResponse(answer=answer, debug=trace.summary() if wants_trace(request) else None)
+
+@router.post("/chat/batch", response_model=ChatBotBatchResponse,
+             dependencies=[Depends(rate_limited(rate_limit_config.RATE_LIMIT_BATCH))])
+async def chat_bot_batch_endpoint(request: Request, batch_request: ChatBotBatchRequest):
+    """Answer many questions (bulk/offline evaluation) with a bounded fan-out."""
+    answers, routes = await chat_bot_batch(batch_request.requests, batch_request.concurrency)
+    return ChatBotBatchResponse(answers=answers, routes=routes)
+
+@router.post("/chat/stream", dependencies=[Depends(rate_limited(rate_limit_config.RATE_LIMIT_CHAT))])
+async def chat_bot_stream_endpoint(request: Request, chat_request: ChatBotRequest):
+    """Server-Sent Events variant of /chat: route, then answer tokens, then done."""
+    return StreamingResponse(
+        chat_bot_stream(chat_request, debug=wants_trace(request)),
+        media_type="text/event-stream",
+        # Disable proxy buffering so tokens reach the client as they are produced
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+@router.get("/chat/cache")
+async def cache_stats():
+    """Hit/miss counters of the semantic answer cache, the FAQ retrieval cache, the SQL fast path, plan and
+    result caches, the in-memory product engine and the product search."""
+    return {
+        "answer_cache": answer_cache.stats() if answer_cache is not None else {"enabled": False},
+        "faq_retrieval": FAQ_SERVICE.value.cache_stats() if FAQ_SERVICE.ready else {"ready": False},
+        "sql_fast_path": FAST_PATH_STATS.stats(),
+        "sql_plan_cache": SQL_PLAN_CACHE.stats() if SQL_PLAN_CACHE is not None else {"enabled": False},
+        "sql_result_cache": SQL_RESULT_CACHE.stats() if SQL_RESULT_CACHE is not None else {"enabled": False},
+        "product_engine": product_engine.stats() if product_engine is not None else {"enabled": False},
+        "product_search": product_search.stats() if product_search is not None else {"enabled": False},
+    }
+
+@router.get("/chat/llm")
+async def llm_stats():
+    """Per model and purpose: call/retry/timeout/hedge counters and latency histograms of the LLM gateway."""
+    return llm_gateway.stats()
@@ -1,3 +1,4 @@
+from typing import Literal
 from dotenv import load_dotenv
 from pydantic_settings import BaseSettings
 
@@ -20,7 +21,157 @@ class GroqConfig(BaseSettings):
 class GoogleConfig(BaseSettings):
     GOOGLE_API_KEY: str | None = None
 
+class FaqConfig(BaseSettings):
+    # "local" = in-process NumPy index over FastEmbed vectors, "chroma" = Chroma Cloud,
+    # "auto" = local unless the corpus has more than FAQ_LOCAL_MAX_ROWS rows
+    FAQ_BACKEND: Literal["auto", "local", "chroma"] = "auto"
+    FAQ_LOCAL_MAX_ROWS: int = 50_000
+    FAQ_INDEX_DIR: str | None = None  # persist local FAQ vectors here (memory-mapped on load)
+    FAQ_CACHE_SIZE: int = 1024  # cached top-k result sets
+    FAQ_CACHE_TTL_SECONDS: int = 60 * 60
+    FAQ_EMBEDDING_CACHE_SIZE: int = 4096  # cached query embeddings (no TTL)
+    # Sync the collection with the FAQ file at startup; off = run `python -m app.services.faq_ingest` instead
+    FAQ_INGEST_ON_STARTUP: bool = True
+    FAQ_INGEST_BATCH_SIZE: int = 256  # rows per embedding call
+    FAQ_INGEST_CONCURRENCY: int = 4  # embedding calls in flight
+
+class RouterConfig(BaseSettings):
+    # Persisted route embeddings (memory-mapped on boot); unset = re-encode every utterance at startup
+    ROUTER_INDEX_DIR: str | None = ".cache/router_index"
+    # Trained intent classifier (app.services.intent_classifier); unset or missing = ambiguous queries go to the LLM
+    ROUTER_CLASSIFIER_DIR: str | None = ".cache/intent_classifier"
+    # Below this probability the classifier defers to the LLM router
+    ROUTER_CLASSIFIER_MIN_CONFIDENCE: float = 0.9
+
+class CheckpointConfig(BaseSettings):
+    # "memory" keeps threads in a bounded in-process store, "sqlite" shares them between the workers
+    # of one host (a file), "postgres" shares them across machines
+    CHECKPOINTER: Literal["memory", "sqlite", "postgres"] = "memory"
+    CHECKPOINT_DATABASE_URL: str | None = None  # defaults to DATABASE_URL
+    CHECKPOINT_SQLITE_PATH: str = ".cache/checkpoints.sqlite"
+    CHECKPOINT_POOL_MIN_SIZE: int = 1
+    CHECKPOINT_POOL_MAX_SIZE: int = 10
+    CHECKPOINT_MAX_THREADS: int = 10_000
+    CHECKPOINT_TTL_SECONDS: int = 24 * 60 * 60
+    CHECKPOINT_MAX_THREAD_BYTES: int = 256_000
+
+class ContextConfig(BaseSettings):
+    # Fold turns that fall out of every node's history window into a running summary
+    CONTEXT_SUMMARY_ENABLED: bool = False
+    # Number of pending turns to batch into one summary update
+    CONTEXT_SUMMARY_BATCH_TURNS: int = 2
+
+class AnswerCacheConfig(BaseSettings):
+    ANSWER_CACHE_ENABLED: bool = True
+    # Only these routes are cached, and only on a thread's first turn; follow-ups always run the graph
+    ANSWER_CACHE_ROUTES: list[str] = ["faq", "small_talk"]
+    ANSWER_CACHE_THRESHOLD: float = 0.92  # cosine similarity needed for a hit
+    ANSWER_CACHE_CAPACITY: int = 2048  # in-process LRU tier
+    ANSWER_CACHE_TTL_SECONDS: int = 6 * 60 * 60
+    # Optional shared tier (Postgres table) synced into the local tier
+    ANSWER_CACHE_SHARED: bool = False
+    ANSWER_CACHE_SYNC_SECONDS: int = 30
+
+class SqlConfig(BaseSettings):
+    # Rule-based SQL for templated product questions; the LLM writes SQL for everything else
+    SQL_FAST_PATH_ENABLED: bool = True
+    # Share of the question the extracted slots must explain (1.0 = no unknown words)
+    SQL_FAST_PATH_MIN_CONFIDENCE: float = 1.0
+    SQL_BRANDS_TTL_SECONDS: int = 60 * 60  # refresh of the catalog brand list
+    # Reuse LLM-generated SQL for equivalent questions (numbers are rebound as parameters)
+    SQL_PLAN_CACHE_ENABLED: bool = True
+    SQL_PLAN_CACHE_CAPACITY: int = 512
+    SQL_PLAN_CACHE_THRESHOLD: float = 0.95  # cosine similarity of the number-masked questions
+    # Guardrail applied to every product query before it reaches the database
+    SQL_MAX_ROWS: int = 50  # LIMIT enforced on each query
+    SQL_RESULT_ROWS: int = 20  # rows streamed for the answer summary; the cursor is closed after these
+    SQL_RESULT_TOKEN_BUDGET: int = 500  # of those rows, as many as fit this many prompt tokens are summarized
+    SQL_STATEMENT_TIMEOUT_MS: int = 3000
+    # Create the catalog search indexes in the background at startup (else: python -m app.db.product_indexes)
+    SQL_INDEX_BOOTSTRAP: bool = False
+    # Answer fast-path queries from an in-memory columnar copy of the catalog instead of Postgres
+    SQL_PRODUCT_ENGINE_ENABLED: bool = False
+    SQL_PRODUCT_ENGINE_REFRESH_SECONDS: int = 60  # how often the catalog version is checked for loader refreshes
+    # Hybrid search for product questions the fast path does not understand: title embeddings
+    # (python -m app.services.product_search) fused with full-text and trigram matches under the fast-path filters
+    SQL_PRODUCT_SEARCH_ENABLED: bool = False
+    SQL_PRODUCT_SEARCH_INDEX_DIR: str = ".cache/product_index"
+    SQL_PRODUCT_SEARCH_CANDIDATES: int = 100  # vector candidates, and lexical candidates, before fusion
+    SQL_PRODUCT_SEARCH_MIN_SIMILARITY: float = 0.6  # cosine floor of vector candidates
+    SQL_PRODUCT_SEARCH_PROBES: int = 32  # title clusters scanned per search on large catalogs (more: better recall)
+    SQL_PRODUCT_SEARCH_BATCH_SIZE: int = 256  # titles per embedding call when the index is synced
+    SQL_PRODUCT_SEARCH_RELOAD_SECONDS: int = 60  # how often workers check for a newly synced index
+    # Results of identical product queries (normalized SQL + parameters), dropped when the catalog version moves
+    SQL_RESULT_CACHE_ENABLED: bool = True
+    SQL_RESULT_CACHE_CAPACITY: int = 2048  # entries
+    SQL_RESULT_CACHE_MAX_BYTES: int = 32 * 2**20  # estimated size of all entries
+    SQL_RESULT_CACHE_TTL_SECONDS: int = 5 * 60  # bounds staleness for catalog edits made outside the loader
+    SQL_RESULT_CACHE_VERSION_CHECK_SECONDS: float = 5.0  # how often the catalog version is re-read
+
+class BatchConfig(BaseSettings):
+    CHAT_BATCH_MAX_SIZE: int = 1000  # questions per /chat/batch request
+    CHAT_BATCH_CONCURRENCY: int = 8  # graph runs in flight per batch
+
+class SpeculationConfig(BaseSettings):
+    # Start the LLM router with the semantic router and, when the semantic router is unsure,
+    # the retrieval/SQL step of the likely destinations; losing branches are cancelled
+    SPECULATIVE_ROUTING: bool = False
+    SPECULATIVE_MARGIN: float = 0.05  # top-2 route scores closer than this: prepare both destinations
+    SPECULATIVE_MAX_STARTS_PER_MINUTE: int = 120  # cost cap across all requests
+
+class LlmConfig(BaseSettings):
+    # Calls in flight per provider across the process; more wait for a slot
+    LLM_MAX_CONCURRENCY: dict[str, int] = {"groq": 16, "google_genai": 16}
+    LLM_POOL_CONNECTIONS: int = 32  # pooled HTTP connections per provider
+    LLM_TIMEOUT_SECONDS: float = 20.0  # per attempt
+    LLM_TURN_DEADLINE_SECONDS: float = 45.0  # all LLM calls of one chat turn, retries included
+    LLM_MAX_RETRIES: int = 2  # on timeouts, connection errors, 429 and 5xx
+    LLM_RETRY_BACKOFF_SECONDS: float = 0.5  # doubled per retry, with jitter
+    # Hedging: a second identical call after the model's recent p95 latency, first answer wins
+    LLM_HEDGE_ENABLED: bool = True
+    LLM_HEDGE_QUANTILE: float = 0.95
+    LLM_HEDGE_MIN_SAMPLES: int = 50  # observed calls before hedging starts
+    LLM_HEDGE_MAX_RATIO: float = 0.1  # hedges per call, to cap the extra spend
+
+class RateLimitConfig(BaseSettings):
+    # memory:// is per process; sqlite:///<file> is shared by one host's workers, postgresql://... by all machines
+    RATE_LIMIT_STORAGE_URI: str = "memory://"
+    RATE_LIMIT_CHAT: str = "5/minute"  # per client IP, /chat and /chat/stream
+    RATE_LIMIT_BATCH: str = "2/minute"
+
+class ServeConfig(BaseSettings):
+    # Worker processes of `python -m app.serve` (same variable uvicorn and gunicorn read)
+    WEB_CONCURRENCY: int = 1
+    # Import the app and its libraries once before forking, so workers share those pages copy-on-write
+    SERVE_PRELOAD: bool = True
+    # Boot failures in a row of one worker after which `python -m app.serve` stops instead of restarting it
+    SERVE_MAX_BOOT_FAILURES: int = 5
+
+class MetricsConfig(BaseSettings):
+    # Requests sending this header get the turn's trace (spans, route, caches, tokens) in the response; unset = never
+    METRICS_DEBUG_HEADER: str | None = "X-Debug-Trace"
+    # Log the trace of turns slower than this; unset = never
+    METRICS_SLOW_TRACE_MS: float | None = 5000
+
+class StartupConfig(BaseSettings):
+    # background = serve immediately and warm components concurrently (requests wait only on what they use)
+    # blocking = finish warming before accepting traffic, lazy = build each component on first use
+    STARTUP_WARMUP: Literal["background", "blocking", "lazy"] = "background"
+
 groq_config = GroqConfig()
 google_config = GoogleConfig()
 chroma_config = ChromaConfig()
+faq_config = FaqConfig()
+router_config = RouterConfig()
+checkpoint_config = CheckpointConfig()
+context_config = ContextConfig()
+answer_cache_config = AnswerCacheConfig()
+sql_config = SqlConfig()
+batch_config = BatchConfig()
+speculation_config = SpeculationConfig()
+llm_config = LlmConfig()
+rate_limit_config = RateLimitConfig()
+serve_config = ServeConfig()
+metrics_config = MetricsConfig()
+startup_config = StartupConfig()
 config = Config()
\ No newline at end of file
@@ -0,0 +1,27 @@
+"""Atomic writes of the index files that several worker processes share."""
+import contextlib
+import os
+import tempfile
+from pathlib import Path
+
+
+@contextlib.contextmanager
+def atomic_write(path, mode: str = "wb"):
+    """A file object for ``path`` that replaces it in one rename once the block completes.
+
+    The data goes to a temp file with a unique name in the same directory, so
+    workers persisting the same index at once never write into each other's
+    file, and a reader sees either the previous file or a complete new one.
+    """
+    path = Path(path)
+    fd, tmp = tempfile.mkstemp(dir=path.parent, prefix=f".{path.name}.", suffix=".tmp")
+    try:
+        with os.fdopen(fd, mode, **({} if "b" in mode else {"encoding": "utf-8"})) as f:
+            yield f
+        # mkstemp creates the file owner-only; an index built at image build time is read by another user
+        os.chmod(tmp, 0o644)
+        os.replace(tmp, path)
+    except BaseException:
+        with contextlib.suppress(FileNotFoundError):
+            os.unlink(tmp)
+        raise
@@ -0,0 +1,225 @@
+"""Per-request traces and Prometheus-style metrics.
+
+A chat turn runs inside ``request_trace()``. Below it, anywhere in the graph,
+the services, or the tasks and worker threads they start:
+
+- ``span(name)`` times a block;
+- ``annotate(...)`` records fields such as the route decision;
+- ``cache_result(cache, hit)`` records a cache outcome;
+- ``count_tokens(...)`` records LLM token usage.
+
+When the turn ends, its duration, spans, routes, cache outcomes and tokens go
+into process-wide histograms and counters. ``GET /metrics`` serves them in the
+Prometheus text format. Outside a trace, spans only feed the histograms.
+
+Metrics are per process: with several workers (``app.serve``) each scrape
+reaches one of them.
+"""
+import bisect
+import contextlib
+import contextvars
+import threading
+import time
+
+from app.core.config import metrics_config
+from app.core.logging import log_event
+
+BUCKETS_MS = (5, 10, 25, 50, 100, 250, 500, 750, 1000, 1500, 2000, 3000, 5000, 8000, 13000, 20000, 30000)
+
+_lock = threading.Lock()  # spans are also recorded from worker threads
+
+
+class Histogram:
+    def __init__(self, bounds: tuple = BUCKETS_MS):
+        self.bounds = bounds
+        self.buckets = [0] * (len(bounds) + 1)  # last bucket: above bounds[-1]
+        self.count = 0
+        self.sum = 0.0
+
+    def observe(self, value: float):
+        with _lock:
+            self.buckets[bisect.bisect_left(self.bounds, value)] += 1
+            self.count += 1
+            self.sum += value
+
+
+class Family:
+    """A metric name with one histogram or counter per label set."""
+
+    def __init__(self, name: str, kind: str, help: str):
+        self.name = name
+        self.kind = kind  # "histogram" or "counter"
+        self.help = help
+        self._children: dict[tuple, Histogram | list] = {}
+
+    def labels(self, **labels) -> Histogram:
+        key = tuple(sorted((k, str(v)) for k, v in labels.items()))
+        child = self._children.get(key)
+        if child is None:
+            with _lock:
+                child = self._children.setdefault(key, Histogram() if self.kind == "histogram" else [0])
+        return child
+
+    def inc(self, amount: float = 1, **labels):
+        counter = self.labels(**labels)
+        with _lock:
+            counter[0] += amount
+
+    def samples(self):
+        return [(dict(key), child if self.kind == "histogram" else child[0]) for key, child in self._children.items()]
+
+
+class Registry:
+    def __init__(self):
+        self._families: list[Family] = []
+        self._collectors = []
+
+    def histogram(self, name: str, help: str) -> Family:
+        family = Family(name, "histogram", help)
+        self._families.append(family)
+        return family
+
+    def counter(self, name: str, help: str) -> Family:
+        family = Family(name, "counter", help)
+        self._families.append(family)
+        return family
+
+    def collector(self, collect):
+        """Add metrics kept elsewhere: ``collect()`` yields ``(name, kind, help, [(labels, value), ...])``."""
+        self._collectors.append(collect)
+
+    def render(self) -> str:
+        families = [(f.name, f.kind, f.help, f.samples()) for f in self._families]
+        for collect in self._collectors:
+            families.extend(collect())
+        lines = []
+        for name, kind, help, samples in families:
+            lines += [f"# HELP {name} {help}", f"# TYPE {name} {kind}"]
+            for labels, value in samples:
+                if kind != "histogram":
+                    lines.append(f"{name}{_labels(labels)} {value}")
+                    continue
+                cumulative = 0
+                for bound, n in zip((*value.bounds, "+Inf"), value.buckets):
+                    cumulative += n
+                    lines.append(f"{name}_bucket{_labels({**labels, 'le': bound})} {cumulative}")
+                lines.append(f"{name}_sum{_labels(labels)} {round(value.sum, 3)}")
+                lines.append(f"{name}_count{_labels(labels)} {value.count}")
+        return "\n".join(lines) + "\n"
+
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _labels(labels: dict) -> str:
+    if not labels:
+        return ""
+    return "{" + ",".join(f'{k}="{_escape(v)}"' for k, v in labels.items()) + "}"
+
+
+REGISTRY = Registry()
+REQUEST_MS = REGISTRY.histogram("chat_request_ms", "Chat turn latency in ms, by endpoint and route.")
+SPAN_MS = REGISTRY.histogram("chat_span_ms", "Latency of the steps of a chat turn in ms.")
+ROUTES = REGISTRY.counter("chat_route_total", "Route decisions, by route and the router that decided.")
+CACHE = REGISTRY.counter("chat_cache_total", "Cache lookups during chat turns, by cache and result.")
+TOKENS = REGISTRY.counter("chat_llm_tokens_total", "LLM tokens, by model, purpose and direction.")
+ERRORS = REGISTRY.counter("chat_errors_total", "Chat turns that failed, by endpoint.")
+
+
+class Trace:
+    """Spans, fields, cache outcomes and tokens of one chat turn."""
+
+    def __init__(self, endpoint: str):
+        self.endpoint = endpoint
+        self.started = time.perf_counter()
+        self.total_ms: float | None = None
+        self.spans: list[dict] = []
+        self.fields: dict = {}
+        self.caches: dict[str, bool] = {}
+        self.tokens: dict[str, dict] = {}
+
+    def summary(self) -> dict:
+        total_ms = self.total_ms if self.total_ms is not None else (time.perf_counter() - self.started) * 1000
+        return {
+            "total_ms": round(total_ms, 1),
+            **self.fields,
+            "spans": sorted(self.spans, key=lambda s: s["start_ms"]),
+            "cache": {cache: "hit" if hit else "miss" for cache, hit in self.caches.items()},
+            "tokens": self.tokens,
+        }
+
+    def finish(self):
+        self.total_ms = (time.perf_counter() - self.started) * 1000
+        route = self.fields.get("route")
+        REQUEST_MS.labels(endpoint=self.endpoint, route=route or "none").observe(self.total_ms)
+        if route is not None:
+            ROUTES.inc(route=route, source=self.fields.get("route_source"))
+        for cache, hit in self.caches.items():
+            CACHE.inc(cache=cache, result="hit" if hit else "miss")
+        if "error" in self.fields:
+            ERRORS.inc(endpoint=self.endpoint)
+        slow_ms = metrics_config.METRICS_SLOW_TRACE_MS
+        if slow_ms is not None and self.total_ms >= slow_ms:
+            log_event("request.slow", endpoint=self.endpoint, **self.summary())
+
+
+_trace: contextvars.ContextVar[Trace | None] = contextvars.ContextVar("request_trace", default=None)
+
+
+def current_trace() -> Trace | None:
+    return _trace.get()
+
+
+@contextlib.contextmanager
+def request_trace(endpoint: str):
+    trace = Trace(endpoint)
+    token = _trace.set(trace)
+    try:
+        yield trace
+    finally:
+        trace.finish()
+        # A streamed response's generator can be closed from another task, whose context never set the token
+        with contextlib.suppress(ValueError):
+            _trace.reset(token)
+
+
+@contextlib.contextmanager
+def span(name: str):
+    t0 = time.perf_counter()
+    try:
+        yield
+    finally:
+        ms = (time.perf_counter() - t0) * 1000
+        SPAN_MS.labels(span=name).observe(ms)
+        trace = _trace.get()
+        if trace is not None:
+            trace.spans.append({"name": name, "start_ms": round((t0 - trace.started) * 1000, 1), "ms": round(ms, 1)})
+
+
+def annotate(**fields):
+    trace = _trace.get()
+    if trace is not None:
+        trace.fields.update(fields)
+
+
+def cache_result(cache: str, hit: bool):
+    trace = _trace.get()
+    if trace is not None:
+        trace.caches[cache] = hit
+    else:
+        CACHE.inc(cache=cache, result="hit" if hit else "miss")
+
+
+def count_tokens(model: str, purpose: str, usage: dict | None):
+    """Add an LLM call's ``usage_metadata`` (``input_tokens``/``output_tokens``) to the counters and trace."""
+    if not usage:
+        return
+    input_tokens, output_tokens = usage.get("input_tokens", 0), usage.get("output_tokens", 0)
+    TOKENS.inc(input_tokens, model=model, purpose=purpose, direction="input")
+    TOKENS.inc(output_tokens, model=model, purpose=purpose, direction="output")
+    trace = _trace.get()
+    if trace is not None:
+        tokens = trace.tokens.setdefault(purpose, {"input": 0, "output": 0})
+        tokens["input"] += input_tokens
+        tokens["output"] += output_tokens
@@ -0,0 +1,145 @@
+"""The API rate limiter, with storage shared between workers.
+
+One ``Limiter`` for the whole app; routes apply their limit per client address
+with ``dependencies=[Depends(rate_limited(...))]``. Its counters live where
+``RATE_LIMIT_STORAGE_URI`` points:
+
+- ``memory://``: per process; with several workers each enforces its own limit;
+- ``sqlite:///path``: a file shared by the workers of one host;
+- ``postgresql://...``: a table shared by every machine.
+
+The SQL backends implement slowapi's default fixed-window strategy with one
+upsert per hit. The hit goes through the public ``limits`` API of the
+limiter (``limiter.limiter.hit``); slowapi's own route decorator would make
+it synchronously inside the async endpoint, putting the SQL round trip (or
+a SQLite lock wait) on the event loop, so a SQL-backed hit runs in a worker
+thread instead. If the storage errors or is unreachable, that hit counts
+against in-memory counters (per worker) instead of failing the request.
+"""
+import asyncio
+import random
+import time
+from urllib.parse import urlparse
+
+from fastapi import HTTPException, Request
+from limits import parse
+from limits.storage import MemoryStorage, Storage
+from limits.strategies import FixedWindowRateLimiter
+from slowapi import Limiter
+from slowapi.util import get_remote_address
+from sqlalchemy import create_engine, event, text
+from sqlalchemy.exc import SQLAlchemyError
+
+from app.core.config import rate_limit_config
+from app.core.logging import log_event
+
+TABLE = "api_rate_limits"
+# Seconds a SQLite hit waits for another worker's write lock. The wait is in a worker thread; giving up
+# sooner would send the hit to the per-worker fallback counters and let a client exceed the shared limit
+SQLITE_LOCK_TIMEOUT = 5
+
+
+class SqlStorage(Storage):
+    """Fixed-window counters in a SQL table (``limits`` storage backend)."""
+
+    STORAGE_SCHEME = ["sqlite", "postgresql", "postgresql+psycopg2"]
+
+    def __init__(self, uri: str, wrap_exceptions: bool = False, **options):
+        super().__init__(uri, wrap_exceptions=wrap_exceptions, **options)
+        sqlite = urlparse(uri).scheme == "sqlite"
+        # SQLite: workers briefly wait for each other's write lock instead of failing with "database is locked"
+        self._engine = create_engine(uri, pool_pre_ping=not sqlite,
+                                     connect_args={"timeout": SQLITE_LOCK_TIMEOUT} if sqlite else {})
+        if sqlite:
+            event.listen(self._engine, "connect", lambda conn, _: conn.execute("PRAGMA journal_mode=WAL"))
+        self._table_ready = False
+
+    def _begin(self):
+        # The table is created on first use, not when the app module is imported
+        if not self._table_ready:
+            with self._engine.begin() as conn:
+                conn.execute(text(
+                    f"CREATE TABLE IF NOT EXISTS {TABLE} "
+                    "(key VARCHAR(255) PRIMARY KEY, count INTEGER NOT NULL, expires_at DOUBLE PRECISION NOT NULL)"
+                ))
+            self._table_ready = True
+        return self._engine.begin()
+
+    @property
+    def base_exceptions(self):
+        return SQLAlchemyError
+
+    def incr(self, key: str, expiry: int, amount: int = 1) -> int:
+        now = time.time()
+        with self._begin() as conn:
+            count = conn.execute(text(f"""
+                INSERT INTO {TABLE} (key, count, expires_at) VALUES (:key, :amount, :expires_at)
+                ON CONFLICT (key) DO UPDATE SET
+                    count = CASE WHEN {TABLE}.expires_at <= :now THEN :amount ELSE {TABLE}.count + :amount END,
+                    expires_at = CASE WHEN {TABLE}.expires_at <= :now THEN :expires_at ELSE {TABLE}.expires_at END
+                RETURNING count
+            """), {"key": key, "amount": amount, "now": now, "expires_at": now + expiry}).scalar_one()
+            # Occasionally drop windows that ended, so the table holds only live clients
+            if random.random() < 0.01:
+                conn.execute(text(f"DELETE FROM {TABLE} WHERE expires_at <= :now"), {"now": now})
+        return count
+
+    def get(self, key: str) -> int:
+        with self._begin() as conn:
+            count = conn.execute(text(f"SELECT count FROM {TABLE} WHERE key = :key AND expires_at > :now"),
+                                 {"key": key, "now": time.time()}).scalar()
+        return count or 0
+
+    def get_expiry(self, key: str) -> float:
+        with self._begin() as conn:
+            expires_at = conn.execute(text(f"SELECT expires_at FROM {TABLE} WHERE key = :key"), {"key": key}).scalar()
+        return expires_at or time.time()
+
+    def check(self) -> bool:
+        try:
+            with self._engine.connect() as conn:
+                conn.execute(text("SELECT 1"))
+            return True
+        except SQLAlchemyError:
+            return False
+
+    def reset(self) -> int | None:
+        with self._begin() as conn:
+            return conn.execute(text(f"DELETE FROM {TABLE}")).rowcount
+
+    def clear(self, key: str) -> None:
+        with self._begin() as conn:
+            conn.execute(text(f"DELETE FROM {TABLE} WHERE key = :key"), {"key": key})
+
+
+limiter = Limiter(
+    key_func=get_remote_address,
+    storage_uri=rate_limit_config.RATE_LIMIT_STORAGE_URI,
+)
+
+
+# Counts hits while the shared storage is failing
+_fallback = FixedWindowRateLimiter(MemoryStorage())
+
+
+def rate_limited(limit_value: str):
+    """Route dependency allowing each client address ``limit_value`` (e.g. ``"5/minute"``) requests of the route."""
+    item = parse(limit_value)
+
+    async def check(request: Request):
+        if not limiter.enabled:
+            return
+        identifiers = (get_remote_address(request), request.scope["route"].path)
+        sql = isinstance(limiter.limiter.storage, SqlStorage)
+        try:
+            if sql:
+                allowed = await asyncio.to_thread(limiter.limiter.hit, item, *identifiers)
+            else:
+                allowed = limiter.limiter.hit(item, *identifiers)
+        except SQLAlchemyError as e:
+            log_event("rate_limit.fallback", error=str(e))
+            allowed = _fallback.hit(item, *identifiers)
+        if not allowed:
+            raise HTTPException(status_code=429, detail=f"Rate limit exceeded: {item}")
+
+    return check
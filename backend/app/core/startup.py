@@ -0,0 +1,93 @@
+import asyncio
+import time
+
+from app.core.logging import log_event
+
+
+class Component:
+    """A service built once, either by the startup warm-up or by its first user.
+
+    ``get()`` is the readiness gate: concurrent callers share one build, and a
+    failed build is retried by the next caller. Blocking factories (model
+    loads, CSV reads, sync network clients) run in a worker thread so several
+    components can load at the same time.
+    """
+
+    def __init__(self, name: str, factory, *, blocking: bool = True):
+        self.name = name
+        self._factory = factory
+        self._blocking = blocking
+        self._value = None
+        self._task: asyncio.Task | None = None
+        self.state = "pending"  # pending -> loading -> ready | failed
+        self.error: str | None = None
+        self.seconds: float | None = None
+
+    @property
+    def ready(self) -> bool:
+        return self.state == "ready"
+
+    @property
+    def value(self):
+        """The built value; only valid once ``ready``."""
+        if not self.ready:
+            raise RuntimeError(f"Component {self.name!r} is not ready ({self.state})")
+        return self._value
+
+    async def _build(self):
+        self.state = "loading"
+        t0 = time.perf_counter()
+        try:
+            value = await asyncio.to_thread(self._factory) if self._blocking else await self._factory()
+        except Exception as e:
+            self.state, self.error, self._task = "failed", str(e), None
+            log_event("startup.component.failed", component=self.name, error=str(e))
+            raise
+        self.seconds = round(time.perf_counter() - t0, 3)
+        self._value, self.state, self.error = value, "ready", None
+        log_event("startup.component", component=self.name, seconds=self.seconds)
+        return value
+
+    async def get(self):
+        if self.ready:
+            return self._value
+        if self._task is None:
+            self._task = asyncio.create_task(self._build())
+        # shield: a cancelled request must not cancel a build other requests wait on
+        return await asyncio.shield(self._task)
+
+    def status(self) -> dict:
+        return {"state": self.state, "seconds": self.seconds, "error": self.error}
+
+
+_components: dict[str, Component] = {}
+
+
+def component(name: str, factory, *, blocking: bool = True) -> Component:
+    """Register a lazily built component under ``name``."""
+    _components[name] = Component(name, factory, blocking=blocking)
+    return _components[name]
+
+
+async def warm_up():
+    """Build every registered component concurrently and log the startup time."""
+    t0 = time.perf_counter()
+    results = await asyncio.gather(*(c.get() for c in _components.values()), return_exceptions=True)
+    log_event(
+        "startup.complete",
+        seconds=round(time.perf_counter() - t0, 3),
+        # Sum of per-component build times; larger than "seconds" when loads overlapped
+        sequential_seconds=round(sum(c.seconds or 0 for c in _components.values()), 3),
+        failed=[c.name for c, r in zip(_components.values(), results) if isinstance(r, Exception)],
+    )
+
+
+def readiness() -> dict:
+    statuses = {name: c.status() for name, c in _components.items()}
+    if all(c.ready for c in _components.values()):
+        overall = "ok"
+    elif any(c.state == "failed" for c in _components.values()):
+        overall = "degraded"
+    else:
+        overall = "starting"
+    return {"status": overall, "components": statuses}
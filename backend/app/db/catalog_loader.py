@@ -0,0 +1,259 @@
+"""Product catalog loader: ``COPY`` into a staging table, then a delta merge.
+
+A catalog file (CSV with the columns of ``amazon_product_data``, optionally
+gzipped) is streamed into a temporary staging table with ``COPY``, in one
+transaction:
+
+- duplicate keys in the file collapse to their last row;
+- rows whose key (``id`` or ``product_link``) is already in the catalog are
+  updated only when their price, discount or availability changed, so an
+  unchanged row writes nothing (no dead tuple, no index maintenance);
+- new keys are inserted, and with ``delete_missing`` keys that are no longer
+  in the file are deleted;
+- the catalog version in ``catalog_version`` is bumped if anything changed.
+
+After the commit, a load that changed rows refreshes what depends on the
+catalog: the search column, indexes and planner statistics
+(``app.db.product_indexes``), the title embeddings of the product search
+(when enabled) and the product answers of the shared answer cache. Run from ``backend/``::
+
+    python -m app.db.catalog_loader app/resources/amazon_product_data.csv [--key product_link] [--delete-missing] [--dry-run]
+"""
+import argparse
+import asyncio
+import csv
+import gzip
+import time
+from dataclasses import asdict, dataclass
+from pathlib import Path
+
+from sqlalchemy import Table, text
+
+from app.core.config import sql_config
+from app.core.logging import log_event
+from app.models.amazon_data_model import amazonProductSchema
+
+# pg_advisory_xact_lock key, so two loaders never merge into the catalog at once
+LOCK_KEY = 0x6361746C  # "catl"
+
+# Everything but search_tsv, which the trigger of app.db.product_indexes fills
+COLUMNS = ("id", "product_link", "title", "brand", "discount", "avg_rating", "total_ratings",
+           "availability", "category", "price")
+KEYS = ("id", "product_link")
+# Columns a refresh updates on existing products; the descriptive ones stay as first loaded
+DELTA_COLUMNS = ("price", "discount", "availability")
+
+STAGE = "catalog_stage"
+
+
+@dataclass
+class CatalogLoadReport:
+    rows: int  # data rows in the file
+    duplicates: int  # rows dropped because a later row had the same key
+    inserted: int
+    updated: int  # existing products whose price, discount or availability changed
+    unchanged: int
+    deleted: int
+    version: int | None  # catalog version after the load (None on a dry run)
+    copy_seconds: float
+    merge_seconds: float
+    refresh_seconds: float
+    seconds: float
+
+    @property
+    def changed(self) -> bool:
+        return bool(self.inserted or self.updated or self.deleted)
+
+    @property
+    def rows_per_second(self) -> float:
+        return self.rows / self.seconds if self.seconds else float("inf")
+
+    def as_dict(self) -> dict:
+        report = {k: round(v, 3) if isinstance(v, float) else v for k, v in asdict(self).items()}
+        return {**report, "rows_per_second": round(self.rows_per_second)}
+
+
+def table_name(table: Table) -> str:
+    return f"{table.schema or 'public'}.{table.name}"
+
+
+def _open(path: Path):
+    if path.suffix == ".gz":
+        return gzip.open(path, "rt", encoding="utf-8", newline="")
+    return open(path, encoding="utf-8", newline="")
+
+
+def read_header(f) -> list[str]:
+    """Consume the header line of ``f`` and check it names every catalog column once."""
+    header = [name.strip() for name in next(csv.reader([f.readline()]), [])]
+    if sorted(header) != sorted(COLUMNS):
+        missing, extra = set(COLUMNS) - set(header), set(header) - set(COLUMNS)
+        raise ValueError(f"catalog header must have the columns {', '.join(COLUMNS)} "
+                         f"(missing: {sorted(missing)}, unexpected: {sorted(extra)})")
+    return header
+
+
+def ensure_catalog_table(engine, table: Table = amazonProductSchema.__table__):
+    """Create the catalog table (with its search column and indexes) if the database has none yet."""
+    with engine.begin() as conn:
+        conn.execute(text("CREATE EXTENSION IF NOT EXISTS pg_trgm"))
+        table.create(conn, checkfirst=True)
+        conn.execute(text("""
+            CREATE TABLE IF NOT EXISTS catalog_version (
+                catalog TEXT PRIMARY KEY,
+                version BIGINT NOT NULL,
+                loaded_at TIMESTAMPTZ NOT NULL DEFAULT now(),
+                rows BIGINT NOT NULL,
+                inserted BIGINT NOT NULL,
+                updated BIGINT NOT NULL,
+                deleted BIGINT NOT NULL
+            )
+        """))
+
+
+def merge_statements(table: str, key: str, delete_missing: bool) -> dict[str, str]:
+    columns = ", ".join(COLUMNS)
+    changed = (f"({', '.join(f't.{c}' for c in DELTA_COLUMNS)}) IS DISTINCT FROM "
+               f"({', '.join(f's.{c}' for c in DELTA_COLUMNS)})")
+    statements = {
+        # Last row wins; ctid follows COPY order in a fresh table
+        "duplicates": f"DELETE FROM {STAGE} a USING {STAGE} b WHERE a.{key} = b.{key} AND a.ctid < b.ctid",
+        "updated": f"UPDATE {table} t SET {', '.join(f'{c} = s.{c}' for c in DELTA_COLUMNS)} "
+                   f"FROM {STAGE} s WHERE t.{key} = s.{key} AND {changed}",
+        "inserted": f"INSERT INTO {table} ({columns}) SELECT {columns} FROM {STAGE} s "
+                    f"WHERE NOT EXISTS (SELECT 1 FROM {table} t WHERE t.{key} = s.{key})",
+    }
+    if delete_missing:
+        statements["deleted"] = (f"DELETE FROM {table} t "
+                                 f"WHERE NOT EXISTS (SELECT 1 FROM {STAGE} s WHERE s.{key} = t.{key})")
+    return statements
+
+
+def _merge(cursor, path: Path, table: str, key: str, delete_missing: bool) -> tuple[dict, float, float]:
+    cursor.execute("SELECT pg_advisory_xact_lock(%s)", (LOCK_KEY,))
+    # Temp tables skip the WAL; LIKE copies the column types but no index or constraint to maintain during COPY
+    cursor.execute(f"CREATE TEMP TABLE {STAGE} (LIKE {table}) ON COMMIT DROP")
+    t0 = time.perf_counter()
+    with _open(path) as f:
+        header = read_header(f)
+        cursor.copy_expert(f"COPY {STAGE} ({', '.join(header)}) FROM STDIN WITH (FORMAT csv)", f, size=1 << 20)
+    cursor.execute(f"SELECT count(*) FROM {STAGE}")
+    counts = {"rows": cursor.fetchone()[0]}
+    if delete_missing and not counts["rows"]:
+        raise ValueError(f"{path} has no rows; refusing to delete the whole catalog")
+    copy_seconds = time.perf_counter() - t0
+
+    t0 = time.perf_counter()
+    # Autovacuum never analyzes temp tables; without statistics the joins below can pick nested loops
+    cursor.execute(f"ANALYZE {STAGE}")
+    for name, statement in merge_statements(table, key, delete_missing).items():
+        step = time.perf_counter()
+        cursor.execute(statement)
+        counts[name] = cursor.rowcount
+        log_event("catalog_loader.step", step=name, rows=cursor.rowcount,
+                  ms=round((time.perf_counter() - step) * 1000, 1))
+    return counts, copy_seconds, time.perf_counter() - t0
+
+
+def _bump_version(cursor, table: str, counts: dict) -> int:
+    cursor.execute("""
+        INSERT INTO catalog_version AS v (catalog, version, rows, inserted, updated, deleted)
+        VALUES (%(catalog)s, 1, %(rows)s, %(inserted)s, %(updated)s, %(deleted)s)
+        ON CONFLICT (catalog) DO UPDATE SET
+            version = v.version + 1, loaded_at = now(), rows = EXCLUDED.rows,
+            inserted = EXCLUDED.inserted, updated = EXCLUDED.updated, deleted = EXCLUDED.deleted
+        RETURNING version
+    """, {"catalog": table, **counts})
+    return cursor.fetchone()[0]
+
+
+def _current_version(cursor, table: str) -> int:
+    cursor.execute("SELECT version FROM catalog_version WHERE catalog = %s", (table,))
+    row = cursor.fetchone()
+    return row[0] if row else 0
+
+
+async def read_catalog_version(db, table: Table = amazonProductSchema.__table__) -> int:
+    """Version of ``table`` (async session or connection); 0 until the loader first changes it."""
+    if (await db.execute(text("SELECT to_regclass('catalog_version')"))).scalar() is None:
+        return 0
+    result = await db.execute(text("SELECT version FROM catalog_version WHERE catalog = :catalog"),
+                              {"catalog": table_name(table)})
+    return result.scalar() or 0
+
+
+def refresh_dependents(table: Table = amazonProductSchema.__table__):
+    """Bring the search column, indexes, statistics and title embeddings up to date; drop cached product answers."""
+    from app.db.postgresdb import engine
+    from app.db.product_indexes import ensure_product_indexes
+
+    asyncio.run(ensure_product_indexes(table=table))
+    if sql_config.SQL_PRODUCT_SEARCH_ENABLED:
+        from app.services.product_search import sync_product_index
+
+        sync_product_index(table=table)
+    with engine.begin() as conn:
+        # Product answers quote prices and stock; they are only cached if ANSWER_CACHE_ROUTES includes them
+        if conn.execute(text("SELECT to_regclass('semantic_answer_cache')")).scalar() is not None:
+            purged = conn.execute(text("DELETE FROM semantic_answer_cache WHERE route = 'product_inquiry'")).rowcount
+            log_event("catalog_loader.answer_cache_purge", rows=purged)
+
+
+def load_catalog(path, *, table: Table = amazonProductSchema.__table__, key: str = "id",
+                 delete_missing: bool = False, dry_run: bool = False, refresh: bool = True,
+                 engine=None) -> CatalogLoadReport:
+    """Merge the catalog file at ``path`` into ``table`` (see the module docstring)."""
+    if key not in KEYS:
+        raise ValueError(f"key must be one of {KEYS}, not {key!r}")
+    if engine is None:
+        from app.db.postgresdb import engine
+    path, name = Path(path), table_name(table)
+    t0 = time.perf_counter()
+    ensure_catalog_table(engine, table)
+
+    conn = engine.raw_connection()
+    try:
+        cursor = conn.cursor()
+        counts, copy_seconds, merge_seconds = _merge(cursor, path, name, key, delete_missing)
+        counts.setdefault("deleted", 0)
+        changed = bool(counts["inserted"] or counts["updated"] or counts["deleted"])
+        if dry_run:
+            version = None
+            conn.rollback()
+        else:
+            version = _bump_version(cursor, name, counts) if changed else _current_version(cursor, name)
+            conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        conn.close()
+
+    refresh_seconds = 0.0
+    if refresh and changed and not dry_run:
+        step = time.perf_counter()
+        refresh_dependents(table)
+        refresh_seconds = time.perf_counter() - step
+
+    staged = counts["rows"] - counts["duplicates"]
+    report = CatalogLoadReport(
+        rows=counts["rows"], duplicates=counts["duplicates"], inserted=counts["inserted"],
+        updated=counts["updated"], unchanged=staged - counts["inserted"] - counts["updated"],
+        deleted=counts["deleted"], version=version, copy_seconds=copy_seconds, merge_seconds=merge_seconds,
+        refresh_seconds=refresh_seconds, seconds=time.perf_counter() - t0,
+    )
+    log_event("catalog_loader.done", catalog=name, path=str(path), dry_run=dry_run, **report.as_dict())
+    return report
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Merge a product catalog CSV into amazon_product_data.")
+    parser.add_argument("path", type=Path, help="catalog CSV (or .csv.gz) with the columns of amazon_product_data")
+    parser.add_argument("--key", choices=KEYS, default="id", help="column that identifies a product")
+    parser.add_argument("--delete-missing", action="store_true", help="delete products that are not in the file")
+    parser.add_argument("--dry-run", action="store_true", help="report what would change, then roll back")
+    parser.add_argument("--no-refresh", action="store_true", help="skip the index, statistics and cache refresh")
+    args = parser.parse_args()
+    report = load_catalog(args.path, key=args.key, delete_missing=args.delete_missing, dry_run=args.dry_run,
+                          refresh=not args.no_refresh)
+    print(report.as_dict())
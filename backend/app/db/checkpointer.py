@@ -0,0 +1,404 @@
+import asyncio
+import contextlib
+import os
+import random
+import sqlite3
+import threading
+import time
+from collections import OrderedDict, defaultdict
+
+from langgraph.checkpoint.base import WRITES_IDX_MAP, BaseCheckpointSaver, CheckpointTuple, get_checkpoint_metadata
+from langgraph.checkpoint.memory import InMemorySaver
+from sqlalchemy.engine import make_url
+
+from app.core.config import checkpoint_config, config
+from app.core.logging import log_event
+
+
+class BoundedMemorySaver(InMemorySaver):
+    """In-process checkpointer with bounded memory.
+
+    - Keeps only the latest checkpoint per thread (the chat never time-travels),
+      so a thread costs one copy of its state instead of one per graph step.
+    - Evicts whole threads least-recently-used first once ``max_threads`` is
+      exceeded, and threads idle for longer than ``ttl_seconds``.
+    - Trims the oldest messages of a thread whose serialized state exceeds
+      ``max_thread_bytes``.
+    """
+
+    def __init__(self, *, max_threads: int, ttl_seconds: float, max_thread_bytes: int, serde=None):
+        super().__init__(serde=serde)
+        self.max_threads = max_threads
+        self.ttl_seconds = ttl_seconds
+        self.max_thread_bytes = max_thread_bytes
+        self.evictions = 0
+        self.trims = 0
+        self._last_seen: OrderedDict[str, float] = OrderedDict()
+        # Per-thread key indexes so deleting a thread does not scan every write/blob
+        self._blob_keys: defaultdict[str, set] = defaultdict(set)
+        self._write_keys: defaultdict[str, set] = defaultdict(set)
+        self._lock = threading.RLock()
+
+    def _touch(self, thread_id: str):
+        now = time.monotonic()
+        self._last_seen[thread_id] = now
+        self._last_seen.move_to_end(thread_id)
+        while self._last_seen:
+            oldest, seen = next(iter(self._last_seen.items()))
+            if len(self._last_seen) <= self.max_threads and now - seen <= self.ttl_seconds:
+                break
+            self.delete_thread(oldest)
+            self.evictions += 1
+
+    def _expired(self, thread_id: str) -> bool:
+        seen = self._last_seen.get(thread_id)
+        return seen is not None and time.monotonic() - seen > self.ttl_seconds
+
+    def _prune(self, thread_id: str, checkpoint_ns: str, checkpoint: dict):
+        """Drop every checkpoint, pending write and blob the latest checkpoint does not use."""
+        checkpoints = self.storage[thread_id][checkpoint_ns]
+        for checkpoint_id in [cid for cid in checkpoints if cid != checkpoint["id"]]:
+            del checkpoints[checkpoint_id]
+            write_key = (thread_id, checkpoint_ns, checkpoint_id)
+            self.writes.pop(write_key, None)
+            self._write_keys[thread_id].discard(write_key)
+
+        versions = checkpoint["channel_versions"]
+        blob_keys = self._blob_keys[thread_id]
+        for key in [k for k in blob_keys if k[1] == checkpoint_ns and versions.get(k[2]) != k[3]]:
+            self.blobs.pop(key, None)
+            blob_keys.discard(key)
+
+    def _thread_bytes(self, thread_id: str) -> int:
+        size = sum(len(self.blobs[key][1]) for key in self._blob_keys[thread_id])
+        for checkpoints in self.storage[thread_id].values():
+            size += sum(len(c[1]) + len(m[1]) for c, m, _ in checkpoints.values())
+        return size
+
+    def _enforce_thread_bytes(self, thread_id: str, checkpoint_ns: str, checkpoint: dict):
+        size = self._thread_bytes(thread_id)
+        if size <= self.max_thread_bytes or "messages" not in checkpoint["channel_versions"]:
+            return
+        key = (thread_id, checkpoint_ns, "messages", checkpoint["channel_versions"]["messages"])
+        blob = self.blobs.get(key)
+        if blob is None or blob[0] == "empty":
+            return
+        messages = self.serde.loads_typed(blob)
+        budget = len(blob[1]) - (size - self.max_thread_bytes)
+        # Drop whole (human, ai) turns from the front, always keeping the latest turn
+        while len(messages) > 2:
+            messages = messages[2:]
+            blob = self.serde.dumps_typed(messages)
+            if len(blob[1]) <= budget:
+                break
+        self.blobs[key] = blob
+        self.trims += 1
+        log_event("checkpoint.trim", thread_id=thread_id, bytes_before=size, messages_kept=len(messages))
+
+    def get_tuple(self, config):
+        thread_id = config["configurable"]["thread_id"]
+        with self._lock:
+            if self._expired(thread_id):
+                self.delete_thread(thread_id)
+                self.evictions += 1
+            result = super().get_tuple(config)
+            if result is None:
+                # InMemorySaver's defaultdict creates an entry on lookup; don't keep it for unknown threads
+                if thread_id not in self._last_seen:
+                    self.storage.pop(thread_id, None)
+            else:
+                self._last_seen.move_to_end(thread_id)
+            return result
+
+    def put(self, config, checkpoint, metadata, new_versions):
+        thread_id = config["configurable"]["thread_id"]
+        checkpoint_ns = config["configurable"]["checkpoint_ns"]
+        with self._lock:
+            next_config = super().put(config, checkpoint, metadata, new_versions)
+            self._blob_keys[thread_id].update((thread_id, checkpoint_ns, k, v) for k, v in new_versions.items())
+            self._prune(thread_id, checkpoint_ns, checkpoint)
+            self._enforce_thread_bytes(thread_id, checkpoint_ns, checkpoint)
+            self._touch(thread_id)
+            return next_config
+
+    def put_writes(self, config, writes, task_id, task_path=""):
+        thread_id = config["configurable"]["thread_id"]
+        with self._lock:
+            super().put_writes(config, writes, task_id, task_path)
+            self._write_keys[thread_id].add(
+                (thread_id, config["configurable"].get("checkpoint_ns", ""), config["configurable"]["checkpoint_id"])
+            )
+
+    def delete_thread(self, thread_id: str):
+        with self._lock:
+            self.storage.pop(thread_id, None)
+            for key in self._write_keys.pop(thread_id, ()):
+                self.writes.pop(key, None)
+            for key in self._blob_keys.pop(thread_id, ()):
+                self.blobs.pop(key, None)
+            self._last_seen.pop(thread_id, None)
+
+    def stats(self) -> dict:
+        return {"threads": len(self._last_seen), "evictions": self.evictions, "trims": self.trims}
+
+
+class SqliteSaver(BaseCheckpointSaver[str]):
+    """Checkpointer in a SQLite file, shared by the worker processes of one host.
+
+    Like ``BoundedMemorySaver`` it keeps only the latest checkpoint per thread
+    and drops threads idle for longer than ``ttl_seconds``; there is no thread
+    count or size cap. Each call opens its own connection (WAL mode, so
+    readers never wait for the writer); the async methods run the sync ones in
+    a worker thread. Two workers running turns of the same thread at once
+    both succeed, and the last checkpoint written wins.
+    """
+
+    def __init__(self, path: str, *, ttl_seconds: float, serde=None):
+        super().__init__(serde=serde)
+        self.path = path
+        self.ttl_seconds = ttl_seconds
+
+    @contextlib.contextmanager
+    def _connect(self):
+        # Autocommit: transactions are explicit, and closing rolls back one an error left open
+        conn = sqlite3.connect(self.path, timeout=10, isolation_level=None)
+        try:
+            yield conn
+        finally:
+            conn.close()
+
+    def setup(self):
+        if os.path.dirname(self.path):
+            os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        with self._connect() as conn:
+            conn.execute("PRAGMA journal_mode = WAL")
+            conn.executescript("""
+                CREATE TABLE IF NOT EXISTS checkpoints (
+                    thread_id TEXT, checkpoint_ns TEXT, checkpoint_id TEXT, parent_id TEXT,
+                    checkpoint_type TEXT, checkpoint BLOB, metadata_type TEXT, metadata BLOB, updated_at REAL,
+                    PRIMARY KEY (thread_id, checkpoint_ns));
+                CREATE TABLE IF NOT EXISTS checkpoint_blobs (
+                    thread_id TEXT, checkpoint_ns TEXT, channel TEXT, version TEXT, type TEXT, value BLOB,
+                    PRIMARY KEY (thread_id, checkpoint_ns, channel, version));
+                CREATE TABLE IF NOT EXISTS checkpoint_writes (
+                    thread_id TEXT, checkpoint_ns TEXT, checkpoint_id TEXT, task_id TEXT, idx INTEGER,
+                    channel TEXT, type TEXT, value BLOB, task_path TEXT,
+                    PRIMARY KEY (thread_id, checkpoint_ns, checkpoint_id, task_id, idx));
+                CREATE INDEX IF NOT EXISTS checkpoints_updated_at ON checkpoints (updated_at);
+            """)
+
+    def _tuple(self, conn, thread_id: str, checkpoint_ns: str, row) -> CheckpointTuple:
+        checkpoint_id, parent_id, checkpoint_type, checkpoint_blob, metadata_type, metadata_blob = row
+        checkpoint = self.serde.loads_typed((checkpoint_type, checkpoint_blob))
+        channel_values = {}
+        for channel, version in checkpoint["channel_versions"].items():
+            blob = conn.execute(
+                "SELECT type, value FROM checkpoint_blobs "
+                "WHERE thread_id = ? AND checkpoint_ns = ? AND channel = ? AND version = ?",
+                (thread_id, checkpoint_ns, channel, str(version)),
+            ).fetchone()
+            if blob is not None and blob[0] != "empty":
+                channel_values[channel] = self.serde.loads_typed(blob)
+        writes = conn.execute(
+            "SELECT task_id, channel, type, value FROM checkpoint_writes "
+            "WHERE thread_id = ? AND checkpoint_ns = ? AND checkpoint_id = ? ORDER BY task_id, idx",
+            (thread_id, checkpoint_ns, checkpoint_id),
+        ).fetchall()
+        return CheckpointTuple(
+            config={"configurable": {"thread_id": thread_id, "checkpoint_ns": checkpoint_ns,
+                                     "checkpoint_id": checkpoint_id}},
+            checkpoint={**checkpoint, "channel_values": channel_values},
+            metadata=self.serde.loads_typed((metadata_type, metadata_blob)),
+            pending_writes=[(task_id, channel, self.serde.loads_typed((t, v))) for task_id, channel, t, v in writes],
+            parent_config=(
+                {"configurable": {"thread_id": thread_id, "checkpoint_ns": checkpoint_ns, "checkpoint_id": parent_id}}
+                if parent_id else None
+            ),
+        )
+
+    def get_tuple(self, config):
+        thread_id = config["configurable"]["thread_id"]
+        checkpoint_ns = config["configurable"].get("checkpoint_ns", "")
+        checkpoint_id = config["configurable"].get("checkpoint_id")
+        with self._connect() as conn:
+            row = conn.execute(
+                "SELECT checkpoint_id, parent_id, checkpoint_type, checkpoint, metadata_type, metadata "
+                "FROM checkpoints WHERE thread_id = ? AND checkpoint_ns = ? AND updated_at > ?",
+                (thread_id, checkpoint_ns, time.time() - self.ttl_seconds),
+            ).fetchone()
+            # Only the latest checkpoint is kept
+            if row is None or (checkpoint_id and row[0] != checkpoint_id):
+                return None
+            return self._tuple(conn, thread_id, checkpoint_ns, row)
+
+    def list(self, config, *, filter=None, before=None, limit=None):
+        if config is None or limit == 0:
+            return
+        result = self.get_tuple(config)
+        if result is None:
+            return
+        if before is not None and result.config["configurable"]["checkpoint_id"] >= before["configurable"]["checkpoint_id"]:
+            return
+        if filter and any(result.metadata.get(k) != v for k, v in filter.items()):
+            return
+        yield result
+
+    def put(self, config, checkpoint, metadata, new_versions):
+        thread_id = config["configurable"]["thread_id"]
+        checkpoint_ns = config["configurable"]["checkpoint_ns"]
+        c = checkpoint.copy()
+        values = c.pop("channel_values")
+        checkpoint_type, checkpoint_blob = self.serde.dumps_typed(c)
+        metadata_type, metadata_blob = self.serde.dumps_typed(get_checkpoint_metadata(config, metadata))
+        now = time.time()
+        with self._connect() as conn:
+            conn.execute("BEGIN IMMEDIATE")
+            conn.executemany(
+                "INSERT OR REPLACE INTO checkpoint_blobs VALUES (?, ?, ?, ?, ?, ?)",
+                [(thread_id, checkpoint_ns, k, str(v),
+                  *(self.serde.dumps_typed(values[k]) if k in values else ("empty", b"")))
+                 for k, v in new_versions.items()],
+            )
+            conn.execute(
+                "INSERT OR REPLACE INTO checkpoints VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                (thread_id, checkpoint_ns, checkpoint["id"], config["configurable"].get("checkpoint_id"),
+                 checkpoint_type, checkpoint_blob, metadata_type, metadata_blob, now),
+            )
+            # Drop what the latest checkpoint no longer uses: older channel versions and pending writes
+            versions = checkpoint["channel_versions"]
+            stale = [
+                (thread_id, checkpoint_ns, channel, version)
+                for channel, version in conn.execute(
+                    "SELECT channel, version FROM checkpoint_blobs WHERE thread_id = ? AND checkpoint_ns = ?",
+                    (thread_id, checkpoint_ns),
+                )
+                if str(versions.get(channel)) != version
+            ]
+            conn.executemany(
+                "DELETE FROM checkpoint_blobs WHERE thread_id = ? AND checkpoint_ns = ? AND channel = ? AND version = ?",
+                stale,
+            )
+            conn.execute(
+                "DELETE FROM checkpoint_writes WHERE thread_id = ? AND checkpoint_ns = ? AND checkpoint_id != ?",
+                (thread_id, checkpoint_ns, checkpoint["id"]),
+            )
+            if random.random() < 0.01:
+                self._delete_expired(conn, now)
+            conn.execute("COMMIT")
+        return {"configurable": {"thread_id": thread_id, "checkpoint_ns": checkpoint_ns,
+                                 "checkpoint_id": checkpoint["id"]}}
+
+    def put_writes(self, config, writes, task_id, task_path=""):
+        thread_id = config["configurable"]["thread_id"]
+        checkpoint_ns = config["configurable"].get("checkpoint_ns", "")
+        checkpoint_id = config["configurable"]["checkpoint_id"]
+        rows = []
+        for idx, (channel, value) in enumerate(writes):
+            rows.append((thread_id, checkpoint_ns, checkpoint_id, task_id, WRITES_IDX_MAP.get(channel, idx),
+                         channel, *self.serde.dumps_typed(value), task_path))
+        with self._connect() as conn:
+            # Special writes (errors, interrupts, ...) replace each other; regular ones are written once
+            conn.executemany(
+                "INSERT OR REPLACE INTO checkpoint_writes VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                [row for row in rows if row[4] < 0],
+            )
+            conn.executemany(
+                "INSERT OR IGNORE INTO checkpoint_writes VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                [row for row in rows if row[4] >= 0],
+            )
+
+    def _delete_expired(self, conn, now: float):
+        expired = [row[0] for row in conn.execute(
+            "SELECT DISTINCT thread_id FROM checkpoints WHERE updated_at <= ?", (now - self.ttl_seconds,)
+        )]
+        for thread_id in expired:
+            self._delete(conn, thread_id)
+        if expired:
+            log_event("checkpoint.expire", threads=len(expired))
+
+    @staticmethod
+    def _delete(conn, thread_id: str):
+        for table in ("checkpoints", "checkpoint_blobs", "checkpoint_writes"):
+            conn.execute(f"DELETE FROM {table} WHERE thread_id = ?", (thread_id,))
+
+    def delete_thread(self, thread_id: str):
+        with self._connect() as conn:
+            conn.execute("BEGIN IMMEDIATE")
+            self._delete(conn, thread_id)
+            conn.execute("COMMIT")
+
+    async def aget_tuple(self, config):
+        return await asyncio.to_thread(self.get_tuple, config)
+
+    async def alist(self, config, *, filter=None, before=None, limit=None):
+        for item in await asyncio.to_thread(lambda: list(self.list(config, filter=filter, before=before, limit=limit))):
+            yield item
+
+    async def aput(self, config, checkpoint, metadata, new_versions):
+        return await asyncio.to_thread(self.put, config, checkpoint, metadata, new_versions)
+
+    async def aput_writes(self, config, writes, task_id, task_path=""):
+        await asyncio.to_thread(self.put_writes, config, writes, task_id, task_path)
+
+    async def adelete_thread(self, thread_id: str):
+        await asyncio.to_thread(self.delete_thread, thread_id)
+
+    get_next_version = InMemorySaver.get_next_version
+
+
+def _postgres_conninfo(url: str) -> str:
+    # psycopg wants a plain libpq URL, not an SQLAlchemy "postgresql+driver://" one
+    return make_url(url).set(drivername="postgresql").render_as_string(hide_password=False)
+
+
+# Connection pool for the Postgres checkpointer; opened in the app lifespan
+pool = None
+
+
+def build_checkpointer():
+    """Create the checkpointer selected by ``CHECKPOINTER``."""
+    global pool
+    if checkpoint_config.CHECKPOINTER == "postgres":
+        from langgraph.checkpoint.postgres.aio import AsyncPostgresSaver
+        from psycopg.rows import dict_row
+        from psycopg_pool import AsyncConnectionPool
+
+        pool = AsyncConnectionPool(
+            conninfo=_postgres_conninfo(checkpoint_config.CHECKPOINT_DATABASE_URL or config.DATABASE_URL),
+            min_size=checkpoint_config.CHECKPOINT_POOL_MIN_SIZE,
+            max_size=checkpoint_config.CHECKPOINT_POOL_MAX_SIZE,
+            # AsyncPostgresSaver requires autocommit + dict rows; prepared statements break behind pgbouncer
+            kwargs={"autocommit": True, "prepare_threshold": 0, "row_factory": dict_row},
+            open=False,
+        )
+        return AsyncPostgresSaver(pool)
+
+    if checkpoint_config.CHECKPOINTER == "sqlite":
+        return SqliteSaver(checkpoint_config.CHECKPOINT_SQLITE_PATH, ttl_seconds=checkpoint_config.CHECKPOINT_TTL_SECONDS)
+
+    return BoundedMemorySaver(
+        max_threads=checkpoint_config.CHECKPOINT_MAX_THREADS,
+        ttl_seconds=checkpoint_config.CHECKPOINT_TTL_SECONDS,
+        max_thread_bytes=checkpoint_config.CHECKPOINT_MAX_THREAD_BYTES,
+    )
+
+
+checkpointer = build_checkpointer()
+
+
+async def open_checkpointer():
+    """Create the checkpoint tables (SQLite and Postgres modes) and open the Postgres connection pool."""
+    if isinstance(checkpointer, SqliteSaver):
+        await asyncio.to_thread(checkpointer.setup)
+        log_event("checkpointer.ready", backend="sqlite", path=checkpointer.path)
+        return
+    if pool is None:
+        return
+    await pool.open(wait=True)
+    await checkpointer.setup()
+    log_event("checkpointer.ready", backend="postgres", max_size=pool.max_size)
+
+
+async def close_checkpointer():
+    if pool is not None:
+        await pool.close()
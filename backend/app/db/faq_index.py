@@ -0,0 +1,145 @@
+import hashlib
+import json
+from pathlib import Path
+
+import numpy as np
+
+from app.core.files import atomic_write
+from app.core.logging import log_event
+
+VECTORS_FILE = "vectors.npy"
+ROWS_FILE = "rows.json"
+
+
+class LocalFaqIndex:
+    """In-process FAQ vector index exposing the subset of the Chroma collection API we use.
+
+    Rows are a unit-norm float32 matrix plus ids, documents and metadatas;
+    ``query`` is one matrix-vector product plus an ``argpartition`` top-k.
+    Rows change through ``upsert``/``delete``, so ingestion embeds only new
+    rows. With ``index_dir`` set, ``persist()`` saves the rows in a directory
+    keyed by the encoder name and the next boot loads them (vectors
+    memory-mapped) instead of re-embedding.
+    """
+
+    def __init__(self, encode, encoder_name: str, index_dir: str | None = None):
+        self._encode = encode
+        self._encoder_name = encoder_name
+        self._store = None
+        if index_dir:
+            self._store = Path(index_dir) / f"faq-{hashlib.sha256(encoder_name.encode()).hexdigest()[:12]}"
+        self._ids: list[str] = []
+        self._documents: list[str] = []
+        self._metadatas: list[dict] = []
+        self._position: dict[str, int] = {}
+        # Rows live in the first count() rows of a buffer that grows by doubling, so batched upserts stay linear
+        self._buffer = np.zeros((0, 0), dtype=np.float32)
+        self._matrix = self._buffer
+        self._load()
+
+    def count(self) -> int:
+        return len(self._ids)
+
+    def _load(self):
+        if self._store is None or not (self._store / ROWS_FILE).exists():
+            return
+        rows = json.loads((self._store / ROWS_FILE).read_text(encoding="utf-8"))
+        matrix = np.load(self._store / VECTORS_FILE, mmap_mode="r")
+        if len(matrix) != len(rows["ids"]):
+            # The two files of different saves; start empty and let ingestion re-embed
+            log_event("faq_index.mismatch", path=str(self._store), rows=len(rows["ids"]), vectors=len(matrix))
+            return
+        self._buffer = self._matrix = matrix
+        self._ids, self._documents, self._metadatas = rows["ids"], rows["documents"], rows["metadatas"]
+        self._position = {id_: i for i, id_ in enumerate(self._ids)}
+        log_event("faq_index.load", path=str(self._store), rows=len(self._ids))
+
+    def persist(self):
+        """Save the rows to ``index_dir`` (no-op without one)."""
+        if self._store is None:
+            return
+        self._store.mkdir(parents=True, exist_ok=True)
+        # Unique temp files and rename: workers ingesting at once never share a temp file,
+        # and a booting worker never loads half an index
+        with atomic_write(self._store / VECTORS_FILE) as f:
+            np.save(f, np.asarray(self._matrix))
+        rows = {"ids": self._ids, "documents": self._documents, "metadatas": self._metadatas}
+        with atomic_write(self._store / ROWS_FILE, "w") as f:
+            json.dump(rows, f, ensure_ascii=False)
+        log_event("faq_index.save", path=str(self._store), rows=len(self._ids))
+
+    def get(self, ids: list[str] | None = None, include=None, limit: int | None = None, offset: int = 0) -> dict:
+        """Ids only (``include`` is accepted for Chroma compatibility), in insertion order."""
+        selected = [i for i in ids if i in self._position] if ids is not None else self._ids
+        end = None if limit is None else (offset or 0) + limit
+        return {"ids": selected[offset or 0:end]}
+
+    def upsert(self, ids: list[str], documents: list[str], metadatas: list[dict], embeddings=None):
+        if not ids:
+            return
+        if embeddings is None:
+            embeddings = self._encode(documents)
+        vectors = np.asarray(embeddings, dtype=np.float32)
+        vectors = vectors / np.linalg.norm(vectors, axis=1, keepdims=True)
+        new = []
+        for i, id_ in enumerate(ids):
+            if id_ not in self._position:
+                self._position[id_] = len(self._ids) + len(new)
+                new.append(i)
+        self._reserve(len(self._ids) + len(new), vectors.shape[1])
+        for i, id_ in enumerate(ids):
+            position = self._position[id_]
+            self._buffer[position] = vectors[i]
+            if position < len(self._ids):
+                self._documents[position], self._metadatas[position] = documents[i], metadatas[i]
+        if new:
+            self._matrix = self._buffer[:len(self._ids) + len(new)]
+            self._ids += [ids[i] for i in new]
+            self._documents += [documents[i] for i in new]
+            self._metadatas += [metadatas[i] for i in new]
+
+    def _reserve(self, rows: int, dim: int):
+        """Make the buffer writable (not the memory-mapped file) with room for ``rows`` rows."""
+        if self._buffer.flags.writeable and self._buffer.shape[0] >= rows:
+            return
+        buffer = np.empty((max(rows, 2 * self._buffer.shape[0], 1024), dim), dtype=np.float32)
+        if self.count():
+            buffer[:self.count()] = self._matrix
+        self._buffer = buffer
+        self._matrix = buffer[:self.count()]
+
+    def add(self, ids: list[str], documents: list[str], metadatas: list[dict], embeddings=None):
+        self.upsert(ids, documents, metadatas, embeddings)
+
+    def delete(self, ids: list[str]):
+        drop = {self._position[i] for i in ids if i in self._position}
+        if not drop:
+            return
+        keep = [i for i in range(len(self._ids)) if i not in drop]
+        self._buffer = self._matrix = self._matrix[keep]
+        self._ids = [self._ids[i] for i in keep]
+        self._documents = [self._documents[i] for i in keep]
+        self._metadatas = [self._metadatas[i] for i in keep]
+        self._position = {id_: i for i, id_ in enumerate(self._ids)}
+
+    def query(self, query_embeddings=None, query_texts=None, n_results: int = 5) -> dict:
+        if query_embeddings is None:
+            query_embeddings = self._encode(query_texts)
+        queries = np.asarray(query_embeddings, dtype=np.float32)
+        queries = queries / np.linalg.norm(queries, axis=1, keepdims=True)
+        result = {"ids": [], "documents": [], "metadatas": [], "distances": []}
+        k = min(n_results, self.count())
+        if k == 0:
+            return {key: [[] for _ in queries] for key in result}
+
+        scores = queries @ self._matrix.T
+        # argpartition finds the top-k in O(n); only those k are sorted
+        top = np.argpartition(-scores, k - 1, axis=1)[:, :k]
+        for row, candidates in zip(scores, top):
+            order = candidates[np.argsort(-row[candidates])]
+            result["ids"].append([self._ids[i] for i in order])
+            result["documents"].append([self._documents[i] for i in order])
+            result["metadatas"].append([self._metadatas[i] for i in order])
+            # Cosine distance, matching Chroma's "cosine" space
+            result["distances"].append([float(1.0 - row[i]) for i in order])
+        return result
@@ -1,10 +1,12 @@
 from sqlalchemy import create_engine
+from sqlalchemy.engine import make_url
+from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker
 from sqlalchemy.orm import sessionmaker, Session
 from typing import Annotated
 from fastapi import Depends
 from app.core.config import config
 
-from contextlib import contextmanager
+from contextlib import contextmanager, asynccontextmanager
 
 engine = create_engine(
     config.DATABASE_URL,
@@ -18,6 +20,32 @@ session = sessionmaker(
     autocommit=False,
 )
 
+
+def _async_url(url: str):
+    """Rewrite a sync Postgres URL to use the asyncpg driver.
+
+    asyncpg does not understand libpq's ``sslmode`` query argument, so it is
+    translated to the ``ssl`` argument asyncpg expects.
+    """
+    url = make_url(url).set(drivername="postgresql+asyncpg")
+    query = dict(url.query)
+    if "sslmode" in query:
+        query["ssl"] = query.pop("sslmode")
+    return url.set(query=query)
+
+
+# Async engine used on the request path so DB I/O never blocks the event loop
+async_engine = create_async_engine(
+    _async_url(config.DATABASE_URL),
+    echo=False,
+    pool_pre_ping=True,
+)
+async_session = async_sessionmaker(
+    bind=async_engine,
+    autoflush=False,
+    expire_on_commit=False,
+)
+
 @contextmanager
 def get_db():
     db = session()
@@ -26,6 +54,12 @@ def get_db():
     finally:
         db.close()
 
-dbSession = Annotated[Session, Depends(get_db)]
-
+@asynccontextmanager
+async def get_async_db():
+    db = async_session()
+    try:
+        yield db
+    finally:
+        await db.close()
 
+dbSession = Annotated[Session, Depends(get_db)]
@@ -0,0 +1,158 @@
+"""Search indexes and the full-text column of ``amazon_product_data``.
+
+The indexes are declared on ``amazonProductSchema``; this module brings an
+existing database up to date with them without blocking reads of the
+catalog:
+
+- the ``pg_trgm`` extension;
+- ``search_tsv``, added as a plain nullable column (a catalog-only change,
+  no table rewrite) and kept current by a ``BEFORE INSERT OR UPDATE``
+  trigger. Creating the trigger briefly blocks writes, not reads;
+- existing rows are backfilled ``BACKFILL_BATCH`` rows per transaction, so
+  no statement holds many row locks or runs for long;
+- every declared index, built ``CONCURRENTLY``, and fresh planner statistics.
+
+Each step is idempotent, so re-running it only costs a scan for unfilled
+rows. A database bootstrapped when ``search_tsv`` was a generated column
+keeps that column; it needs neither trigger nor backfill.
+
+Run once per database from ``backend/``::
+
+    python -m app.db.product_indexes
+
+or set ``SQL_INDEX_BOOTSTRAP=true`` to run it in the background at startup.
+"""
+import asyncio
+import time
+
+from sqlalchemy import MetaData, Table, text
+from sqlalchemy.dialects import postgresql
+from sqlalchemy.schema import CreateIndex
+
+from app.core.logging import log_event
+from app.models.amazon_data_model import SEARCH_COLUMNS, SEARCH_DOCUMENT, amazonProductSchema, search_document
+
+# pg_advisory_lock key, so several replicas booting at once build each index only once
+LOCK_KEY = 0x70726F64  # "prod"
+BACKFILL_BATCH = 10_000  # rows filled per transaction
+
+
+def _qualified(table: Table) -> tuple[str, str]:
+    return table.schema or "public", table.name
+
+
+def product_index_ddl(table: Table = amazonProductSchema.__table__) -> tuple[list[str], list[str]]:
+    """``(statements, index_names)`` creating the declared indexes of ``table`` and refreshing its statistics."""
+    copy = table.to_metadata(MetaData(), schema=table.schema or "public")
+    # The primary key already covers ``id``
+    indexes = sorted((i for i in copy.indexes if i.name.startswith(f"{copy.name}_")), key=lambda i: i.name)
+    statements = []
+    for index in indexes:
+        index.dialect_options["postgresql"]["concurrently"] = True
+        statements.append(str(CreateIndex(index, if_not_exists=True).compile(dialect=postgresql.dialect())))
+    statements.append(f"ANALYZE {copy.schema}.{copy.name}")
+    return statements, [i.name for i in indexes]
+
+
+def search_trigger_ddl(table: Table = amazonProductSchema.__table__) -> tuple[str, str]:
+    """``(function, trigger)`` statements that keep ``search_tsv`` current on insert and on search column updates."""
+    schema, name = _qualified(table)
+    function = f"{schema}.{name}_search_tsv"
+    return (
+        f"CREATE OR REPLACE FUNCTION {function}() RETURNS trigger LANGUAGE plpgsql AS $$\n"
+        f"BEGIN\n    NEW.search_tsv := {search_document('NEW.')};\n    RETURN NEW;\nEND\n$$",
+        f"CREATE TRIGGER {name}_search_tsv BEFORE INSERT OR UPDATE OF {', '.join(SEARCH_COLUMNS)} "
+        f"ON {schema}.{name} FOR EACH ROW EXECUTE FUNCTION {function}()",
+    )
+
+
+async def _step(conn, statement: str):
+    t0 = time.perf_counter()
+    await conn.execute(text(statement))
+    log_event("product_indexes.step", sql=statement[:80], ms=round((time.perf_counter() - t0) * 1000, 1))
+
+
+async def _ensure_search_column(conn, table: Table):
+    """Add ``search_tsv`` and its trigger if missing; returns whether the column is a generated one."""
+    schema, name = _qualified(table)
+    generated = (await conn.execute(text(
+        "SELECT attgenerated::text FROM pg_attribute WHERE attrelid = to_regclass(:table) "
+        "AND attname = 'search_tsv' AND NOT attisdropped"
+    ), {"table": f"{schema}.{name}"})).scalar()
+    if generated == "s":
+        return True
+    if generated is None:
+        # Nullable and without a default: only the catalog changes, the table is not rewritten
+        await _step(conn, f"ALTER TABLE {schema}.{name} ADD COLUMN IF NOT EXISTS search_tsv tsvector")
+    function, trigger = search_trigger_ddl(table)
+    await _step(conn, function)
+    exists = (await conn.execute(text(
+        "SELECT 1 FROM pg_trigger WHERE tgrelid = to_regclass(:table) AND tgname = :name"
+    ), {"table": f"{schema}.{name}", "name": f"{name}_search_tsv"})).scalar()
+    if not exists:
+        await _step(conn, trigger)
+    return False
+
+
+async def backfill_search_column(conn, table: Table = amazonProductSchema.__table__,
+                                 batch: int = BACKFILL_BATCH) -> int:
+    """Fill ``search_tsv`` where it is NULL, ``batch`` ids per statement (autocommitted); returns rows filled."""
+    schema, name = _qualified(table)
+    qualified = f"{schema}.{name}"
+    if not (await conn.execute(text(f"SELECT EXISTS (SELECT 1 FROM {qualified} WHERE search_tsv IS NULL)"))).scalar():
+        return 0
+    t0 = time.perf_counter()
+    filled = 0
+    after = (await conn.execute(text(f"SELECT min(id) - 1 FROM {qualified}"))).scalar()
+    while after is not None:
+        # Walks the primary key; the last batch has no upper bound
+        upper = (await conn.execute(text(
+            f"SELECT id FROM {qualified} WHERE id > :after ORDER BY id OFFSET :skip LIMIT 1"
+        ), {"after": after, "skip": batch - 1})).scalar()
+        bound = "id > :after" + (" AND id <= :upper" if upper is not None else "")
+        result = await conn.execute(text(
+            f"UPDATE {qualified} SET search_tsv = {SEARCH_DOCUMENT} WHERE {bound} AND search_tsv IS NULL"
+        ), {"after": after, "upper": upper})
+        filled += result.rowcount
+        after = upper
+    log_event("product_indexes.backfill", rows=filled, seconds=round(time.perf_counter() - t0, 2))
+    return filled
+
+
+async def _drop_invalid(conn, schema: str, index_names: list[str]):
+    # A CONCURRENTLY build that failed leaves an INVALID index that IF NOT EXISTS would keep forever
+    result = await conn.execute(text(
+        "SELECT c.relname FROM pg_index i JOIN pg_class c ON c.oid = i.indexrelid "
+        "JOIN pg_namespace n ON n.oid = c.relnamespace "
+        "WHERE NOT i.indisvalid AND n.nspname = :schema AND c.relname = ANY(:names)"
+    ), {"schema": schema, "names": index_names})
+    for (name,) in result.fetchall():
+        log_event("product_indexes.drop_invalid", index=name)
+        await conn.execute(text(f'DROP INDEX CONCURRENTLY IF EXISTS {schema}."{name}"'))
+
+
+async def ensure_product_indexes(engine=None, table: Table = amazonProductSchema.__table__) -> bool:
+    """Bring the database behind ``engine`` (the app's async engine by default) up to date with ``table``."""
+    if engine is None:
+        from app.db.postgresdb import async_engine as engine
+    statements, index_names = product_index_ddl(table)
+    t0 = time.perf_counter()
+    # CREATE INDEX CONCURRENTLY cannot run inside a transaction block; each backfill batch commits on its own
+    async with engine.connect() as conn:
+        conn = await conn.execution_options(isolation_level="AUTOCOMMIT")
+        await conn.execute(text("SELECT pg_advisory_lock(:key)"), {"key": LOCK_KEY})
+        try:
+            await _step(conn, "CREATE EXTENSION IF NOT EXISTS pg_trgm")
+            if not await _ensure_search_column(conn, table):
+                await backfill_search_column(conn, table)
+            await _drop_invalid(conn, table.schema or "public", index_names)
+            for statement in statements:
+                await _step(conn, statement)
+        finally:
+            await conn.execute(text("SELECT pg_advisory_unlock(:key)"), {"key": LOCK_KEY})
+    log_event("product_indexes.ready", indexes=index_names, seconds=round(time.perf_counter() - t0, 2))
+    return True
+
+
+if __name__ == "__main__":
+    asyncio.run(ensure_product_indexes())
@@ -0,0 +1,227 @@
+import hashlib
+import time
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+from app.core.files import atomic_write
+from app.core.logging import log_event
+from app.services.faq_ingest import IngestReport
+
+CURRENT_FILE = "CURRENT"  # name of the live generation directory
+KEEP_GENERATIONS = 2  # the live one and its predecessor, which a worker may still have mapped
+# Below this many products a full scan is fast enough and exact; above it, vectors are clustered
+IVF_MIN_ROWS = 50_000
+KMEANS_SAMPLE_PER_LIST = 64  # training rows per cluster
+KMEANS_ITERATIONS = 10
+ASSIGN_CHUNK = 65_536  # rows scored against the centroids at once
+
+
+def title_hashes(titles) -> np.ndarray:
+    # Stable across processes (fixed hash key), vectorized over the whole catalog
+    return pd.util.hash_array(np.asarray(titles, dtype=object))
+
+
+def train_centroids(vectors: np.ndarray, lists: int, seed: int = 0) -> np.ndarray:
+    """Spherical k-means on a sample of ``vectors``: ``lists`` unit-norm centroids."""
+    rng = np.random.default_rng(seed)
+    sample = vectors[np.sort(rng.choice(len(vectors), min(len(vectors), lists * KMEANS_SAMPLE_PER_LIST),
+                                        replace=False))]
+    centroids = sample[rng.choice(len(sample), lists, replace=False)].copy()
+    for _ in range(KMEANS_ITERATIONS):
+        assign = np.argmax(sample @ centroids.T, axis=1)
+        order = np.argsort(assign, kind="stable")
+        used, starts = np.unique(assign[order], return_index=True)
+        sums = np.add.reduceat(sample[order], starts, axis=0)
+        # Empty clusters keep their previous centroid
+        centroids[used] = sums / np.linalg.norm(sums, axis=1, keepdims=True)
+    return centroids
+
+
+def assign_lists(vectors: np.ndarray, centroids: np.ndarray) -> np.ndarray:
+    return np.concatenate([np.argmax(vectors[i:i + ASSIGN_CHUNK] @ centroids.T, axis=1)
+                           for i in range(0, len(vectors), ASSIGN_CHUNK)] or [np.zeros(0, dtype=np.int64)])
+
+
+class VectorGeneration:
+    """One immutable loaded generation: ids, title hashes, vectors and, when clustered, centroids and offsets."""
+
+    def __init__(self, name: str | None, ids: np.ndarray, hashes: np.ndarray, vectors: np.ndarray,
+                 centroids: np.ndarray | None = None, offsets: np.ndarray | None = None):
+        self.name = name
+        self.ids = ids
+        self.hashes = hashes
+        self.vectors = vectors
+        self.centroids = centroids
+        self.offsets = offsets  # rows of cluster c are offsets[c]:offsets[c + 1]
+
+    @classmethod
+    def empty(cls) -> "VectorGeneration":
+        return cls(None, np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.uint64), np.zeros((0, 0), dtype=np.float32))
+
+    @classmethod
+    def read(cls, path: Path) -> "VectorGeneration":
+        clustered = (path / "centroids.npy").exists()
+        return cls(path.name, np.load(path / "ids.npy"), np.load(path / "hashes.npy"),
+                   np.load(path / "vectors.npy", mmap_mode="r"),
+                   np.load(path / "centroids.npy") if clustered else None,
+                   np.load(path / "offsets.npy") if clustered else None)
+
+    def __len__(self):
+        return len(self.ids)
+
+    def candidate_scores(self, vector: np.ndarray, probes: int, exact: bool) -> tuple[np.ndarray, np.ndarray]:
+        """``(row positions, scores)`` of every row, or of the rows in the ``probes`` nearest clusters."""
+        if self.centroids is None or exact:
+            return np.arange(len(self)), self.vectors @ vector
+        probes = min(probes, len(self.centroids))
+        nearest = np.argpartition(-(self.centroids @ vector), probes - 1)[:probes]
+        # Each cluster is a contiguous slice of the memory-mapped matrix
+        slices = [(self.offsets[c], self.offsets[c + 1]) for c in nearest if self.offsets[c + 1] > self.offsets[c]]
+        if not slices:
+            return np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.float32)
+        positions = np.concatenate([np.arange(start, end) for start, end in slices])
+        return positions, np.concatenate([self.vectors[start:end] @ vector for start, end in slices])
+
+
+class ProductVectorIndex:
+    """Persisted, memory-mapped embeddings of product titles, keyed by product id.
+
+    A generation is a directory of ``ids.npy``, ``hashes.npy`` (of the embedded
+    title) and ``vectors.npy`` (unit-norm float32, memory-mapped on load) under
+    ``index_dir/<catalog table>-<encoder hash>/``. ``sync`` writes a new
+    generation and points ``CURRENT`` at it with an atomic rename, so readers
+    in other processes always load a complete one. In this process, the loaded
+    generation is one ``VectorGeneration`` swapped as a single reference, so a
+    search running while another thread reloads sees either the old or the new
+    one, never a mix.
+
+    From ``IVF_MIN_ROWS`` products on, rows are also clustered around
+    ``sqrt(rows)`` k-means centroids and stored cluster by cluster
+    (``centroids.npy``, ``offsets.npy``): a search scores the centroids, then
+    only the rows of the ``probes`` nearest clusters, instead of every row.
+    Rows keep their cluster across syncs; new titles join the nearest one and
+    the centroids are retrained once the catalog has grown fourfold.
+    """
+
+    def __init__(self, encoder_name: str, index_dir: str, catalog: str = "public.amazon_product_data",
+                 probes: int = 32):
+        self._root = Path(index_dir) / f"{catalog}-{hashlib.sha256(encoder_name.encode()).hexdigest()[:12]}"
+        self.probes = probes
+        self.live = VectorGeneration.empty()
+        self.load()
+
+    @property
+    def generation(self) -> str | None:
+        return self.live.name
+
+    def count(self) -> int:
+        return len(self.live)
+
+    def current_generation(self) -> str | None:
+        try:
+            return (self._root / CURRENT_FILE).read_text().strip() or None
+        except FileNotFoundError:
+            return None
+
+    def load(self) -> bool:
+        """Map the live generation if it is not the loaded one; returns whether it changed."""
+        generation = self.current_generation()
+        if generation is None or generation == self.live.name:
+            return False
+        live = VectorGeneration.read(self._root / generation)
+        self.live = live
+        log_event("product_vectors.load", generation=generation, rows=len(live),
+                  lists=len(live.centroids) if live.centroids is not None else 0)
+        return True
+
+    def sync(self, ids, titles: list[str], embed, *, batch_size: int, dry_run: bool = False) -> IngestReport:
+        """Make the index hold exactly ``ids``, embedding only titles it does not have yet."""
+        t0 = time.perf_counter()
+        live = self.live
+        ids = np.asarray(ids, dtype=np.int64)
+        hashes = title_hashes(titles)
+        # Position of each id in the current generation (-1: new); ids are the catalog's primary key
+        position = np.full(len(ids), -1)
+        if len(live):
+            order = np.argsort(live.ids)
+            candidate = order[np.minimum(np.searchsorted(live.ids, ids, sorter=order), len(live) - 1)]
+            position = np.where(live.ids[candidate] == ids, candidate, -1)
+        unchanged = position >= 0
+        unchanged[unchanged] = live.hashes[position[unchanged]] == hashes[unchanged]
+        stale = len(live) - int((position >= 0).sum())
+        embed_rows = np.flatnonzero(~unchanged)
+        batches = [embed_rows[i:i + batch_size] for i in range(0, len(embed_rows), batch_size)]
+        log_event("product_vectors.plan", rows=len(ids), unchanged=int(unchanged.sum()), embed=len(embed_rows),
+                  delete=stale, dry_run=dry_run)
+        if dry_run or (not len(embed_rows) and not stale):
+            return IngestReport(len(ids), int(unchanged.sum()), len(embed_rows), stale, len(batches),
+                                time.perf_counter() - t0)
+
+        vectors = None
+        if unchanged.any():
+            vectors = np.empty((len(ids), live.vectors.shape[1]), dtype=np.float32)
+            vectors[unchanged] = live.vectors[position[unchanged]]
+        for batch in batches:
+            embedded = np.asarray(embed([titles[i] for i in batch]), dtype=np.float32)
+            if vectors is None:
+                vectors = np.empty((len(ids), embedded.shape[1]), dtype=np.float32)
+            vectors[batch] = embedded / np.linalg.norm(embedded, axis=1, keepdims=True)
+        if vectors is None:
+            vectors = np.zeros((0, 0), dtype=np.float32)
+        self._write(ids, hashes, vectors, *self._cluster(live, vectors, position, unchanged))
+        report = IngestReport(len(ids), int(unchanged.sum()), len(embed_rows), stale, len(batches),
+                              time.perf_counter() - t0)
+        log_event("product_vectors.sync", **report.as_dict())
+        return report
+
+    @staticmethod
+    def _cluster(live: VectorGeneration, vectors: np.ndarray, position: np.ndarray, unchanged: np.ndarray):
+        """``(centroids, cluster of each row)`` for the new generation, or ``(None, None)`` below IVF_MIN_ROWS."""
+        if len(vectors) < IVF_MIN_ROWS:
+            return None, None
+        lists = int(np.sqrt(len(vectors)))
+        if live.centroids is None or len(live.centroids) * 2 < lists:
+            centroids = train_centroids(vectors, lists)
+            return centroids, assign_lists(vectors, centroids)
+        assign = np.empty(len(vectors), dtype=np.int64)
+        # Unchanged rows stay in their cluster; only new and retitled ones are scored against the centroids
+        assign[unchanged] = np.searchsorted(live.offsets, position[unchanged], side="right") - 1
+        assign[~unchanged] = assign_lists(vectors[~unchanged], live.centroids)
+        return live.centroids, assign
+
+    def _write(self, ids: np.ndarray, hashes: np.ndarray, vectors: np.ndarray,
+               centroids: np.ndarray | None, assign: np.ndarray | None):
+        generation = f"gen-{time.time_ns()}"
+        path = self._root / generation
+        path.mkdir(parents=True)
+        if centroids is not None:
+            order = np.argsort(assign, kind="stable")
+            ids, hashes, vectors = ids[order], hashes[order], vectors[order]
+            np.save(path / "centroids.npy", centroids)
+            np.save(path / "offsets.npy", np.searchsorted(assign[order], np.arange(len(centroids) + 1)))
+        np.save(path / "ids.npy", ids)
+        np.save(path / "hashes.npy", hashes)
+        np.save(path / "vectors.npy", vectors)
+        with atomic_write(self._root / CURRENT_FILE, "w") as f:
+            f.write(generation)
+        self.load()
+        for old in sorted(p for p in self._root.glob("gen-*") if p.is_dir())[:-KEEP_GENERATIONS]:
+            for file in old.iterdir():
+                file.unlink()
+            old.rmdir()
+
+    def search(self, vector: np.ndarray, k: int, min_score: float = -1.0,
+               exact: bool = False) -> tuple[np.ndarray, np.ndarray]:
+        """``(ids, cosine scores)`` of the ``k`` nearest titles scoring at least ``min_score``, best first."""
+        live = self.live  # read once: a concurrent reload swaps the reference, not the arrays
+        positions, scores = live.candidate_scores(np.asarray(vector, dtype=np.float32), self.probes, exact)
+        k = min(k, len(positions))
+        if k == 0:
+            return np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.float32)
+        # argpartition finds the top-k in O(n); only those k are sorted
+        top = np.argpartition(-scores, k - 1)[:k]
+        top = top[np.argsort(-scores[top])]
+        top = top[scores[top] >= min_score]
+        return live.ids[positions[top]], scores[top]
@@ -1,16 +1,26 @@
+import time
+
+_IMPORT_STARTED = time.perf_counter()
+
+import asyncio
 import uvicorn
+from contextlib import asynccontextmanager
 from fastapi import FastAPI
-from fastapi.responses import HTMLResponse
+from fastapi.responses import HTMLResponse, PlainTextResponse
 from fastapi.middleware.cors import CORSMiddleware
-from slowapi import Limiter, _rate_limit_exceeded_handler
-from slowapi.util import get_remote_address
-from slowapi.errors import RateLimitExceeded
 from app.api.v1 import chat_bot_api
-from app.core.config import config
+from app.core.config import config, startup_config
+from app.core.logging import log_event
+from app.core.metrics import REGISTRY
+from app.core.startup import readiness, warm_up
 from app.db import postgresdb
+from app.db.checkpointer import close_checkpointer
+from app.services.llm_gateway import llm_gateway
 from app.models.amazon_data_model import Base
 from app.components.html_content import HTML_CONTENT
 
+log_event("startup.imports", seconds=round(time.perf_counter() - _IMPORT_STARTED, 3))
+
 
 # Create database tables
 # Base.metadata.create_all(bind=postgresdb.engine)
@@ -21,13 +31,22 @@ origin = [
     "https://e-commerce-chatbot-kappa.vercel.app"
 ]
 
-# Initialize the limiter (using IP address as the key)
-limiter = Limiter(key_func=get_remote_address)
-app = FastAPI(title=config.app_name)
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Components (router model, LLM clients, FAQ index, checkpointer, ...) load concurrently.
+    # In background mode the server accepts traffic at once; requests wait only on what they use.
+    warmup = None
+    if startup_config.STARTUP_WARMUP == "blocking":
+        await warm_up()
+    elif startup_config.STARTUP_WARMUP == "background":
+        warmup = asyncio.create_task(warm_up())
+    yield
+    if warmup is not None and not warmup.done():
+        warmup.cancel()
+    await close_checkpointer()
+    await llm_gateway.aclose()
 
-# Attach limiter to app state and handle errors
-app.state.limiter = limiter
-app.add_exception_handler(RateLimitExceeded, _rate_limit_exceeded_handler)
+app = FastAPI(title=config.app_name, lifespan=lifespan)
 
 app.add_middleware(
     CORSMiddleware,
@@ -43,7 +62,13 @@ async def read_root():
 
 @app.get("/ping")
 async def ping():
-    return {"status": "ok"}
+    # Always 200 (liveness); the body reports per-component readiness
+    return readiness()
+
+@app.get("/metrics", response_class=PlainTextResponse)
+async def metrics():
+    # Prometheus text format: chat turn and step latency, routes, caches, tokens, LLM gateway
+    return PlainTextResponse(REGISTRY.render(), media_type="text/plain; version=0.0.4")
 
 # Register API routers
 app.include_router(chat_bot_api.router, prefix="/api/v1")
\ No newline at end of file
@@ -1,11 +1,30 @@
-from sqlalchemy import Column, Integer, String, Float
+from sqlalchemy import Column, Index, Integer, String, Float
+from sqlalchemy.dialects.postgresql import TSVECTOR
 from sqlalchemy.ext.declarative import declarative_base
 
 Base = declarative_base()
 
+SEARCH_COLUMNS = ("title", "brand", "category")
+
+
+def search_document(row: str = "") -> str:
+    """Full-text document of a product, over the columns of ``row`` (``"NEW."`` in a trigger)."""
+    # The 'english' config keeps the expression immutable, so it can be indexed
+    return "to_tsvector('english', " + " || ' ' || ".join(f"coalesce({row}{c}, '')" for c in SEARCH_COLUMNS) + ")"
+
+
+SEARCH_DOCUMENT = search_document()
+
+
+def _trigram_index(column: str) -> Index:
+    # Serves ILIKE '%keyword%' (and equality) on free-text columns
+    return Index(f"amazon_product_data_{column}_trgm_idx", column,
+                 postgresql_using="gin", postgresql_ops={column: "gin_trgm_ops"})
+
+
 class amazonProductSchema(Base):
     __tablename__ = 'amazon_product_data'
-    
+
     id = Column(Integer, primary_key=True, index=True)
     product_link = Column(String)
     title = Column(String)
@@ -15,4 +34,21 @@ class amazonProductSchema(Base):
     total_ratings = Column(Integer)
     availability = Column(String)
     category = Column(String)
-    price = Column(Float)
\ No newline at end of file
+    price = Column(Float)
+    # SEARCH_DOCUMENT, kept current by the trigger ``app.db.product_indexes`` installs
+    search_tsv = Column(TSVECTOR)
+
+    # Created on an existing database by ``python -m app.db.product_indexes``
+    __table_args__ = (
+        _trigram_index("title"),
+        _trigram_index("brand"),
+        _trigram_index("category"),
+        Index("amazon_product_data_price_idx", "price"),
+        Index("amazon_product_data_search_tsv_idx", "search_tsv", postgresql_using="gin"),
+    )
+
+
+# Ordered like the product sorts of ``sql_fast_path.ORDER_BY`` so top-N queries read the index in order
+Index("amazon_product_data_avg_rating_idx", amazonProductSchema.avg_rating.desc().nulls_last(),
+      amazonProductSchema.total_ratings.desc().nulls_last())
+Index("amazon_product_data_discount_idx", amazonProductSchema.discount.desc().nulls_last())
@@ -1,6 +1,7 @@
 from typing import TypedDict, Annotated, Literal
 from pydantic import BaseModel, Field
 from langgraph.graph.message import add_messages
+from app.core.config import batch_config
 
 class ChatBotRequest(BaseModel):
     question: str
@@ -8,9 +9,24 @@ class ChatBotRequest(BaseModel):
 
 class ChatBotResponse(BaseModel):
     answer: str
+    # The turn's trace (spans, route, caches, tokens); only when the request sent METRICS_DEBUG_HEADER
+    debug: dict | None = None
+
+class ChatBotBatchRequest(BaseModel):
+    requests: list[ChatBotRequest] = Field(min_length=1, max_length=batch_config.CHAT_BATCH_MAX_SIZE)
+    concurrency: int = Field(default=batch_config.CHAT_BATCH_CONCURRENCY, ge=1, le=64)
+
+class ChatBotBatchResponse(BaseModel):
+    answers: list[str]
+    # Semantic-router decision per question (None = ambiguous, sent to the LLM router)
+    routes: list[str | None]
 
 class ChatBotState(TypedDict):
     messages: Annotated[list, add_messages]
+    destination: str
+    # Running summary of turns older than the history window, and the id of the last message it covers
+    summary: str
+    summary_until: str
 
 class RouterDecision(BaseModel):
     """Decide the most appropriate route for the user's question."""
@@ -0,0 +1,151 @@
+"""Multi-worker entry point: ``python -m app.serve --workers 4``.
+
+A prefork server: the parent binds the socket and forks ``WEB_CONCURRENCY``
+uvicorn workers that accept on it, and restarts a worker that dies. With
+``SERVE_PRELOAD`` the parent imports the app first (FastAPI, LangChain,
+LangGraph, NumPy, SQLAlchemy, ...) and freezes the garbage collector, so the
+workers share those pages copy-on-write instead of each importing them.
+
+A worker exits with its real status (uvicorn's ``STARTUP_FAILURE`` if it never
+started serving). After ``SERVE_MAX_BOOT_FAILURES`` boot failures in a row of
+one worker the parent stops the others and exits with that status, rather
+than restarting a broken deployment forever.
+
+Models are not loaded before the fork: ONNX Runtime sessions (FastEmbed) and
+the HTTP/database pools are not fork-safe, so each worker builds its own in
+its startup warm-up. The router and FAQ vectors are memory-mapped from
+``ROUTER_INDEX_DIR``/``FAQ_INDEX_DIR``, so those pages are shared through the
+page cache anyway.
+
+Workers share no memory at runtime. Any worker can serve any turn of any
+thread (no sticky sessions) only when the state lives outside the process:
+
+- ``CHECKPOINTER=sqlite`` (one host) or ``postgres`` (several machines);
+- ``RATE_LIMIT_STORAGE_URI=sqlite:///...`` or ``postgresql://...``.
+
+The answer and SQL caches, speculation budgets and LLM concurrency limits
+(``LLM_MAX_CONCURRENCY``) stay per worker.
+"""
+import argparse
+import gc
+import os
+import signal
+import socket
+import sys
+import time
+
+import uvicorn
+from uvicorn.config import STARTUP_FAILURE
+
+from app.core.config import serve_config
+from app.core.logging import log_event, logger
+
+APP = "app.main:app"
+
+
+def _bind(host: str, port: int) -> socket.socket:
+    sock = socket.socket(socket.AF_INET6 if ":" in host else socket.AF_INET, socket.SOCK_STREAM)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    sock.bind((host, port))
+    sock.listen(2048)
+    sock.set_inheritable(True)
+    return sock
+
+
+def _worker(sock: socket.socket, args) -> int:
+    """Run one uvicorn worker on ``sock``; returns its exit status."""
+    # Undo the parent's handlers; uvicorn installs its own for a graceful shutdown
+    signal.signal(signal.SIGTERM, signal.SIG_DFL)
+    signal.signal(signal.SIGINT, signal.SIG_DFL)
+    server = uvicorn.Server(uvicorn.Config(APP, log_level=args.log_level, timeout_graceful_shutdown=30))
+    try:
+        server.run(sockets=[sock])
+    except SystemExit as e:
+        # uvicorn exits with STARTUP_FAILURE when the app cannot be imported
+        return e.code if isinstance(e.code, int) else 1
+    except Exception:
+        logger.exception("Worker crashed")
+        return 1 if server.started else STARTUP_FAILURE
+    # A failed lifespan startup returns without serving
+    return 0 if server.started else STARTUP_FAILURE
+
+
+def serve(host: str, port: int, workers: int, args) -> int:
+    """Serve until stopped; returns the exit status of the server."""
+    if workers <= 1:
+        uvicorn.run(APP, host=host, port=port, log_level=args.log_level)
+        return 0
+
+    if serve_config.SERVE_PRELOAD:
+        t0 = time.perf_counter()
+        import app.main  # noqa: F401
+        # Objects created so far are never collected in the workers, so the collector never writes to their pages
+        gc.collect()
+        gc.freeze()
+        log_event("serve.preload", seconds=round(time.perf_counter() - t0, 3))
+
+    sock = _bind(host, port)
+    children: dict[int, int] = {}  # pid -> worker index
+    boot_failures: dict[int, int] = {}  # worker index -> boot failures in a row
+    stopping = False
+    exit_status = 0
+
+    def spawn(index: int):
+        pid = os.fork()
+        if pid == 0:
+            status = 1
+            try:
+                status = _worker(sock, args)
+            finally:
+                # Never return into the parent's loop
+                os._exit(status)
+        children[pid] = index
+        log_event("serve.worker", index=index, pid=pid)
+
+    def stop(signum, _frame):
+        nonlocal stopping
+        stopping = True
+        for pid in children:
+            try:
+                os.kill(pid, signal.SIGTERM)
+            except ProcessLookupError:
+                pass
+
+    signal.signal(signal.SIGTERM, stop)
+    signal.signal(signal.SIGINT, stop)
+    log_event("serve.start", host=host, port=port, workers=workers, preload=serve_config.SERVE_PRELOAD)
+    for index in range(workers):
+        spawn(index)
+
+    while children:
+        try:
+            pid, status = os.wait()
+        except ChildProcessError:
+            break
+        except InterruptedError:
+            continue
+        index = children.pop(pid, None)
+        if index is None or stopping:
+            continue
+        code = os.waitstatus_to_exitcode(status)  # negative: killed by that signal
+        log_event("serve.worker_exit", index=index, pid=pid, status=code)
+        boot_failures[index] = boot_failures.get(index, 0) + 1 if code == STARTUP_FAILURE else 0
+        if boot_failures[index] >= serve_config.SERVE_MAX_BOOT_FAILURES:
+            log_event("serve.boot_failed", index=index, attempts=boot_failures[index])
+            exit_status = STARTUP_FAILURE
+            stop(signal.SIGTERM, None)
+            continue
+        time.sleep(1)  # don't spin if a worker dies on boot
+        spawn(index)
+    sock.close()
+    return exit_status
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Serve the API with several worker processes.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8000)
+    parser.add_argument("--workers", type=int, default=serve_config.WEB_CONCURRENCY)
+    parser.add_argument("--log-level", default="info")
+    args = parser.parse_args()
+    sys.exit(serve(args.host, args.port, args.workers, args))
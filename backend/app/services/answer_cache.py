@@ -0,0 +1,252 @@
+import asyncio
+import hashlib
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from datetime import datetime, timezone
+
+import numpy as np
+from sqlalchemy import text
+
+from app.core.config import answer_cache_config
+from app.core.logging import log_event
+from app.services.normalize import normalize_query
+
+# Answers produced by failure paths must never be replayed from the cache
+UNCACHEABLE_PREFIXES = ("Configuration error", "Groq API call failed", "I encountered an error")
+
+
+@dataclass
+class CachedAnswer:
+    key: str
+    route: str
+    question: str
+    answer: str
+    expires_at: float
+    similarity: float = 1.0
+
+
+class LocalAnswerTier:
+    """Fixed-capacity LRU of answers and their unit-norm query embeddings.
+
+    Embeddings live in one preallocated matrix so a lookup is a single
+    matrix-vector product over every live slot.
+    """
+
+    def __init__(self, capacity: int):
+        self.capacity = capacity
+        self._matrix: np.ndarray | None = None
+        self._expires = np.zeros(capacity, dtype=np.float64)  # 0 marks a free slot
+        self._entries: OrderedDict[int, CachedAnswer] = OrderedDict()  # slot -> entry, LRU order
+        self._slots: dict[str, int] = {}  # normalized question -> slot
+        self._free = list(range(capacity - 1, -1, -1))
+
+    def __len__(self):
+        return len(self._entries)
+
+    def _release(self, slot: int):
+        entry = self._entries.pop(slot)
+        self._slots.pop(entry.key, None)
+        self._expires[slot] = 0
+        self._free.append(slot)
+
+    def search(self, vector: np.ndarray, now: float, threshold: float) -> CachedAnswer | None:
+        if not self._entries:
+            return None
+        scores = self._matrix @ vector
+        scores[self._expires <= now] = -np.inf
+        slot = int(np.argmax(scores))
+        if scores[slot] < threshold:
+            return None
+        self._entries.move_to_end(slot)
+        entry = self._entries[slot]
+        entry.similarity = float(scores[slot])
+        return entry
+
+    def put(self, entry: CachedAnswer, vector: np.ndarray):
+        if self._matrix is None:
+            self._matrix = np.zeros((self.capacity, vector.shape[0]), dtype=np.float32)
+        if entry.key in self._slots:
+            self._release(self._slots[entry.key])
+        if not self._free:
+            self._release(next(iter(self._entries)))
+        slot = self._free.pop()
+        self._matrix[slot] = vector
+        self._expires[slot] = entry.expires_at
+        self._entries[slot] = entry
+        self._slots[entry.key] = slot
+
+    def purge_expired(self, now: float):
+        for slot in [s for s, e in self._entries.items() if e.expires_at <= now]:
+            self._release(slot)
+
+
+class PostgresAnswerTier:
+    """Shared tier: answers stored in Postgres and pulled into each process's local tier."""
+
+    def __init__(self, engine):
+        self._engine = engine
+
+    async def setup(self):
+        async with self._engine.begin() as conn:
+            await conn.execute(text("""
+                CREATE TABLE IF NOT EXISTS semantic_answer_cache (
+                    question_key TEXT PRIMARY KEY,
+                    route TEXT NOT NULL,
+                    question TEXT NOT NULL,
+                    embedding BYTEA NOT NULL,
+                    answer TEXT NOT NULL,
+                    created_at TIMESTAMPTZ NOT NULL DEFAULT now(),
+                    expires_at TIMESTAMPTZ NOT NULL
+                )
+            """))
+            await conn.execute(text(
+                "CREATE INDEX IF NOT EXISTS semantic_answer_cache_created_at_idx ON semantic_answer_cache (created_at)"
+            ))
+
+    async def put(self, entry: CachedAnswer, vector: np.ndarray):
+        async with self._engine.begin() as conn:
+            await conn.execute(text("""
+                INSERT INTO semantic_answer_cache (question_key, route, question, embedding, answer, expires_at)
+                VALUES (:key, :route, :question, :embedding, :answer, :expires_at)
+                ON CONFLICT (question_key) DO UPDATE SET
+                    route = EXCLUDED.route, embedding = EXCLUDED.embedding, answer = EXCLUDED.answer,
+                    created_at = now(), expires_at = EXCLUDED.expires_at
+            """), {
+                "key": hashlib.sha1(entry.key.encode()).hexdigest(),
+                "route": entry.route,
+                "question": entry.key,
+                "embedding": vector.astype(np.float32).tobytes(),
+                "answer": entry.answer,
+                "expires_at": datetime.fromtimestamp(entry.expires_at, tz=timezone.utc),
+            })
+
+    async def fetch_since(self, since: datetime, limit: int):
+        """Newest unexpired rows created after ``since`` (oldest first), and the new watermark."""
+        async with self._engine.begin() as conn:
+            await conn.execute(text("DELETE FROM semantic_answer_cache WHERE expires_at < now()"))
+            result = await conn.execute(text("""
+                SELECT route, question, embedding, answer, created_at, expires_at
+                FROM semantic_answer_cache
+                WHERE created_at > :since AND expires_at > now()
+                ORDER BY created_at DESC
+                LIMIT :limit
+            """), {"since": since, "limit": limit})
+            rows = result.fetchall()[::-1]
+        watermark = rows[-1].created_at if rows else since
+        return rows, watermark
+
+
+class SemanticAnswerCache:
+    """Embedding-keyed answer cache in front of the chat graph.
+
+    Only answers from ``routes`` are stored. The chat route consults it on a
+    thread's first turn only, so neither a cached answer nor the question it
+    answers depends on a conversation's history.
+    """
+
+    def __init__(self, encode, *, routes, threshold: float, capacity: int, ttl_seconds: float,
+                 shared: PostgresAnswerTier | None = None, sync_seconds: float = 30):
+        self._encode = encode
+        self.routes = set(routes)
+        self.threshold = threshold
+        self.ttl_seconds = ttl_seconds
+        self.local = LocalAnswerTier(capacity)
+        self.shared = shared
+        self.sync_seconds = sync_seconds
+        self._synced_at = 0.0
+        self._watermark = datetime.fromtimestamp(0, tz=timezone.utc)
+        self._lock = asyncio.Lock()
+        self._pending_writes: set[asyncio.Task] = set()
+        self.counters = {"hits": 0, "misses": 0, "stores": 0, "shared_loaded": 0, "lookup_ms_total": 0.0}
+
+    async def setup(self):
+        if self.shared is not None:
+            await self.shared.setup()
+
+    async def _maintain(self, now: float):
+        """Every ``sync_seconds``: free expired local slots and pull new shared entries."""
+        if now - self._synced_at < self.sync_seconds:
+            return
+        self._synced_at = now
+        self.local.purge_expired(now)
+        if self.shared is None:
+            return
+        try:
+            rows, self._watermark = await self.shared.fetch_since(self._watermark, self.local.capacity)
+        except Exception as e:
+            log_event("answer_cache.sync.error", error=str(e))
+            return
+        for row in rows:
+            entry = CachedAnswer(row.question, row.route, row.question, row.answer, row.expires_at.timestamp())
+            self.local.put(entry, np.frombuffer(row.embedding, dtype=np.float32))
+        self.counters["shared_loaded"] += len(rows)
+
+    async def lookup(self, question: str, vector: np.ndarray | None = None):
+        """Return ``(hit, vector)``; the vector is reused by ``store`` on a miss."""
+        t0 = time.perf_counter()
+        now = time.time()
+        if vector is None:
+            vector = (await self._encode([question]))[0]
+        async with self._lock:
+            await self._maintain(now)
+            hit = self.local.search(vector, now, self.threshold)
+        self.counters["hits" if hit else "misses"] += 1
+        self.counters["lookup_ms_total"] += (time.perf_counter() - t0) * 1000
+        log_event(
+            "answer_cache.hit" if hit else "answer_cache.miss",
+            route=hit.route if hit else None,
+            similarity=round(hit.similarity, 4) if hit else None,
+            ms=round((time.perf_counter() - t0) * 1000, 1),
+        )
+        return hit, vector
+
+    async def store(self, question: str, vector: np.ndarray, route: str, answer: str):
+        if route not in self.routes or not answer or answer.startswith(UNCACHEABLE_PREFIXES):
+            return
+        key = normalize_query(question)
+        entry = CachedAnswer(key, route, question, answer, time.time() + self.ttl_seconds)
+        async with self._lock:
+            self.local.put(entry, vector)
+        self.counters["stores"] += 1
+        if self.shared is not None:
+            # Don't hold the response on the shared write
+            task = asyncio.create_task(self._store_shared(entry, vector))
+            self._pending_writes.add(task)
+            task.add_done_callback(self._pending_writes.discard)
+
+    async def _store_shared(self, entry: CachedAnswer, vector: np.ndarray):
+        try:
+            await self.shared.put(entry, vector)
+        except Exception as e:
+            log_event("answer_cache.store.error", error=str(e))
+
+    def stats(self) -> dict:
+        lookups = self.counters["hits"] + self.counters["misses"]
+        return {
+            **self.counters,
+            "hit_ratio": round(self.counters["hits"] / lookups, 4) if lookups else 0.0,
+            "avg_lookup_ms": round(self.counters["lookup_ms_total"] / lookups, 2) if lookups else 0.0,
+            "entries": len(self.local),
+            "shared": self.shared is not None,
+        }
+
+
+def build_answer_cache():
+    if not answer_cache_config.ANSWER_CACHE_ENABLED:
+        return None
+    from app.db.postgresdb import async_engine
+    from app.services.router_search import aencode_queries
+
+    return SemanticAnswerCache(
+        aencode_queries,
+        routes=answer_cache_config.ANSWER_CACHE_ROUTES,
+        threshold=answer_cache_config.ANSWER_CACHE_THRESHOLD,
+        capacity=answer_cache_config.ANSWER_CACHE_CAPACITY,
+        ttl_seconds=answer_cache_config.ANSWER_CACHE_TTL_SECONDS,
+        shared=PostgresAnswerTier(async_engine) if answer_cache_config.ANSWER_CACHE_SHARED else None,
+        sync_seconds=answer_cache_config.ANSWER_CACHE_SYNC_SECONDS,
+    )
+
+
+answer_cache = build_answer_cache()
@@ -1,86 +1,227 @@
+import asyncio
+import time
 from typing import List, Literal
-from langchain.chat_models import init_chat_model
 from langchain_core.messages import HumanMessage, AIMessage, BaseMessage
+from langchain_core.runnables import RunnableConfig
 from langgraph.graph import StateGraph, START, END
-from langgraph.checkpoint.memory import MemorySaver
 
-from app.core.config import google_config
-from app.db.postgresdb import get_db
+from app.core.cache import MISSING
+from app.core.config import batch_config, faq_config, router_config, speculation_config, sql_config
+from app.core.startup import component
+from app.db.postgresdb import get_async_db
+from app.db.checkpointer import checkpointer, open_checkpointer
+from app.db.product_indexes import ensure_product_indexes
 from app.models.chat_bot_model import ChatBotState, ChatBotRequest, RouterDecision
-from app.services.router_search import check_route
+from app.services.router_search import (
+    acheck_route, acheck_route_scores, acheck_route_vector, aencode_queries, encoder_name, get_router, routes_for_vectors,
+)
+from app.services.intent_classifier import IntentClassifier
+from app.services.sql_fast_path import ANAPHORA
 from app.services.sql_query import SQLQueryService
 from app.services.chat_bot_service import ChatBotService
 from app.services.small_talk import SmallTalkService
+from app.services.streaming import ANSWER_TAG, ANSWER_NODES, sse_event
+from app.services.context_window import build_context, update_summary
+from app.services.answer_cache import answer_cache
+from app.services.product_engine import product_engine
+from app.services.product_search import product_search
+from app.services.speculation import Speculation, SpeculationBudget
+from app.services.llm_gateway import llm_gateway
+from app.core.logging import log_event, logger
+from app.core.metrics import annotate, cache_result, request_trace, span
 
-# 1. PRE-INITIALIZE MODELS & SERVICES (Optimal Way)
-# Initialize models once globally to avoid overhead
-BASE_LLM = init_chat_model(
-    model="google_genai:gemini-2.0-flash",
-    api_key=google_config.GOOGLE_API_KEY,
-    temperature=0.2
-)
+# 1. LAZY MODELS & SERVICES
+# Nothing slow runs at import time. Each service is a startup component: the
+# app lifespan warms them concurrently, and a request only waits (await .get())
+# on the components it actually uses.
+
+def build_base_llm():
+    return llm_gateway.chat("google_genai", "gemini-2.0-flash", purpose="summary", temperature=0.2)
 
-# Initialize Services once (Ingest FAQ data once at startup, not per request)
-FAQ_SERVICE = ChatBotService()
-FAQ_SERVICE.ingest_faq_data() 
-SMALL_TALK_SERVICE = SmallTalkService()
+def build_faq_service():
+    # Ingest FAQ data once, not per request; only new or edited rows are embedded
+    service = ChatBotService()
+    if faq_config.FAQ_INGEST_ON_STARTUP:
+        service.ingest_faq_data()
+    return service
 
-# Create the structured router LLM
-ROUTER_LLM = BASE_LLM.with_structured_output(RouterDecision)
+def load_intent_classifier():
+    # None when no artifact has been trained yet: ambiguous queries then go straight to the LLM router
+    return IntentClassifier.load(router_config.ROUTER_CLASSIFIER_DIR, encoder_name())
+
+async def build_router_llm():
+    # Create the structured router LLM
+    return (await BASE_LLM.get()).with_structured_output(RouterDecision, purpose="router")
+
+SEMANTIC_ROUTER = component("semantic_router", get_router)
+BASE_LLM = component("base_llm", build_base_llm)
+ROUTER_LLM = component("router_llm", build_router_llm, blocking=False)
+FAQ_SERVICE = component("faq", build_faq_service)
+SMALL_TALK_SERVICE = component("small_talk", SmallTalkService)
+CHECKPOINTER = component("checkpointer", open_checkpointer, blocking=False)
+ANSWER_CACHE = component("answer_cache", answer_cache.setup, blocking=False) if answer_cache is not None else None
+# Shared cost cap of speculative routing (SPECULATIVE_ROUTING)
+SPECULATION_BUDGET = SpeculationBudget(speculation_config.SPECULATIVE_MAX_STARTS_PER_MINUTE)
+INTENT_CLASSIFIER = component("intent_classifier", load_intent_classifier) if router_config.ROUTER_CLASSIFIER_DIR else None
+PRODUCT_INDEXES = component("product_indexes", ensure_product_indexes, blocking=False) if sql_config.SQL_INDEX_BOOTSTRAP else None
+PRODUCT_ENGINE = component("product_engine", product_engine.refresh, blocking=False) if product_engine is not None else None
+PRODUCT_SEARCH = component("product_search", product_search.load) if product_search is not None else None
 
 # 2. OPTIMIZED NODES
 
-def router_node(state: ChatBotState):
+async def llm_route(state: ChatBotState) -> str:
+    """LLM router with (windowed) history, so it knows what "those/it/cheapest" refer to."""
+    router_llm = await ROUTER_LLM.get()
+    t0 = time.perf_counter()
+    with span("router.llm"):
+        decision = await router_llm.ainvoke([*build_context(state, "router"), state["messages"][-1]])
+    log_event("router.llm", ms=round((time.perf_counter() - t0) * 1000, 1))
+    # Handle both dict and pydantic object return types
+    return decision.route if hasattr(decision, 'route') else decision["route"]
+
+async def classify_route(state: ChatBotState, vector) -> str | None:
+    """Local intent classifier for a query the semantic router found ambiguous; ``None`` defers to the LLM router."""
+    if INTENT_CLASSIFIER is None or vector is None:
+        return None
+    classifier = await INTENT_CLASSIFIER.get()
+    question = state["messages"][-1].content
+    # Follow-ups ("which of those is cheapest?") depend on the conversation, which only the LLM router sees
+    if classifier is None or (len(state["messages"]) > 1 and ANAPHORA.search(question.lower())):
+        return None
+    with span("router.classifier"):
+        [(route_name, _)] = classifier.classify(vector[None], router_config.ROUTER_CLASSIFIER_MIN_CONFIDENCE)
+    return route_name
+
+async def prepare_faq(question: str):
+    return await (await FAQ_SERVICE.get()).retrieve(question)
+
+async def prepare_product_inquiry(question: str, history: list):
+    async with get_async_db() as db:
+        return await SQLQueryService(db=db).fetch_rows(question, history)
+
+async def speculative_route(state: ChatBotState, speculation: Speculation) -> tuple[str, str]:
+    """Semantic router with the LLM router, and the likely destinations' first step, already running.
+
+    Returns ``(route, source)``, the source being the router that decided.
+    """
+    question = state["messages"][-1].content
+    speculation.start("router_llm", lambda: llm_route(state))
+    with span("router.semantic"):
+        route_name, ranked, vector = await acheck_route_scores(question)
+    source = "semantic"
+    if route_name is None:
+        route_name, source = await classify_route(state, vector), "classifier"
+    if route_name is None:
+        source = "llm"
+        # Prepare the best guess, and the runner-up too when the two scored close
+        close = len(ranked) > 1 and ranked[0][1] - ranked[1][1] < speculation_config.SPECULATIVE_MARGIN
+        prepare = {
+            "faq": lambda: prepare_faq(question),
+            "product_inquiry": lambda: prepare_product_inquiry(question, build_context(state, "product_inquiry")),
+        }
+        for name, _ in ranked[:2 if close else 1]:
+            if name in prepare:
+                speculation.start(name, prepare[name])
+        route_name = await speculation.take("router_llm")
+        if route_name is MISSING:
+            route_name = await llm_route(state)
+    speculation.keep(route_name)
+    log_event("speculation.route", route=route_name, semantic=bool(ranked and ranked[0][0] == route_name),
+              prepared=speculation.started(route_name), scores=[(n, round(v, 3)) for n, v in ranked[:2]])
+    return route_name, source
+
+async def prepared(config: RunnableConfig, route: str):
+    """Result of the router's speculative preparation for ``route``, else ``None``."""
+    speculation = config["configurable"].get("speculation")
+    if speculation is None:
+        return None
+    result = await speculation.take(route)
+    return None if result is MISSING else result
+
+async def router_node(state: ChatBotState, config: RunnableConfig):
     """Semantic Router first (Fast), LLM with History second (Smart)."""
+    with span("router"):
+        return await decide_route(state, config)
+
+async def decide_route(state: ChatBotState, config: RunnableConfig):
     messages = state["messages"]
     last_message = messages[-1].content
     
-    # Fast path: Semantic Router (No cost, high speed)
-    route_name = check_route(last_message)
-    
+    t0 = time.perf_counter()
+    vector = None
+
+    # Fast path: Semantic Router (No cost, high speed); batch requests arrive already routed
+    route_name, source = config["configurable"].get("route_hint", MISSING), "hint"
+    speculation = config["configurable"].get("speculation")
+    if route_name is MISSING and speculation is not None:
+        route_name, source = await speculative_route(state, speculation)
+    if route_name is MISSING:
+        with span("router.semantic"):
+            if INTENT_CLASSIFIER is not None:
+                route_name, vector = await acheck_route_vector(last_message)
+            else:
+                route_name = await acheck_route(last_message)
+        source = "semantic"
+
+    # Local classifier for ambiguous queries (CPU, sub-millisecond)
+    if route_name is None:
+        route_name, source = await classify_route(state, vector), "classifier"
+
     # Fallback path: LLM with Context (Handles "Those/It/Cheapest")
     if route_name is None:
-        print(f"--- Semantic Router ambiguous. Calling LLM Fallback ---")
-        # Optimization: Pass history so LLM knows what "Those" refers to
-        decision = ROUTER_LLM.invoke(messages)
-        # Handle both dict and pydantic object return types
-        route_name = decision.route if hasattr(decision, 'route') else decision["route"]
-    
-    print(f"--- Route Decision: {route_name} ---")
+        route_name, source = await llm_route(state), "llm"
+
+    annotate(route=route_name, route_source=source)
+    # (query, route) pairs from these events are the intent classifier's training data
+    log_event("router.decision", query=last_message, route=route_name, source=source,
+              ms=round((time.perf_counter() - t0) * 1000, 1))
     return {"destination": route_name}
 
 def route_decision(state: dict):
     return state["destination"]
 
-def faq_node(state: ChatBotState):
-    # History is already managed by state["messages"]
-    answer = FAQ_SERVICE.get_faq_answer(
-        state["messages"][-1].content, 
-        state["messages"][:-1]
-    )
+async def faq_node(state: ChatBotState, config: RunnableConfig):
+    # History is already managed by state["messages"]; only a budgeted window is sent
+    with span("faq"):
+        faq_service = await FAQ_SERVICE.get()
+        answer = await faq_service.get_faq_answer(
+            state["messages"][-1].content,
+            build_context(state, "faq"),
+            rag_results=await prepared(config, "faq"),
+        )
     return {"messages": [AIMessage(content=answer)]}
 
-def product_inquiry_node(state: ChatBotState):
-    with get_db() as db:
-        # Pass the pre-existing DB session
-        sql_service = SQLQueryService(db=db)
-        # sql_chain handles the SQL generation and summarization internally
-        answer = sql_service.sql_chain(
-            state["messages"][-1].content, 
-            state["messages"][:-1]
-        )
-        return {"messages": [AIMessage(content=answer)]}
+async def product_inquiry_node(state: ChatBotState, config: RunnableConfig):
+    with span("product_inquiry"):
+        rows = await prepared(config, "product_inquiry")
+        async with get_async_db() as db:
+            # Pass the pre-existing DB session
+            sql_service = SQLQueryService(db=db)
+            # sql_chain handles the SQL generation and summarization internally
+            answer = await sql_service.sql_chain(
+                state["messages"][-1].content,
+                build_context(state, "product_inquiry"),
+                rows=rows,
+            )
+    return {"messages": [AIMessage(content=answer)]}
 
-def small_talk_node(state: ChatBotState):
-    answer = SMALL_TALK_SERVICE.get_response(
-        state["messages"][-1].content, 
-        state["messages"][:-1]
-    )
+async def small_talk_node(state: ChatBotState):
+    with span("small_talk"):
+        small_talk_service = await SMALL_TALK_SERVICE.get()
+        answer = await small_talk_service.get_response(
+            state["messages"][-1].content,
+            build_context(state, "small_talk")
+        )
     return {"messages": [AIMessage(content=answer)]}
 
-def default_node(state: ChatBotState):
+async def default_node(state: ChatBotState):
     return {"messages": [AIMessage(content="I'm sorry, I couldn't categorize your request. How can I help?")]}
 
+async def summarize_node(state: ChatBotState):
+    # No-op unless CONTEXT_SUMMARY_ENABLED and enough turns have left the history window
+    with span("summarize"):
+        return await update_summary(state, await BASE_LLM.get())
+
 # 3. GRAPH CONSTRUCTION
 
 builder = StateGraph(ChatBotState)
@@ -90,6 +231,7 @@ builder.add_node("faq", faq_node)
 builder.add_node("product_inquiry", product_inquiry_node)
 builder.add_node("small_talk", small_talk_node)
 builder.add_node("default", default_node)
+builder.add_node("summarize", summarize_node)
 
 builder.add_edge(START, "router")
 builder.add_conditional_edges(
@@ -103,29 +245,188 @@ builder.add_conditional_edges(
     }
 )
 
-builder.add_edge("faq", END)
-builder.add_edge("product_inquiry", END)
-builder.add_edge("small_talk", END)
-builder.add_edge("default", END)
+builder.add_edge("faq", "summarize")
+builder.add_edge("product_inquiry", "summarize")
+builder.add_edge("small_talk", "summarize")
+builder.add_edge("default", "summarize")
+builder.add_edge("summarize", END)
 
-# Persistence
-memory = MemorySaver()
-graph = builder.compile(checkpointer=memory)
+# Persistence (bounded in-memory or pooled Postgres, selected by CHECKPOINTER)
+graph = builder.compile(checkpointer=checkpointer)
 
 # 4. API ENTRY POINT
 
-def chat_bot_route(request: ChatBotRequest):
+async def lookup_cached_answer(request: ChatBotRequest, config: dict, vector=None):
+    """Serve near-duplicate FAQ/small-talk questions from the answer cache.
+
+    Returns ``(hit, vector)``. Only the first turn of a thread takes part: an
+    answer generated from earlier turns is specific to that thread, and a
+    follow-up must reach the router with its history. A hit is served only if
+    the semantic router does not send the question to another route, and the
+    turn is still written to the thread's history so follow-up questions see it.
+    The query vector is returned so a miss can be stored without encoding
+    twice (``None`` when the answer must not be stored); pass ``vector`` if the
+    question was already encoded (batch requests).
+    """
+    if answer_cache is None:
+        return None, None
+    try:
+        await ANSWER_CACHE.get()
+        if (await graph.aget_state(config)).values.get("messages"):
+            return None, None
+        with span("answer_cache"):
+            hit, vector = await answer_cache.lookup(request.question, vector)
+            if hit is not None:
+                await SEMANTIC_ROUTER.get()
+                route = (await asyncio.to_thread(routes_for_vectors, vector[None]))[0]
+                if route not in (None, hit.route):
+                    log_event("answer_cache.rejected", route=route, cached_route=hit.route)
+                    hit = None
+    except Exception as e:
+        logger.warning("Answer cache lookup failed: %s", e)
+        return None, None
+    cache_result("answer", hit is not None)
+    if hit is not None:
+        annotate(route=hit.route, route_source="answer_cache")
+        await graph.aupdate_state(
+            config,
+            {"messages": [HumanMessage(content=request.question), AIMessage(content=hit.answer)], "destination": hit.route},
+            as_node="summarize",
+        )
+    return hit, vector
+
+async def store_cached_answer(request: ChatBotRequest, vector, route: str, answer: str):
+    # ``vector`` is None unless lookup_cached_answer found the thread without history
+    if answer_cache is not None and vector is not None:
+        await answer_cache.store(request.question, vector, route, answer)
+
+def turn_config(request: ChatBotRequest, route_hint=MISSING) -> dict:
+    config = {"configurable": {"thread_id": request.thread_id}}
+    if route_hint is not MISSING:
+        config["configurable"]["route_hint"] = route_hint
+    elif speculation_config.SPECULATIVE_ROUTING:
+        # Per-turn speculative tasks; not persisted (checkpoint metadata keeps only plain values)
+        config["configurable"]["speculation"] = Speculation(SPECULATION_BUDGET)
+    return config
+
+def end_turn(config: dict):
+    # Speculative work still running after the turn (an error, a cache hit) is dropped
+    speculation = config["configurable"].get("speculation")
+    if speculation is not None:
+        speculation.cancel()
+
+async def chat_bot_route(request: ChatBotRequest, route_hint=MISSING, vector=None):
+    """Answer one question.
+
+    ``route_hint`` (a semantic-router result, ``None`` meaning ambiguous) and
+    ``vector`` (the question's embedding) let batch callers skip per-question
+    routing and encoding.
+    """
+    # thread_id ensures the checkpointer loads the correct history
+    config = turn_config(request, route_hint)
     try:
-        # thread_id ensures MemorySaver loads the correct history
-        config = {"configurable": {"thread_id": request.thread_id}}
+        await CHECKPOINTER.get()
+
+        hit, vector = await lookup_cached_answer(request, config, vector)
+        if hit is not None:
+            return hit.answer
         
-        # LangGraph automatically merges this HumanMessage with previous history in MemorySaver
+        # LangGraph automatically merges this HumanMessage with previous history in the checkpointer
         initial_state = {"messages": [HumanMessage(content=request.question)]}
         
-        result = graph.invoke(initial_state, config=config)
-        return result["messages"][-1].content
+        with llm_gateway.deadline():
+            result = await graph.ainvoke(initial_state, config=config)
+        answer = result["messages"][-1].content
+        await store_cached_answer(request, vector, result["destination"], answer)
+        return answer
+
+    except Exception as e:
+        logger.exception("Error in chat_bot_route")
+        annotate(error=type(e).__name__)
+        return f"I encountered an error. Please try again or rephrase your question."
+    finally:
+        end_turn(config)
+
+async def chat_bot_batch(requests: list[ChatBotRequest], concurrency: int = batch_config.CHAT_BATCH_CONCURRENCY):
+    """Answer many independent questions, e.g. when replaying logged traffic.
+
+    All questions are encoded in one call and routed in one vectorized pass;
+    the graph runs are then fanned out with at most ``concurrency`` in flight.
+    Returns ``(answers, routes)`` where ``routes`` are the semantic-router or
+    intent-classifier decisions (``None`` = ambiguous, resolved by the LLM router).
+    """
+    await SEMANTIC_ROUTER.get()
+    vectors = await aencode_queries([r.question for r in requests])
+    routes = await asyncio.to_thread(routes_for_vectors, vectors)
+    classifier = await INTENT_CLASSIFIER.get() if INTENT_CLASSIFIER is not None else None
+    # Without the threads' history at hand, follow-up questions are left to the LLM router
+    ambiguous = [i for i, (r, route) in enumerate(zip(requests, routes))
+                 if route is None and not ANAPHORA.search(r.question.lower())]
+    if classifier is not None and ambiguous:
+        decisions = classifier.classify(vectors[ambiguous], router_config.ROUTER_CLASSIFIER_MIN_CONFIDENCE)
+        for i, (route, _) in zip(ambiguous, decisions):
+            routes[i] = route
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def answer(request, route, vector):
+        async with semaphore:
+            with request_trace("chat.batch"):
+                return await chat_bot_route(request, route_hint=route, vector=vector)
+
+    answers = await asyncio.gather(*(answer(r, route, v) for r, route, v in zip(requests, routes, vectors)))
+    return list(answers), routes
+
+async def chat_bot_stream(request: ChatBotRequest, debug: bool = False):
+    """Stream a chat turn as Server-Sent Events.
+
+    Emits a ``route`` event as soon as the router decides, then ``token`` events
+    from the answering LLM call, and finally ``done`` with the full answer.
+    Nodes that answer without an LLM (FAQ direct hits, default) send their
+    answer as a single token. With ``debug`` a last ``trace`` event carries the
+    turn's spans, route, cache results and tokens.
+    """
+    with request_trace("chat.stream") as trace:
+        async for event in stream_turn(request):
+            yield event
+        if debug:
+            yield sse_event("trace", trace.summary())
+
+async def stream_turn(request: ChatBotRequest):
+    config = turn_config(request)
+    initial_state = {"messages": [HumanMessage(content=request.question)]}
+    streamed = False
+    route = None
+    try:
+        await CHECKPOINTER.get()
+        hit, vector = await lookup_cached_answer(request, config)
+        if hit is not None:
+            yield sse_event("route", {"route": hit.route, "cached": True})
+            yield sse_event("token", {"content": hit.answer})
+            yield sse_event("done", {"answer": hit.answer})
+            return
+
+        with llm_gateway.deadline():
+            async for mode, chunk in graph.astream(initial_state, config=config, stream_mode=["updates", "messages"]):
+                if mode == "messages":
+                    message, metadata = chunk
+                    if ANSWER_TAG in metadata.get("tags", []) and message.content:
+                        streamed = True
+                        yield sse_event("token", {"content": message.content})
+                    continue
 
+                for node, update in chunk.items():
+                    if node == "router":
+                        route = update["destination"]
+                        yield sse_event("route", {"route": route})
+                    elif node in ANSWER_NODES and update:
+                        answer = update["messages"][-1].content
+                        if not streamed:
+                            yield sse_event("token", {"content": answer})
+                        yield sse_event("done", {"answer": answer})
+                        await store_cached_answer(request, vector, route, answer)
     except Exception as e:
-        import traceback
-        print(f"Error in chat_bot_route: {traceback.format_exc()}")
-        return f"I encountered an error. Please try again or rephrase your question."
\ No newline at end of file
+        logger.exception("Error in chat_bot_stream")
+        annotate(error=type(e).__name__)
+        yield sse_event("error", {"message": "I encountered an error. Please try again or rephrase your question."})
+    finally:
+        end_turn(config)
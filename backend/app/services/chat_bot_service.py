@@ -1,112 +1,125 @@
-from app.core.config import groq_config
-from app.db.chromaDB import collection
+from app.core.config import groq_config, faq_config
+from app.core.cache import MISSING
+from app.db.faq_index import LocalFaqIndex
+from app.services.router_search import encode_queries, encoder_name
+from app.services.faq_ingest import ingest, read_faq_rows
 from app.core.logging import logger, log_event
+from app.core.metrics import cache_result, span
 from pathlib import Path
-from uuid import uuid4
-from functools import lru_cache
 import pandas as pd
-from langchain_groq import ChatGroq 
 from langchain_core.messages import SystemMessage, HumanMessage
+from app.services.streaming import ANSWER_TAG
+from app.services.llm_gateway import llm_gateway
+from app.services.retrieval_cache import FaqRetrievalCache
+import asyncio
 import time
 
 
-class ChatBotService:
-  def __init__(self):
-    self._collection = collection
+FAQ_DATA_FILE = Path(__file__).parent.parent / "resources" / "faq_data.csv"
 
-  def ingest_faq_data(self, batch_size: int = 100, skip_if_present: bool = True):
-    """Ingest FAQ data efficiently.
 
-    - Optional idempotence: skip ingestion if we already have >= number of rows present.
-    - Chunked upsert to reduce memory pressure and allow progress logging.
-    - Deterministic fallback embeddings if transformer model unavailable.
-    """
-    path = Path(__file__).parent.parent
-    data_file = path / "resources" / "faq_data.csv"
-    logger.info("Loading FAQ data from %s", data_file)
-    df = pd.read_csv(data_file)
-
-    # Idempotence guard
-    if skip_if_present:
-      try:
-        if self._collection is None:
-          log_event("ingest.unavailable", reason="chroma collection not initialized")
-          return
-        count = self._collection.count()
-        if count >= len(df):
-          logger.info("Skipping ingestion; collection already has %d >= %d items", count, len(df))
-          log_event("ingest.skip", existing=count, total=len(df))
-          return
-        else:
-          log_event("ingest.start", existing=count, total=len(df), batch_size=batch_size)
-      except Exception as e:
-        log_event("ingest.count.error", error=str(e))
-
-    documents_all = df['question'].tolist()
-    metadatas_all = df[['answer']].to_dict(orient='records')
-
-    # Pre-generate IDs to ensure stable identity per run (could hash question for stability)
-    ids_all = [str(uuid4()) for _ in range(len(df))]
+def use_local_faq_index() -> bool:
+  """Whether FAQ retrieval should use the in-process index instead of Chroma Cloud."""
+  if faq_config.FAQ_BACKEND != "auto":
+    return faq_config.FAQ_BACKEND == "local"
+  return len(pd.read_csv(FAQ_DATA_FILE, usecols=["question"])) <= faq_config.FAQ_LOCAL_MAX_ROWS
+
+
+class ChatBotService:
+  def __init__(self):
+    if use_local_faq_index():
+      # Same FastEmbed model the semantic router already loaded; no network on the query path
+      self._collection = LocalFaqIndex(encode_queries, encoder_name(), faq_config.FAQ_INDEX_DIR)
+      self._embed = encode_queries
+    else:
+      from app.db.chromaDB import collection, ef
+      self._collection = collection
+      self._embed = ef
+    log_event("faq.backend", backend=type(self._collection).__name__)
+    self._cache = FaqRetrievalCache(
+      maxsize=faq_config.FAQ_CACHE_SIZE,
+      embedding_maxsize=faq_config.FAQ_EMBEDDING_CACHE_SIZE,
+      ttl_seconds=faq_config.FAQ_CACHE_TTL_SECONDS,
+    )
 
+  def ingest_faq_data(self, path=FAQ_DATA_FILE, batch_size: int = faq_config.FAQ_INGEST_BATCH_SIZE,
+                      concurrency: int = faq_config.FAQ_INGEST_CONCURRENCY, dry_run: bool = False):
+    """Sync the collection with the FAQ file, embedding only new or edited rows (see ``app.services.faq_ingest``)."""
     if self._collection is None:
       log_event("ingest.unavailable", reason="chroma collection not initialized")
-      return
-    self._collection.add(
-      ids=ids_all,
-      documents=documents_all,
-      metadatas=metadatas_all,
-    )
+      return None
+    logger.info("Loading FAQ data from %s", path)
+    report = ingest(self._collection, self._embed, read_faq_rows(path),
+                    batch_size=batch_size, concurrency=concurrency, dry_run=dry_run)
+    if report.changed and not dry_run:
+      if isinstance(self._collection, LocalFaqIndex):
+        self._collection.persist()
+      # Cached top-k results were computed against the old collection
+      self._cache.invalidate(reason="ingest")
+    return report
+
+  def _query_embedding(self, query: str):
+    embedding = self._cache.get_embedding(query)
+    if embedding is MISSING:
+      embedding = self._embed([query])[0]
+      self._cache.set_embedding(query, embedding)
+    return embedding
 
-    
-  
-  @lru_cache(maxsize=256)
   def query_faq_data(self, query: str, n_results: int = 5):
-    """Query Chroma with LRU caching for repeated identical queries.
+    """Top-k FAQ matches for ``query``, served from the retrieval cache when possible.
 
-    Print statements show when actual vector search occurs (cache miss).
+    Thread-safe (called from worker threads); the query text is normalized so
+    trivially different phrasings share the embedding and result entries.
     """
+    results = self._cache.get_results(query, n_results)
+    cache_result("faq_retrieval", results is not MISSING)
+    if results is not MISSING:
+      log_event("query.cache.hit", query=query)
+      return results
+
     log_event("query.execute", query=query, n_results=n_results)
     t0 = time.time()
     if self._collection is None:
       log_event("query.unavailable", reason="chroma collection not initialized")
       return {"documents": [[]], "metadatas": [[]], "distances": [[]]}
-    res = self._collection.query(query_texts=[query], n_results=n_results)
+    generation = self._cache.generation
+    res = self._collection.query(query_embeddings=[self._query_embedding(query)], n_results=n_results)
+    results = {key: res.get(key) or [[]] for key in ("documents", "metadatas", "distances")}
+    self._cache.set_results(query, n_results, results, generation)
     log_event("query.complete", query=query, ms=round((time.time()-t0)*1000,1))
-    return res
-
-  def query_faq_data_cached(self, query: str, n_results: int = 5):
-    """Wrapper that leverages LRU cache and prints hit/miss info."""
-    # lru_cache wraps original function; if function not executed we skip heavy work.
-    key = (query, n_results)
-    # Access cache internals indirectly not straightforward; rely on timing difference.
-    # We simulate hit detection by calling cache_info before and after.
-    before = self.query_faq_data.cache_info().hits
-    result = self.query_faq_data(query, n_results)  # may run or return cached value
-    after = self.query_faq_data.cache_info().hits
-    if after > before:
-      log_event("query.cache.hit", query=query)
-    return result
+    return results
+
+  def cache_stats(self) -> dict:
+    return self._cache.stats()
     
-  def get_faq_answer(self, query: str, history: list = []):
+  async def retrieve(self, query: str, n_results: int = 5):
+    """Top FAQ matches for ``query``; the retrieval half of ``get_faq_answer``."""
+    # Chroma client is sync; keep it off the event loop
+    with span("faq.retrieve"):
+      return await asyncio.to_thread(self.query_faq_data, query, n_results)
+
+  async def get_faq_answer(self, query: str, history: list = [], rag_results: dict | None = None):
     """Return an answer to the user query using Groq LLM with RAG context from Chroma.
 
-    Falls back gracefully if GROQ_API_KEY is missing.
+    ``rag_results`` skips retrieval when it already ran (speculatively, see
+    ``app.services.speculation``). Falls back gracefully if GROQ_API_KEY is missing.
     """
     groq_key = groq_config.GROQ_API_KEY
     if not groq_key:
       logger.error("GROQ_API_KEY not set; cannot call Groq API.")
       return "Configuration error: GROQ_API_KEY is missing."
     
-    client_groq = ChatGroq(
-      api_key=groq_key,
-      model="meta-llama/llama-4-maverick-17b-128e-instruct",
+    client_groq = llm_gateway.chat(
+      "groq",
+      "meta-llama/llama-4-maverick-17b-128e-instruct",
+      purpose="faq_answer",
       temperature=0.3,
-      max_tokens=512,
-      model_kwargs={"stream": False}
+      max_tokens=512
     )
 
     # Retrieve top FAQ documents for context
-    rag_results = self.query_faq_data_cached(query, n_results=5)
+    if rag_results is None:
+      rag_results = await self.retrieve(query)
     source_docs = rag_results.get("documents", [[]])[0]
     metadatas = rag_results.get("metadatas", [[]])[0]
 
@@ -160,7 +173,8 @@ class ChatBotService:
       # Add current turn with context
       messages.append(HumanMessage(content=user_prompt_content))
 
-      completion = client_groq.invoke(messages)
+      with span("faq.answer"):
+        completion = await client_groq.ainvoke(messages, config={"tags": [ANSWER_TAG]})
       answer = completion.content
       return answer
     except Exception as e:
@@ -173,5 +187,5 @@ class ChatBotService:
 #   chatbot_service.ingest_faq_data()
 #   test_query = "How can i get a discount on my purchase?"
 #   log_event("main.query", query=test_query)
-#   answer = chatbot_service.get_faq_answer(test_query)
+#   answer = asyncio.run(chatbot_service.get_faq_answer(test_query))
 #   log_event("main.answer", query=test_query, answer_preview=answer[:120])
\ No newline at end of file
@@ -0,0 +1,116 @@
+from dataclasses import dataclass, replace
+
+from langchain_core.messages import BaseMessage, HumanMessage, SystemMessage
+from langchain_core.messages.utils import count_tokens_approximately, trim_messages
+
+from app.core.config import context_config
+from app.core.logging import log_event
+
+
+@dataclass(frozen=True)
+class ContextBudget:
+    max_turns: int  # most recent (human, ai) turns kept verbatim
+    max_tokens: int  # upper bound on history tokens after windowing
+
+
+# Per-node history budgets. The router only needs enough context to resolve
+# "those/it"; product inquiries need the previous result list for follow-ups.
+NODE_BUDGETS = {
+    "router": ContextBudget(max_turns=2, max_tokens=600),
+    "faq": ContextBudget(max_turns=2, max_tokens=800),
+    "product_inquiry": ContextBudget(max_turns=3, max_tokens=1500),
+    "small_talk": ContextBudget(max_turns=3, max_tokens=800),
+}
+
+SUMMARY_PROMPT = (
+    "You maintain a running summary of a customer's conversation with an e-commerce assistant. "
+    "Update the summary with the new messages. Keep product names, brands, prices and the "
+    "customer's preferences and constraints. Reply with the updated summary only, at most 120 words."
+)
+
+
+def count_tokens(messages: list) -> int:
+    """Approximate token count (chars / 4 plus per-message overhead); no tokenizer download needed."""
+    return count_tokens_approximately(messages) if messages else 0
+
+
+def trim_history(history: list[BaseMessage], budget: ContextBudget) -> list[BaseMessage]:
+    """Keep the last ``max_turns`` turns, then drop older messages until under ``max_tokens``."""
+    windowed = history[-budget.max_turns * 2:] if budget.max_turns > 0 else []
+    return trim_messages(
+        windowed,
+        max_tokens=budget.max_tokens,
+        token_counter=count_tokens_approximately,
+        strategy="last",
+        start_on="human",
+        allow_partial=False,
+    )
+
+
+def summarized(messages: list[BaseMessage], summary_until: str | None) -> int:
+    """How many leading ``messages`` the running summary covers."""
+    return next((i + 1 for i, m in enumerate(messages) if m.id == summary_until), 0)
+
+
+def build_context(state: dict, node: str) -> list[BaseMessage]:
+    """History to send with the current question for ``node``.
+
+    The latest message (the question itself) is excluded. When a running
+    summary exists it is prepended as a system message. With summaries on,
+    messages the summary does not cover yet (it is updated in batches) are
+    always kept, whatever their tokens, so no turn is in neither; the budget
+    left over goes to the most recent summarized turns.
+    """
+    history = state["messages"][:-1]
+    budget = NODE_BUDGETS[node]
+    if context_config.CONTEXT_SUMMARY_ENABLED:
+        start = summarized(history, state.get("summary_until"))
+        pending = history[start:]
+        turns = -(-len(pending) // 2)  # a pending question without its answer counts as a turn
+        budget = replace(budget, max_turns=max(budget.max_turns - turns, 0),
+                         max_tokens=max(budget.max_tokens - count_tokens(pending), 0))
+        context = [*trim_history(history[:start], budget), *pending]
+    else:
+        context = trim_history(history, budget)
+    if state.get("summary"):
+        context = [SystemMessage(content=f"Summary of the earlier conversation: {state['summary']}"), *context]
+
+    tokens_before = count_tokens(history)
+    tokens_after = count_tokens(context)
+    log_event(
+        "context.trim",
+        node=node,
+        messages_before=len(history),
+        messages_after=len(context),
+        tokens_before=tokens_before,
+        tokens_after=tokens_after,
+        tokens_saved=tokens_before - tokens_after,
+    )
+    return context
+
+
+async def update_summary(state: dict, llm) -> dict:
+    """Fold messages that have left the smallest node window into the running summary.
+
+    Incremental: only messages after ``summary_until`` are sent, together with
+    the previous summary, and only once ``CONTEXT_SUMMARY_BATCH_TURNS`` turns are
+    pending. If ``summary_until`` is no longer in the history (the checkpointer
+    trimmed it), every remaining message is newer than it.
+    """
+    if not context_config.CONTEXT_SUMMARY_ENABLED:
+        return {}
+    messages = state["messages"]
+    # Nodes with a wider window see a few summarized turns verbatim too; none loses a turn
+    keep = min(budget.max_turns for budget in NODE_BUDGETS.values()) * 2
+    start = summarized(messages, state.get("summary_until"))
+    pending = messages[start:max(len(messages) - keep, start)]
+    if len(pending) < context_config.CONTEXT_SUMMARY_BATCH_TURNS * 2:
+        return {}
+
+    transcript = "\n".join(f"{m.type}: {m.content}" for m in pending)
+    response = await llm.ainvoke([
+        SystemMessage(content=SUMMARY_PROMPT),
+        HumanMessage(content=f"Current summary:\n{state.get('summary') or '(none)'}\n\nNew messages:\n{transcript}"),
+    ])
+    log_event("context.summary", folded_messages=len(pending), summary_tokens=count_tokens([response]))
+    return {"summary": response.content, "summary_until": pending[-1].id}
@@ -0,0 +1,132 @@
+"""Incremental FAQ ingestion.
+
+Row ids are content hashes of ``(question, answer)``, so the collection can
+be diffed against the FAQ file without looking at vectors:
+
+- rows whose id the collection already has are skipped (no embedding call);
+- new rows, including edited ones (an edit is a new id), are embedded in
+  batches of ``batch_size``, up to ``concurrency`` batches at once, and each
+  batch is upserted as soon as it is embedded;
+- ids that are no longer in the file (deleted or edited rows) are deleted.
+
+A failed run leaves the batches it finished in place, and the next run picks
+up from there. Runs at startup (``FAQ_INGEST_ON_STARTUP``) and offline, from
+``backend/``::
+
+    python -m app.services.faq_ingest [--csv app/resources/faq_data.csv] [--dry-run]
+"""
+import argparse
+import hashlib
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import asdict, dataclass
+from pathlib import Path
+
+import pandas as pd
+
+from app.core.logging import log_event
+
+
+@dataclass
+class IngestReport:
+    rows: int  # rows in the file
+    unchanged: int  # already in the collection: not embedded again
+    upserted: int
+    deleted: int
+    embed_calls: int
+    seconds: float
+
+    @property
+    def changed(self) -> bool:
+        return bool(self.upserted or self.deleted)
+
+    @property
+    def rows_per_second(self) -> float:
+        return self.rows / self.seconds if self.seconds else float("inf")
+
+    def as_dict(self) -> dict:
+        return {**asdict(self), "seconds": round(self.seconds, 3), "rows_per_second": round(self.rows_per_second)}
+
+
+def faq_id(question: str, answer: str) -> str:
+    return hashlib.sha256(f"{question}\x1f{answer}".encode()).hexdigest()[:32]
+
+
+def read_faq_rows(path) -> dict[str, tuple[str, str]]:
+    """``id -> (question, answer)``; blank questions are skipped and duplicate rows collapse to one id."""
+    df = pd.read_csv(path, usecols=["question", "answer"], dtype=str, keep_default_na=False)
+    rows = {}
+    for question, answer in zip(df["question"], df["answer"]):
+        question, answer = question.strip(), answer.strip()
+        if question:
+            rows[faq_id(question, answer)] = (question, answer)
+    return rows
+
+
+def existing_ids(collection, page_size: int = 1000) -> set[str]:
+    ids, offset = set(), 0
+    while True:
+        page = collection.get(include=[], limit=page_size, offset=offset)["ids"]
+        ids.update(page)
+        if len(page) < page_size:
+            return ids
+        offset += page_size
+
+
+def ingest(collection, embed, rows: dict[str, tuple[str, str]], *, batch_size: int, concurrency: int,
+           dry_run: bool = False) -> IngestReport:
+    """Make ``collection`` hold exactly ``rows``, embedding only the rows it does not have."""
+    t0 = time.perf_counter()
+    present = existing_ids(collection)
+    missing = [id_ for id_ in rows if id_ not in present]
+    stale = [id_ for id_ in present if id_ not in rows]
+    log_event("faq_ingest.plan", rows=len(rows), unchanged=len(rows) - len(missing), upsert=len(missing),
+              delete=len(stale), dry_run=dry_run)
+    batches = [missing[i:i + batch_size] for i in range(0, len(missing), batch_size)]
+    if dry_run:
+        return IngestReport(len(rows), len(rows) - len(missing), len(missing), len(stale), len(batches),
+                            time.perf_counter() - t0)
+
+    def embed_batch(ids):
+        return ids, embed([rows[id_][0] for id_ in ids])
+
+    # At most `concurrency` embedding calls in flight, and no more finished batches held than that
+    with ThreadPoolExecutor(max_workers=concurrency, thread_name_prefix="faq-embed") as pool:
+        pending = deque()
+        for batch in batches:
+            pending.append(pool.submit(embed_batch, batch))
+            if len(pending) >= concurrency:
+                _upsert(collection, rows, *pending.popleft().result())
+        while pending:
+            _upsert(collection, rows, *pending.popleft().result())
+
+    for i in range(0, len(stale), batch_size):
+        collection.delete(ids=stale[i:i + batch_size])
+    report = IngestReport(len(rows), len(rows) - len(missing), len(missing), len(stale), len(batches),
+                          time.perf_counter() - t0)
+    log_event("faq_ingest.done", **report.as_dict())
+    return report
+
+
+def _upsert(collection, rows, ids, embeddings):
+    collection.upsert(
+        ids=ids,
+        embeddings=embeddings,
+        documents=[rows[id_][0] for id_ in ids],
+        metadatas=[{"answer": rows[id_][1]} for id_ in ids],
+    )
+
+
+if __name__ == "__main__":
+    from app.core.config import faq_config
+    from app.services.chat_bot_service import FAQ_DATA_FILE, ChatBotService
+
+    parser = argparse.ArgumentParser(description="Sync the FAQ vector collection with the FAQ file.")
+    parser.add_argument("--csv", type=Path, default=FAQ_DATA_FILE)
+    parser.add_argument("--batch-size", type=int, default=faq_config.FAQ_INGEST_BATCH_SIZE)
+    parser.add_argument("--concurrency", type=int, default=faq_config.FAQ_INGEST_CONCURRENCY)
+    parser.add_argument("--dry-run", action="store_true", help="only report what would be embedded and deleted")
+    args = parser.parse_args()
+    report = ChatBotService().ingest_faq_data(args.csv, args.batch_size, args.concurrency, args.dry_run)
+    print(report.as_dict())
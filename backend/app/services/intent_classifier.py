@@ -0,0 +1,248 @@
+"""Local intent classifier for queries the semantic router finds ambiguous.
+
+Multinomial logistic regression over the router's FastEmbed vectors, so it
+costs one small matrix product on top of the encoding the semantic router
+already did. It is trained offline from the route utterances plus logged
+``(query, final route)`` pairs: the ``router.decision`` events the app logs,
+keeping decisions made by the semantic router or the LLM router (never the
+classifier's own). The LLM router is only asked when the classifier's
+confidence is below ``ROUTER_CLASSIFIER_MIN_CONFIDENCE``.
+
+The artifact is a directory with ``model.npz`` and ``meta.json`` (format,
+version hash, encoder, classes, training summary). Train and report from
+``backend/``::
+
+    python -m app.services.intent_classifier train --log app.log --out .cache/intent_classifier
+    python -m app.services.intent_classifier report --log app.log
+"""
+import argparse
+import hashlib
+import json
+import random
+import statistics
+import time
+from pathlib import Path
+
+import numpy as np
+
+from app.core.files import atomic_write
+from app.core.logging import log_event
+from app.services.normalize import normalize_query
+
+FORMAT = 1
+MODEL_FILE = "model.npz"
+META_FILE = "meta.json"
+# Decisions worth learning from; "classifier" decisions would only reinforce the model's own mistakes
+LABEL_SOURCES = ("semantic", "llm")
+
+
+def _softmax(logits: np.ndarray) -> np.ndarray:
+    logits = logits - logits.max(axis=1, keepdims=True)
+    p = np.exp(logits)
+    return p / p.sum(axis=1, keepdims=True)
+
+
+class IntentClassifier:
+    def __init__(self, classes: list[str], weights: np.ndarray, bias: np.ndarray, meta: dict | None = None):
+        self.classes = list(classes)
+        self.weights = np.asarray(weights, dtype=np.float32)  # (dim, classes)
+        self.bias = np.asarray(bias, dtype=np.float32)
+        self.meta = meta or {}
+
+    def predict_proba(self, vectors: np.ndarray) -> np.ndarray:
+        return _softmax(np.asarray(vectors, dtype=np.float32) @ self.weights + self.bias)
+
+    def classify(self, vectors: np.ndarray, min_confidence: float) -> list[tuple[str | None, float]]:
+        """Per vector ``(route, confidence)``; ``route`` is ``None`` below ``min_confidence``."""
+        proba = self.predict_proba(vectors)
+        best = proba.argmax(axis=1)
+        return [
+            (self.classes[b] if proba[i, b] >= min_confidence else None, float(proba[i, b]))
+            for i, b in enumerate(best)
+        ]
+
+    @classmethod
+    def fit(cls, vectors: np.ndarray, labels: list[str], *, l2: float = 1e-4, epochs: int = 1000,
+            learning_rate: float = 20.0, meta: dict | None = None) -> "IntentClassifier":
+        """Full-batch gradient descent; classes are weighted equally however many examples each has."""
+        x = np.asarray(vectors, dtype=np.float32)
+        classes = sorted(set(labels))
+        index = {c: i for i, c in enumerate(classes)}
+        y = np.zeros((len(labels), len(classes)), dtype=np.float32)
+        y[np.arange(len(labels)), [index[label] for label in labels]] = 1.0
+        sample_weight = (len(labels) / (len(classes) * y.sum(axis=0)))[y.argmax(axis=1)][:, None]
+        sample_weight /= sample_weight.sum()
+
+        weights = np.zeros((x.shape[1], len(classes)), dtype=np.float32)
+        bias = np.zeros(len(classes), dtype=np.float32)
+        for _ in range(epochs):
+            error = (_softmax(x @ weights + bias) - y) * sample_weight
+            weights -= learning_rate * (x.T @ error + l2 * weights)
+            bias -= learning_rate * error.sum(axis=0)
+        return cls(classes, weights, bias, meta)
+
+    def save(self, path: str) -> str:
+        """Write the artifact; returns its version (a hash of the classes and weights)."""
+        digest = hashlib.sha256(json.dumps(self.classes).encode())
+        digest.update(self.weights.tobytes())
+        digest.update(self.bias.tobytes())
+        self.meta = {**self.meta, "format": FORMAT, "version": digest.hexdigest()[:12], "classes": self.classes}
+        path = Path(path)
+        path.mkdir(parents=True, exist_ok=True)
+        # Unique temp files and rename, so a booting app never loads half an artifact
+        with atomic_write(path / MODEL_FILE) as f:
+            np.savez(f, weights=self.weights, bias=self.bias)
+        with atomic_write(path / META_FILE, "w") as f:
+            json.dump(self.meta, f, indent=2)
+        return self.meta["version"]
+
+    @classmethod
+    def load(cls, path: str, encoder_name: str) -> "IntentClassifier | None":
+        """The artifact at ``path``, or ``None`` if it is missing or was trained for another encoder/format."""
+        path = Path(path)
+        try:
+            meta = json.loads((path / META_FILE).read_text())
+            arrays = np.load(path / MODEL_FILE)
+        except (OSError, ValueError):
+            log_event("intent_classifier.missing", path=str(path))
+            return None
+        if meta.get("format") != FORMAT or meta.get("encoder") != encoder_name:
+            log_event("intent_classifier.incompatible", path=str(path), format=meta.get("format"),
+                      encoder=meta.get("encoder"))
+            return None
+        log_event("intent_classifier.load", path=str(path), version=meta["version"], classes=meta["classes"])
+        return cls(meta["classes"], arrays["weights"], arrays["bias"], meta)
+
+
+def read_router_log(paths: list[str]):
+    """``(pairs, llm_ms)`` from app logs: labelled ``(query, route, source)`` and LLM-router latencies."""
+    labelled, llm_ms = {}, []
+    for path in paths:
+        with open(path, encoding="utf-8") as f:
+            for line in f:
+                try:
+                    record = json.loads(line)
+                    # The JSON formatter wraps each event as a JSON string in "msg"
+                    if isinstance(record.get("msg"), str):
+                        record = json.loads(record["msg"])
+                except (ValueError, AttributeError):
+                    continue
+                if not isinstance(record, dict):
+                    continue
+                if record.get("event") == "router.decision" and record.get("source") in LABEL_SOURCES:
+                    # The latest decision for a query wins
+                    labelled[normalize_query(record["query"])] = (record["query"], record["route"], record["source"])
+                elif record.get("event") == "router.llm" and record.get("ms") is not None:
+                    llm_ms.append(float(record["ms"]))
+    return list(labelled.values()), llm_ms
+
+
+def route_utterances() -> tuple[list[str], list[str]]:
+    from app.services.router_search import get_router
+    routes = get_router().routes
+    return [u for r in routes for u in r.utterances], [r.name for r in routes for _ in r.utterances]
+
+
+def train(log_paths: list[str], out: str, **fit_args) -> IntentClassifier:
+    from app.services.router_search import encode_queries, encoder_name
+    texts, labels = route_utterances()
+    pairs, _ = read_router_log(log_paths)
+    texts += [query for query, _, _ in pairs]
+    labels += [route for _, route, _ in pairs]
+    classifier = IntentClassifier.fit(encode_queries(texts), labels, **fit_args, meta={
+        "encoder": encoder_name(),
+        "trained_at": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "examples": {"utterances": len(texts) - len(pairs), "logged": len(pairs)},
+    })
+    version = classifier.save(out)
+    print(f"trained on {len(texts)} examples ({len(pairs)} logged); version {version} -> {out}")
+    return classifier
+
+
+def _ms_summary(values: list[float]) -> str:
+    if not values:
+        return "n/a"
+    p95 = statistics.quantiles(values, n=100, method="inclusive")[94] if len(values) > 1 else values[0]
+    return f"p50 {statistics.median(values):.2f} ms, p95 {p95:.2f} ms"
+
+
+def report(log_paths: list[str], min_confidence: float, test_share: float = 0.2, live_llm: bool = False, seed: int = 0):
+    """Held-out agreement with the LLM router's decisions, coverage and latency.
+
+    The test set is a random ``test_share`` of the logged LLM-router decisions
+    (or of the utterances, when there are none); the classifier is trained on
+    everything else. With ``live_llm`` the test queries are also sent to the
+    LLM router to measure its latency now.
+    """
+    from app.services.router_search import encode_queries
+    texts, labels = route_utterances()
+    pairs, llm_ms = read_router_log(log_paths)
+    examples = [(q, r, "utterance") for q, r in zip(texts, labels)] + pairs
+    candidates = [i for i, (_, _, source) in enumerate(examples) if source == "llm"]
+    reference = "LLM router decisions"
+    if not candidates:
+        candidates, reference = list(range(len(texts))), "route utterances (no logged LLM decisions)"
+    rng = random.Random(seed)
+    test = set(rng.sample(candidates, max(1, int(len(candidates) * test_share))))
+    train_idx = [i for i in range(len(examples)) if i not in test]
+    test_idx = sorted(test)
+
+    vectors = encode_queries([q for q, _, _ in examples])
+    classifier = IntentClassifier.fit(vectors[train_idx], [examples[i][1] for i in train_idx])
+    per_query_ms, decisions = [], []
+    for i in test_idx:
+        t0 = time.perf_counter()
+        decisions.append(classifier.classify(vectors[i:i + 1], min_confidence)[0])
+        per_query_ms.append((time.perf_counter() - t0) * 1000)
+    truth = [examples[i][1] for i in test_idx]
+    covered = [(route, label) for (route, _), label in zip(decisions, truth) if route is not None]
+    top1 = sum(classifier.classes[int(np.argmax(classifier.predict_proba(vectors[i:i + 1])))] == examples[i][1]
+               for i in test_idx)
+
+    print(f"reference: {reference}; {len(train_idx)} training / {len(test_idx)} test examples")
+    print(f"top-1 agreement (no threshold): {top1 / len(test_idx):.1%}")
+    print(f"confident (>= {min_confidence}): {len(covered) / len(test_idx):.1%} of queries skip the LLM; "
+          f"agreement on those {sum(r == l for r, l in covered) / len(covered):.1%}" if covered else
+          f"confident (>= {min_confidence}): none")
+    print(f"classifier latency (after encoding): {_ms_summary(per_query_ms)}")
+    print(f"LLM router latency (logged): {_ms_summary(llm_ms)}")
+
+    if live_llm:
+        import asyncio
+        from langchain_core.messages import HumanMessage
+        from app.services.chat_bot_route import ROUTER_LLM
+
+        async def ask():
+            router_llm = await ROUTER_LLM.get()
+            results = []
+            for i in test_idx:
+                t0 = time.perf_counter()
+                decision = await router_llm.ainvoke([HumanMessage(content=examples[i][0])])
+                results.append((decision.route, (time.perf_counter() - t0) * 1000))
+            return results
+
+        live = asyncio.run(ask())
+        agreement = sum(route == label for (route, _), label in zip(live, truth)) / len(truth)
+        print(f"LLM router now: agreement {agreement:.1%}, latency {_ms_summary([ms for _, ms in live])}")
+
+
+if __name__ == "__main__":
+    from app.core.config import router_config
+
+    parser = argparse.ArgumentParser(description="Train or evaluate the local intent classifier.")
+    commands = parser.add_subparsers(dest="command", required=True)
+    train_parser = commands.add_parser("train", help="fit on route utterances and logged decisions")
+    train_parser.add_argument("--log", nargs="*", default=[], help="app log files with router.decision events")
+    train_parser.add_argument("--out", default=router_config.ROUTER_CLASSIFIER_DIR or ".cache/intent_classifier")
+    train_parser.add_argument("--l2", type=float, default=1e-4)
+    train_parser.add_argument("--epochs", type=int, default=1000)
+    report_parser = commands.add_parser("report", help="held-out accuracy, coverage and latency vs the LLM router")
+    report_parser.add_argument("--log", nargs="*", default=[])
+    report_parser.add_argument("--min-confidence", type=float, default=router_config.ROUTER_CLASSIFIER_MIN_CONFIDENCE)
+    report_parser.add_argument("--test-share", type=float, default=0.2)
+    report_parser.add_argument("--live-llm", action="store_true", help="also query the LLM router (needs API key)")
+    args = parser.parse_args()
+    if args.command == "train":
+        train(args.log, args.out, l2=args.l2, epochs=args.epochs)
+    else:
+        report(args.log, args.min_confidence, args.test_share, args.live_llm)
@@ -0,0 +1,315 @@
+"""Shared LLM clients with per-provider concurrency limits, retries, timeouts and hedging.
+
+Services get a model with ``llm_gateway.chat(provider, model, purpose=..., **params)``
+instead of constructing a client. Clients are built once per
+``(provider, model, params)`` and Groq clients share one pooled HTTP client;
+the Gemini SDK keeps a pool per client, so reusing the client reuses it.
+
+Every ``ainvoke`` through a ``GatewayChat``:
+
+- waits for a slot of the provider's semaphore (``LLM_MAX_CONCURRENCY``);
+- is bounded by ``LLM_TIMEOUT_SECONDS`` per attempt and by the remaining
+  time of the chat turn (``llm_gateway.deadline``), retries included;
+- is retried with jittered exponential backoff on timeouts, connection
+  errors, 429 and 5xx;
+- is hedged: if it has not answered after the recent p95 latency of that
+  model and purpose, an identical second call is fired and the first answer
+  wins. Answer calls (tagged ``ANSWER_TAG``) are never hedged, and are
+  retried only if the failed attempt emitted no token: under
+  ``/chat/stream`` its tokens are already on their way to the client, and
+  a new attempt would send the answer again from the start.
+
+Latency histograms and counters per model and purpose are in ``stats()``
+and ``GET /metrics``; token usage goes to the request's trace.
+"""
+import asyncio
+import contextlib
+import contextvars
+import random
+import threading
+import time
+from collections import deque
+
+import groq
+import httpx
+from langchain_core.callbacks import AsyncCallbackHandler
+from langchain_core.runnables.config import ensure_config, merge_configs
+
+from app.core.config import google_config, groq_config, llm_config
+from app.core.logging import log_event
+from app.core.metrics import REGISTRY, Histogram, count_tokens
+from app.services.streaming import ANSWER_TAG
+
+BUCKETS_MS = (50, 100, 250, 500, 750, 1000, 1500, 2000, 3000, 5000, 8000, 13000, 20000, 30000)
+RETRY_STATUS = {408, 409, 429}
+
+_deadline: contextvars.ContextVar[float | None] = contextvars.ContextVar("llm_deadline", default=None)
+
+
+class ModelStats:
+    """Latency histogram (successful attempts) and error counters of one model and purpose."""
+
+    def __init__(self, window: int = 512):
+        self.latency = Histogram(BUCKETS_MS)
+        self._recent: deque[float] = deque(maxlen=window)  # hedge delays follow recent latency
+        self.counters = {"calls": 0, "errors": 0, "retries": 0, "timeouts": 0, "hedges": 0, "hedge_wins": 0}
+
+    @property
+    def count(self) -> int:
+        return self.latency.count
+
+    def observe(self, ms: float):
+        self.latency.observe(ms)
+        self._recent.append(ms)
+
+    def quantile(self, q: float) -> float | None:
+        """``q`` quantile of the recent latencies in ms."""
+        if not self._recent:
+            return None
+        values = sorted(self._recent)
+        return values[min(len(values) - 1, int(q * len(values)))]
+
+    def stats(self) -> dict:
+        return {
+            **self.counters,
+            "count": self.count,
+            "mean_ms": round(self.latency.sum / self.count, 1) if self.count else None,
+            "p50_ms": self.quantile(0.5),
+            "p95_ms": self.quantile(0.95),
+            "p99_ms": self.quantile(0.99),
+            "buckets_ms": {**{str(le): n for le, n in zip(BUCKETS_MS, self.latency.buckets)},
+                           "inf": self.latency.buckets[-1]},
+        }
+
+
+class TokenWatch(AsyncCallbackHandler):
+    """Records whether an attempt has streamed any token."""
+
+    def __init__(self):
+        self.emitted = False
+
+    async def on_llm_new_token(self, token: str, **kwargs):
+        self.emitted = True
+
+
+def _retryable(e: Exception) -> bool:
+    if isinstance(e, (TimeoutError, httpx.TransportError, groq.APIConnectionError)):
+        return True
+    # groq/openai-style errors carry status_code, google-genai errors code
+    status = getattr(e, "status_code", None) or getattr(e, "code", None)
+    return isinstance(status, int) and (status in RETRY_STATUS or status >= 500)
+
+
+def _groq_client(gateway: "LlmGateway", model: str, **params):
+    from langchain_groq import ChatGroq
+    return ChatGroq(
+        api_key=groq_config.GROQ_API_KEY,
+        model=model,
+        max_retries=0,  # retried by the gateway
+        request_timeout=llm_config.LLM_TIMEOUT_SECONDS,
+        http_async_client=gateway.http_client("groq"),
+        **params,
+    )
+
+
+def _google_client(gateway: "LlmGateway", model: str, **params):
+    from langchain.chat_models import init_chat_model
+    return init_chat_model(
+        model=f"google_genai:{model}",
+        api_key=google_config.GOOGLE_API_KEY,
+        max_retries=1,  # SDK attempts, the first included; retried by the gateway
+        timeout=llm_config.LLM_TIMEOUT_SECONDS,
+        **params,
+    )
+
+
+# provider -> factory(gateway, model, **params)
+PROVIDERS = {"groq": _groq_client, "google_genai": _google_client}
+
+
+class GatewayChat:
+    """A pooled model for one purpose; ``ainvoke`` goes through the gateway's limits, retries and hedging."""
+
+    def __init__(self, gateway: "LlmGateway", provider: str, model: str, purpose: str, runnable):
+        self._gateway = gateway
+        self.provider = provider
+        self.model = model
+        self.purpose = purpose
+        self.runnable = runnable
+
+    @property
+    def label(self) -> str:
+        return f"{self.model}:{self.purpose}"
+
+    async def ainvoke(self, messages, config: dict | None = None, **kwargs):
+        return await self._gateway.invoke(self, messages, config, kwargs)
+
+    def with_structured_output(self, schema, *, purpose: str | None = None, **kwargs) -> "GatewayChat":
+        return GatewayChat(self._gateway, self.provider, self.model, purpose or self.purpose,
+                           self.runnable.with_structured_output(schema, **kwargs))
+
+
+class LlmGateway:
+    def __init__(self):
+        self._clients: dict[tuple, object] = {}
+        self._http: dict[str, httpx.AsyncClient] = {}
+        self._semaphores: dict[str, asyncio.Semaphore] = {}
+        self._stats: dict[str, ModelStats] = {}
+        self._lock = threading.Lock()  # services are also built in startup worker threads
+        self._calls = 0
+        self._hedges = 0
+
+    def chat(self, provider: str, model: str, *, purpose: str, **params) -> GatewayChat:
+        key = (provider, model, tuple(sorted(params.items())))
+        with self._lock:
+            if key not in self._clients:
+                self._clients[key] = PROVIDERS[provider](self, model, **params)
+                log_event("llm.client", provider=provider, model=model, params=params)
+            client = self._clients[key]
+        return GatewayChat(self, provider, model, purpose, client)
+
+    def http_client(self, provider: str) -> httpx.AsyncClient:
+        if provider not in self._http:
+            self._http[provider] = httpx.AsyncClient(
+                limits=httpx.Limits(max_connections=llm_config.LLM_POOL_CONNECTIONS,
+                                    max_keepalive_connections=llm_config.LLM_POOL_CONNECTIONS),
+                timeout=httpx.Timeout(llm_config.LLM_TIMEOUT_SECONDS),
+            )
+        return self._http[provider]
+
+    def _semaphore(self, provider: str) -> asyncio.Semaphore:
+        if provider not in self._semaphores:
+            self._semaphores[provider] = asyncio.Semaphore(llm_config.LLM_MAX_CONCURRENCY.get(provider, 16))
+        return self._semaphores[provider]
+
+    def _model_stats(self, label: str) -> ModelStats:
+        if label not in self._stats:
+            self._stats[label] = ModelStats()
+        return self._stats[label]
+
+    @contextlib.contextmanager
+    def deadline(self, seconds: float | None = None):
+        """Bound every LLM call made inside the block (and the tasks it starts) to ``seconds`` in total."""
+        token = _deadline.set(time.monotonic() + (seconds or llm_config.LLM_TURN_DEADLINE_SECONDS))
+        try:
+            yield
+        finally:
+            _deadline.reset(token)
+
+    def _timeout(self) -> float:
+        deadline = _deadline.get()
+        if deadline is None:
+            return llm_config.LLM_TIMEOUT_SECONDS
+        remaining = deadline - time.monotonic()
+        if remaining <= 0:
+            raise TimeoutError("LLM deadline of the chat turn exceeded")
+        return min(llm_config.LLM_TIMEOUT_SECONDS, remaining)
+
+    async def _attempt(self, chat: GatewayChat, messages, config, kwargs, stats: ModelStats,
+                       started: asyncio.Event | None = None):
+        try:
+            # The semaphore wait counts against the timeout: a saturated provider is a slow provider
+            async with asyncio.timeout(self._timeout()):
+                async with self._semaphore(chat.provider):
+                    if started is not None:
+                        started.set()
+                    t0 = time.perf_counter()
+                    result = await chat.runnable.ainvoke(messages, config=config, **kwargs)
+        except TimeoutError:
+            stats.counters["timeouts"] += 1
+            raise
+        stats.observe((time.perf_counter() - t0) * 1000)
+        return result
+
+    async def _hedged(self, chat: GatewayChat, messages, config, kwargs, stats: ModelStats, delay_ms: float | None):
+        if delay_ms is None:
+            return await self._attempt(chat, messages, config, kwargs, stats)
+        started = asyncio.Event()
+        first = asyncio.create_task(self._attempt(chat, messages, config, kwargs, stats, started))
+        second = None
+        try:
+            # The hedge delay runs from when the call got a provider slot, not while it queues for one
+            waiting = asyncio.create_task(started.wait())
+            await asyncio.wait({first, waiting}, return_when=asyncio.FIRST_COMPLETED)
+            waiting.cancel()
+            done, _ = await asyncio.wait({first}, timeout=delay_ms / 1000)
+            if done or self._hedges >= llm_config.LLM_HEDGE_MAX_RATIO * self._calls:
+                return await first
+            self._hedges += 1
+            stats.counters["hedges"] += 1
+            second = asyncio.create_task(self._attempt(chat, messages, config, kwargs, stats))
+            pending = {first, second}
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                # Check every finished task so no failure goes unretrieved
+                winners = [task for task in done if task.exception() is None]
+                if winners:
+                    if winners[0] is second:
+                        stats.counters["hedge_wins"] += 1
+                    return winners[0].result()
+            return first.result()  # both failed: raise the original call's error
+        finally:
+            # The losing (or abandoned) calls
+            first.cancel()
+            if second is not None:
+                second.cancel()
+
+    async def invoke(self, chat: GatewayChat, messages, config: dict | None, kwargs: dict):
+        stats = self._model_stats(chat.label)
+        stats.counters["calls"] += 1
+        self._calls += 1
+        answer = ANSWER_TAG in (config or {}).get("tags", [])
+        delay_ms = None
+        if llm_config.LLM_HEDGE_ENABLED and not answer and stats.count >= llm_config.LLM_HEDGE_MIN_SAMPLES:
+            delay_ms = stats.quantile(llm_config.LLM_HEDGE_QUANTILE)
+        for attempt in range(llm_config.LLM_MAX_RETRIES + 1):
+            watch = None
+            attempt_config = config
+            if answer:
+                # Merged into the graph's callbacks, next to the handler that streams the tokens
+                watch = TokenWatch()
+                attempt_config = merge_configs(ensure_config(config), {"callbacks": [watch]})
+            try:
+                result = await self._hedged(chat, messages, attempt_config, kwargs, stats, delay_ms)
+                count_tokens(chat.model, chat.purpose, getattr(result, "usage_metadata", None))
+                return result
+            except Exception as e:
+                stats.counters["errors"] += 1
+                backoff = llm_config.LLM_RETRY_BACKOFF_SECONDS * 2 ** attempt * random.uniform(0.5, 1.0)
+                deadline = _deadline.get()
+                retry = (
+                    attempt < llm_config.LLM_MAX_RETRIES
+                    and _retryable(e)
+                    and not (watch is not None and watch.emitted)
+                    and (deadline is None or deadline - time.monotonic() > backoff)
+                )
+                log_event("llm.error", model=chat.label, attempt=attempt, error=type(e).__name__, retry=retry)
+                if not retry:
+                    raise
+                stats.counters["retries"] += 1
+                await asyncio.sleep(backoff)
+
+    def stats(self) -> dict:
+        return {
+            "calls": self._calls,
+            "hedges": self._hedges,
+            "in_flight_limit": llm_config.LLM_MAX_CONCURRENCY,
+            "models": {label: s.stats() for label, s in sorted(self._stats.items())},
+        }
+
+    def collect(self):
+        """Metric families for ``GET /metrics``."""
+        labelled = [(dict(zip(("model", "purpose"), label.rsplit(":", 1))), s) for label, s in sorted(self._stats.items())]
+        yield ("llm_call_ms", "histogram", "Successful LLM call attempts in ms, by model and purpose.",
+               [(labels, s.latency) for labels, s in labelled])
+        yield ("llm_events_total", "counter", "LLM gateway calls, errors, retries, timeouts and hedges.",
+               [({**labels, "event": event}, n) for labels, s in labelled for event, n in s.counters.items()])
+
+    async def aclose(self):
+        for client in self._http.values():
+            await client.aclose()
+        self._http.clear()
+
+
+llm_gateway = LlmGateway()
+REGISTRY.collector(llm_gateway.collect)
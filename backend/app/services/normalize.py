@@ -0,0 +1,24 @@
+import re
+import unicodedata
+
+_WHITESPACE = re.compile(r"\s+")
+
+
+def _is_edge_noise(char: str) -> bool:
+    # Unicode punctuation (P*); combining marks such as Thai vowels are kept
+    return char.isspace() or unicodedata.category(char)[0] == "P"
+
+
+def normalize_query(text: str) -> str:
+    """Canonical form of a user question used as a cache key.
+
+    Unicode-normalizes, lowercases, collapses whitespace and strips leading and
+    trailing punctuation, so "Return policy?" and "return  policy" share a key.
+    """
+    text = _WHITESPACE.sub(" ", unicodedata.normalize("NFKC", text).lower())
+    start, end = 0, len(text)
+    while start < end and _is_edge_noise(text[start]):
+        start += 1
+    while end > start and _is_edge_noise(text[end - 1]):
+        end -= 1
+    return text[start:end]
@@ -0,0 +1,303 @@
+"""In-memory, read-only columnar copy of the product catalog for fast-path queries.
+
+Questions the SQL fast path understands (``ProductQuery``: category, brand,
+price range, rating floor, stock, discount, sort) are answered here instead
+of with a database round-trip:
+
+- numbers are NumPy columns (NULL = NaN); brand, category and availability
+  are dictionary-encoded into integer codes, with "in stock" precomputed per
+  availability value;
+- every sort order of ``sql_fast_path.ORDER_BY`` (and the default one) is
+  precomputed as row positions, for the whole catalog and split by category
+  and by brand;
+- a query walks the narrowest of those orders in growing chunks, applies the
+  other filters as vectorized masks and stops at ``limit`` rows.
+
+Results match ``build_product_sql``'s rows, with ties broken by id. Every
+load builds a new ``ProductCatalog`` and swaps it in, so queries never see a
+half-refreshed catalog. After the first full load, the engine checks the
+catalog version (bumped by ``app.db.catalog_loader``) every
+``SQL_PRODUCT_ENGINE_REFRESH_SECONDS``. When it changed, only the columns
+the loader updates are re-read, plus the full rows of new ids. Changes made
+outside the loader are picked up on restart.
+"""
+import asyncio
+import time
+
+import numpy as np
+import pandas as pd
+from sqlalchemy import text
+
+from app.core.config import sql_config
+from app.core.logging import log_event
+from app.db.catalog_loader import DELTA_COLUMNS, read_catalog_version, table_name
+from app.models.amazon_data_model import amazonProductSchema
+from app.services.sql_fast_path import ProductQuery
+
+TEXT_COLUMNS = ("product_link", "title")
+CODED_COLUMNS = ("brand", "category", "availability")
+NUMBER_COLUMNS = ("price", "discount", "avg_rating", "total_ratings")
+RESULT_COLUMNS = ("title", "price", "avg_rating", "product_link", "discount")
+PRICE_SORTS = ("price_asc", "price_desc")
+CHUNK = 1024  # rows of an order tested by the first vectorized step
+
+
+def _in_stock(availability: str) -> bool:
+    # Same test as build_product_sql's ILIKE filter
+    value = availability.lower()
+    return ("in stock" in value or value.startswith("available")) and "out of stock" not in value
+
+
+def _desc(values: np.ndarray) -> np.ndarray:
+    # Sort key for DESC NULLS LAST in an ascending sort
+    return np.where(np.isnan(values), np.inf, -values)
+
+
+class ProductCatalog:
+    """One immutable snapshot of the catalog, rows ordered by id."""
+
+    def __init__(self, columns: dict, version: int):
+        self.version = version
+        self.ids = np.asarray(columns["id"], dtype=np.int64)
+        self.text = {c: np.asarray(columns[c], dtype=object) for c in TEXT_COLUMNS}
+        # None becomes NaN in a float array, so SQL NULL semantics carry over (NaN >= x is False)
+        self.numbers = {c: np.asarray(columns[c], dtype=np.float64) for c in NUMBER_COLUMNS}
+        self.codes, self.values, self.index = {}, {}, {}
+        for c in CODED_COLUMNS:
+            codes, values = pd.factorize(np.asarray(columns[c], dtype=object), use_na_sentinel=True)
+            self.codes[c], self.values[c] = codes.astype(np.int32), list(values)
+            self.index[c] = {value: code for code, value in enumerate(values)}
+        # Indexed by availability code; the trailing False is what NULL's code (-1) reads
+        self.in_stock = np.array([_in_stock(v) for v in self.values["availability"]] + [False])
+        self.orders = {sort: (order, self._price_keys(sort, order)) for sort, order in self._orders().items()}
+        self.by_category, self.by_brand = self._group("category"), self._group("brand")
+
+    def __len__(self):
+        return len(self.ids)
+
+    def _orders(self) -> dict[str | None, np.ndarray]:
+        price, rating = self.numbers["price"], self.numbers["avg_rating"]
+        ratings, discount = self.numbers["total_ratings"], self.numbers["discount"]
+        # np.lexsort: last key is the primary one; id breaks ties
+        orders = {
+            "price_asc": np.lexsort((self.ids, price)),
+            "price_desc": np.lexsort((self.ids, -price)),
+            "rating_desc": np.lexsort((self.ids, _desc(ratings), _desc(rating))),
+            "discount_desc": np.lexsort((self.ids, _desc(discount))),
+            None: np.lexsort((self.ids, _desc(ratings))),  # build_product_sql's default: most ratings first
+        }
+        for sort in PRICE_SORTS:
+            # Price sorts filter NULL prices out, like build_product_sql
+            orders[sort] = orders[sort][~np.isnan(price[orders[sort]])]
+        return orders
+
+    def _price_keys(self, sort: str | None, positions: np.ndarray) -> np.ndarray | None:
+        # Ascending along a price order (prices, or negated prices for price_desc), for np.searchsorted
+        if sort not in PRICE_SORTS:
+            return None
+        prices = self.numbers["price"][positions]
+        return prices if sort == "price_asc" else -prices
+
+    def _group(self, column: str) -> dict[str | None, list[tuple]]:
+        """Per sort, the order split by the value of ``column``: ``[sort][code]`` is ``(positions, price_keys)``."""
+        codes, groups = self.codes[column], {}
+        for sort, (order, _) in self.orders.items():
+            # A stable sort by code keeps each group in sort order; NULL (-1) comes first and is skipped
+            grouped = order[np.argsort(codes[order], kind="stable")]
+            keys = self._price_keys(sort, grouped)
+            counts = np.bincount(codes[order] + 1, minlength=len(self.values[column]) + 1)
+            bounds = np.concatenate([[0], np.cumsum(counts)])
+            groups[sort] = [(grouped[start:end], None if keys is None else keys[start:end])
+                            for start, end in zip(bounds[1:-1], bounds[2:])]
+        return groups
+
+    def query(self, slots: ProductQuery, brand_names: dict[str, str], limit: int = 10) -> list[dict]:
+        category = brand = None
+        if slots.category:
+            category = self.index["category"].get(slots.category)
+            if category is None:
+                return []
+        if slots.brand:
+            brand = self.index["brand"].get(brand_names.get(slots.brand, slots.brand))
+            if brand is None:
+                return []
+        # Walk the narrowest precomputed order; the other filters are masks
+        if brand is not None:
+            order, price_keys = self.by_brand[slots.sort][brand]
+        elif category is not None:
+            order, price_keys = self.by_category[slots.sort][category]
+        else:
+            order, price_keys = self.orders[slots.sort]
+        if price_keys is not None:
+            # Along a price order, the price bounds select one contiguous slice
+            low, high = (slots.min_price, slots.max_price) if slots.sort == "price_asc" else (
+                None if slots.max_price is None else -slots.max_price,
+                None if slots.min_price is None else -slots.min_price)
+            start = 0 if low is None else np.searchsorted(price_keys, low, side="left")
+            end = len(order) if high is None else np.searchsorted(price_keys, high, side="right")
+            order = order[start:end]
+        price, discount, rating = self.numbers["price"], self.numbers["discount"], self.numbers["avg_rating"]
+
+        found, need, start, size = [], limit, 0, CHUNK
+        while start < len(order) and need > 0:
+            rows = order[start:start + size]
+            mask = np.ones(len(rows), dtype=bool)
+            if brand is not None and category is not None:
+                mask &= self.codes["category"][rows] == category
+            if slots.min_price is not None:
+                mask &= price[rows] >= slots.min_price
+            if slots.max_price is not None:
+                mask &= price[rows] <= slots.max_price
+            if slots.min_rating is not None:
+                mask &= rating[rows] >= slots.min_rating
+            if slots.discounted:
+                mask &= discount[rows] > 0
+            if slots.in_stock:
+                mask &= self.in_stock[self.codes["availability"][rows]]
+            hits = rows[mask][:need]
+            found.append(hits)
+            need -= len(hits)
+            # Selective filters need more rows per match; doubling bounds the steps to log2(n / CHUNK)
+            start, size = start + size, size * 2
+        return [self.row(i) for i in np.concatenate(found)] if found else []
+
+    def row(self, i: int) -> dict:
+        row = {}
+        for c in RESULT_COLUMNS:
+            if c in self.text:
+                row[c] = self.text[c][i]
+            else:
+                value = self.numbers[c][i]
+                row[c] = None if np.isnan(value) else float(value)
+        return row
+
+    def columns(self, positions: np.ndarray | None = None) -> dict:
+        """The raw columns (of ``positions`` only, if given), as ``ProductCatalog`` takes them."""
+        take = (lambda a: a) if positions is None else (lambda a: a[positions])
+        columns = {"id": take(self.ids)}
+        columns.update({c: take(a) for c, a in self.text.items()})
+        columns.update({c: take(a) for c, a in self.numbers.items()})
+        for c in CODED_COLUMNS:
+            values = np.array(self.values[c] + [None], dtype=object)  # code -1 -> None
+            columns[c] = values[take(self.codes[c])]
+        return columns
+
+
+async def _read_columns(db, sql: str, params: dict | None = None) -> dict:
+    result = await db.stream(text(sql).execution_options(yield_per=50_000), params or {})
+    names = list(result.keys())
+    columns = {name: [] for name in names}
+    async for partition in result.partitions():
+        for name, values in zip(names, zip(*partition)):
+            columns[name].extend(values)
+    return columns
+
+
+class ProductEngine:
+    """Serves fast-path queries from the latest ``ProductCatalog`` and keeps it in step with Postgres."""
+
+    def __init__(self, session_factory, refresh_seconds: float, table=amazonProductSchema.__table__):
+        self._session = session_factory
+        self._table = table
+        self._select = f"SELECT id, {', '.join(TEXT_COLUMNS + CODED_COLUMNS + NUMBER_COLUMNS)} FROM {table_name(table)}"
+        self.refresh_seconds = refresh_seconds
+        self.catalog: ProductCatalog | None = None
+        self._checked_at = 0.0
+        self._refresh: asyncio.Task | None = None
+        self._lock = asyncio.Lock()  # one load or refresh at a time (startup component and background checks)
+        self.counters = {"queries": 0, "not_loaded": 0, "query_us_total": 0.0, "loads": 0, "refreshes": 0,
+                         "refresh_errors": 0}
+
+    async def refresh(self):
+        """Load the catalog, or apply the loader's changes if its version moved; the startup component's factory."""
+        async with self._lock:
+            if self.catalog is None:
+                await self._load()
+            else:
+                await self._apply_changes()
+        return self
+
+    async def _load(self):
+        t0 = time.perf_counter()
+        async with self._session() as db:
+            version = await read_catalog_version(db, self._table)
+            columns = await _read_columns(db, f"{self._select} ORDER BY id")
+        # Encoding and sorting are CPU-bound; keep them off the event loop
+        self.catalog = await asyncio.to_thread(ProductCatalog, columns, version)
+        self._checked_at = time.monotonic()
+        self.counters["loads"] += 1
+        log_event("product_engine.load", rows=len(self.catalog), version=version,
+                  seconds=round(time.perf_counter() - t0, 3))
+
+    async def _apply_changes(self):
+        t0 = time.perf_counter()
+        async with self._session() as db:
+            version = await read_catalog_version(db, self._table)
+            self._checked_at = time.monotonic()
+            if version == self.catalog.version:
+                return
+            # The loader only changes DELTA_COLUMNS of existing products; new ones are read in full
+            delta = await _read_columns(
+                db, f"SELECT id, {', '.join(DELTA_COLUMNS)} FROM {table_name(self._table)} ORDER BY id")
+            ids = np.asarray(delta["id"], dtype=np.int64)
+            old = self.catalog
+            added = np.setdiff1d(ids, old.ids, assume_unique=True)
+            new_rows = await _read_columns(db, f"{self._select} WHERE id = ANY(:ids) ORDER BY id",
+                                           {"ids": added.tolist()}) if len(added) else None
+        kept = old.columns(np.flatnonzero(np.isin(old.ids, ids, assume_unique=True)))
+        if new_rows is not None:
+            kept = {c: np.concatenate([np.asarray(kept[c], dtype=object), np.asarray(new_rows[c], dtype=object)])
+                    for c in kept}
+            order = np.argsort(np.asarray(kept["id"], dtype=np.int64), kind="stable")
+            kept = {c: values[order] for c, values in kept.items()}
+        kept.update(delta)  # both ordered by id
+        self.catalog = await asyncio.to_thread(ProductCatalog, kept, version)
+        self.counters["refreshes"] += 1
+        log_event("product_engine.refresh", rows=len(self.catalog), version=version, added=len(added),
+                  deleted=len(old) - (len(self.catalog) - len(added)), seconds=round(time.perf_counter() - t0, 3))
+
+    def _maybe_refresh(self):
+        due = time.monotonic() - self._checked_at >= self.refresh_seconds
+        if due and (self._refresh is None or self._refresh.done()):
+            self._refresh = asyncio.create_task(self._refresh_in_background())
+
+    async def _refresh_in_background(self):
+        try:
+            await self.refresh()
+        except Exception as e:
+            self._checked_at = time.monotonic()  # retry at the next interval, not on every query
+            self.counters["refresh_errors"] += 1
+            log_event("product_engine.refresh_error", error=str(e))
+
+    def query(self, slots: ProductQuery, brand_names: dict[str, str], limit: int = 10) -> list[dict] | None:
+        """Rows for ``slots``, or ``None`` while no catalog is loaded (the caller queries Postgres)."""
+        self._maybe_refresh()
+        catalog = self.catalog
+        if catalog is None:
+            self.counters["not_loaded"] += 1
+            return None
+        t0 = time.perf_counter()
+        rows = catalog.query(slots, brand_names, limit)
+        self.counters["queries"] += 1
+        self.counters["query_us_total"] += (time.perf_counter() - t0) * 1e6
+        return rows
+
+    def stats(self) -> dict:
+        queries = self.counters["queries"]
+        return {
+            **{k: v for k, v in self.counters.items() if k != "query_us_total"},
+            "avg_query_us": round(self.counters["query_us_total"] / queries, 1) if queries else 0.0,
+            "rows": len(self.catalog) if self.catalog is not None else 0,
+            "version": self.catalog.version if self.catalog is not None else None,
+        }
+
+
+def build_product_engine():
+    if not sql_config.SQL_PRODUCT_ENGINE_ENABLED:
+        return None
+    from app.db.postgresdb import get_async_db
+
+    return ProductEngine(get_async_db, refresh_seconds=sql_config.SQL_PRODUCT_ENGINE_REFRESH_SECONDS)
+
+
+product_engine = build_product_engine()
@@ -0,0 +1,218 @@
+"""Hybrid product search for questions the SQL fast path does not understand.
+
+``ILIKE '%keyword%'`` finds neither synonyms ("sneakers" for "running shoes")
+nor a ranking. A question the fast-path slots do not explain is searched
+instead:
+
+- the question is embedded with the router's FastEmbed model and matched
+  against ``ProductVectorIndex``, the persisted title embeddings;
+- one SQL round-trip fetches those candidates plus the best full-text
+  (``search_tsv``) and trigram matches of the words the slots left over,
+  all under the structured filters the slots did select (price, rating,
+  category, brand, stock, discount);
+- the three rankings are fused with reciprocal rank fusion and, when the
+  question asked for a sort ("cheapest ..."), the top rows are ordered by it.
+
+The index is built offline and incrementally (only new or retitled products
+are embedded)::
+
+    python -m app.services.product_search [--dry-run]
+
+The catalog loader re-syncs it after each load when
+``SQL_PRODUCT_SEARCH_ENABLED``. Workers pick up a newly synced index within
+``SQL_PRODUCT_SEARCH_RELOAD_SECONDS``. Products added since the last sync
+are still found by the full-text and trigram side.
+"""
+import argparse
+import asyncio
+import time
+
+from sqlalchemy import Table, text
+
+from app.core.config import sql_config
+from app.core.logging import log_event
+from app.core.metrics import span
+from app.db.catalog_loader import table_name
+from app.db.product_vectors import ProductVectorIndex
+from app.models.amazon_data_model import amazonProductSchema
+from app.services.sql_fast_path import STOPWORDS, WORD, ProductQuery, product_filters
+
+RESULT_COLUMNS = ("title", "price", "avg_rating", "product_link", "discount")
+RRF_K = 60  # rank damping of reciprocal rank fusion; 60 is the usual choice
+TRIGRAM_MIN = 0.3  # word_similarity below this does not count as a trigram match
+
+
+def search_terms(question: str, slots: ProductQuery) -> list[str]:
+    """Words for the lexical side: what the slots did not explain, or every content word if extraction gave up."""
+    words = slots.unexplained
+    if any(word.startswith("<") for word in words):
+        words = [w for w in WORD.findall(question.lower()) if w not in STOPWORDS]
+    # A leading "-" would negate the word in websearch_to_tsquery
+    return [w.strip("-'") for w in words if w.strip("-'")]
+
+
+def hybrid_sql(table: str, slots: ProductQuery, brand_names: dict[str, str], ids: list[int], terms: list[str],
+               candidates: int) -> tuple[str, dict]:
+    """Vector candidates plus the top lexical matches, both under the slot filters; returns ``(sql, params)``."""
+    where, params = product_filters(slots, brand_names)
+    filters = "".join(f" AND {condition}" for condition in where)
+    scores = "0.0 AS text_rank, 0.0 AS trigram"
+    if terms:
+        # websearch_to_tsquery never fails on user text; "or" makes any term a match
+        params.update(lexical=" or ".join(terms), terms=" ".join(terms))
+        scores = ("ts_rank_cd(search_tsv, websearch_to_tsquery('english', :lexical)) AS text_rank, "
+                  "word_similarity(:terms, title) AS trigram")
+    select = f"SELECT id, {', '.join(RESULT_COLUMNS)}, total_ratings, {scores} FROM {table}"
+    parts = [f"({select} WHERE id = ANY(:ids){filters})"]
+    params["ids"] = ids
+    if terms:
+        # Served by the search_tsv and title trigram GIN indexes
+        parts.append(f"({select} WHERE (search_tsv @@ websearch_to_tsquery('english', :lexical) "
+                     f"OR :terms <% title){filters} ORDER BY text_rank DESC, trigram DESC LIMIT :candidates)")
+        params["candidates"] = candidates
+    return " UNION ".join(parts), params
+
+
+def _desc(value) -> tuple:
+    # DESC NULLS LAST as an ascending key
+    return value is None, -(value or 0)
+
+
+SORT_KEYS = {
+    "price_asc": lambda row: row["price"],
+    "price_desc": lambda row: -row["price"],
+    "rating_desc": lambda row: (*_desc(row["avg_rating"]), *_desc(row["total_ratings"])),
+    "discount_desc": lambda row: _desc(row["discount"]),
+}
+
+
+def fuse(rows: list[dict], vector_ids: list[int], limit: int, sort: str | None = None) -> list[dict]:
+    """Top ``limit`` rows by reciprocal rank fusion of the vector, full-text and trigram rankings."""
+    rankings = [
+        vector_ids,
+        [r["id"] for r in sorted((r for r in rows if r["text_rank"] > 0), key=lambda r: -r["text_rank"])],
+        [r["id"] for r in sorted((r for r in rows if r["trigram"] >= TRIGRAM_MIN), key=lambda r: -r["trigram"])],
+    ]
+    scores = dict.fromkeys((r["id"] for r in rows), 0.0)
+    for ranking in rankings:
+        for rank, id_ in enumerate(i for i in ranking if i in scores):
+            scores[id_] += 1 / (RRF_K + rank + 1)
+    top = sorted(rows, key=lambda r: (-scores[r["id"]], r["id"]))[:limit]
+    if sort in SORT_KEYS:
+        top.sort(key=SORT_KEYS[sort])
+    return [{c: row[c] for c in RESULT_COLUMNS} for row in top]
+
+
+class ProductSearch:
+    """Hybrid search over ``table``; ``load`` (the startup component's factory) maps the persisted index."""
+
+    def __init__(self, encode, *, index_dir: str, candidates: int, min_similarity: float, probes: int,
+                 reload_seconds: float, table: Table = amazonProductSchema.__table__):
+        self._encode = encode  # async: texts -> unit-norm float32 rows
+        self._index_dir = index_dir
+        self._table = table
+        self.candidates = candidates
+        self.min_similarity = min_similarity
+        self.probes = probes
+        self.reload_seconds = reload_seconds
+        self.index: ProductVectorIndex | None = None
+        self._checked_at = 0.0
+        self.counters = {"searches": 0, "not_loaded": 0, "no_match": 0, "reloads": 0,
+                         "encode_ms_total": 0.0, "vector_ms_total": 0.0, "sql_ms_total": 0.0}
+
+    def load(self, encoder_name: str | None = None):
+        if encoder_name is None:
+            from app.services.router_search import encoder_name as current_encoder
+            encoder_name = current_encoder()
+        self.index = ProductVectorIndex(encoder_name, self._index_dir, table_name(self._table), self.probes)
+        self._checked_at = time.monotonic()
+        return self
+
+    async def _maybe_reload(self):
+        if time.monotonic() - self._checked_at < self.reload_seconds:
+            return
+        self._checked_at = time.monotonic()
+        if await asyncio.to_thread(self.index.load):
+            self.counters["reloads"] += 1
+
+    async def search(self, db, question: str, slots: ProductQuery, brand_names: dict[str, str],
+                     limit: int = 10) -> list[dict] | None:
+        """Best rows for ``question`` under the ``slots`` filters, or ``None`` (no index yet, or nothing matched)."""
+        if self.index is not None:
+            await self._maybe_reload()
+        if self.index is None or not self.index.count():
+            self.counters["not_loaded"] += 1
+            return None
+        t0 = time.perf_counter()
+        with span("product_search.encode"):
+            vector = (await self._encode([question]))[0]
+        t1 = time.perf_counter()
+        with span("product_search.vector"):
+            ids, _ = await asyncio.to_thread(self.index.search, vector, self.candidates, self.min_similarity)
+        t2 = time.perf_counter()
+        terms = search_terms(question, slots)
+        sql, params = hybrid_sql(table_name(self._table), slots, brand_names, ids.tolist(), terms, self.candidates)
+        with span("product_search.sql"):
+            rows = [dict(row) for row in (await db.execute(text(sql), params)).mappings().fetchall()]
+        t3 = time.perf_counter()
+        self.counters["searches"] += 1
+        self.counters["encode_ms_total"] += (t1 - t0) * 1000
+        self.counters["vector_ms_total"] += (t2 - t1) * 1000
+        self.counters["sql_ms_total"] += (t3 - t2) * 1000
+        log_event("product_search", vector_candidates=len(ids), rows=len(rows), terms=terms[:5],
+                  ms=round((t3 - t0) * 1000, 1))
+        if not rows:
+            self.counters["no_match"] += 1
+            return None
+        return fuse(rows, ids.tolist(), limit, slots.sort)
+
+    def stats(self) -> dict:
+        searches = self.counters["searches"]
+        live = self.index.live if self.index is not None else None
+        return {
+            **{k: v for k, v in self.counters.items() if not k.endswith("_ms_total")},
+            **{f"avg_{k[:-len('_total')]}": round(v / searches, 2) if searches else 0.0
+               for k, v in self.counters.items() if k.endswith("_ms_total")},
+            "indexed_products": len(live) if live is not None else 0,
+            "generation": live.name if live is not None else None,
+        }
+
+
+def sync_product_index(*, table: Table = amazonProductSchema.__table__, index: ProductVectorIndex | None = None,
+                       encode=None, batch_size: int = sql_config.SQL_PRODUCT_SEARCH_BATCH_SIZE,
+                       dry_run: bool = False, engine=None):
+    """Embed the titles of ``table`` that the index does not have yet and drop deleted products."""
+    if engine is None:
+        from app.db.postgresdb import engine
+    if index is None or encode is None:
+        from app.services.router_search import encode_queries, encoder_name
+        index = index or ProductVectorIndex(encoder_name(), sql_config.SQL_PRODUCT_SEARCH_INDEX_DIR, table_name(table))
+        encode = encode or encode_queries
+    with engine.connect() as conn:
+        rows = conn.execute(text(f"SELECT id, coalesce(title, '') FROM {table_name(table)} ORDER BY id")).fetchall()
+    return index.sync([r[0] for r in rows], [r[1] for r in rows], encode, batch_size=batch_size, dry_run=dry_run)
+
+
+def build_product_search():
+    if not sql_config.SQL_PRODUCT_SEARCH_ENABLED:
+        return None
+    from app.services.router_search import aencode_queries
+
+    return ProductSearch(
+        aencode_queries,
+        index_dir=sql_config.SQL_PRODUCT_SEARCH_INDEX_DIR,
+        candidates=sql_config.SQL_PRODUCT_SEARCH_CANDIDATES,
+        min_similarity=sql_config.SQL_PRODUCT_SEARCH_MIN_SIMILARITY,
+        probes=sql_config.SQL_PRODUCT_SEARCH_PROBES,
+        reload_seconds=sql_config.SQL_PRODUCT_SEARCH_RELOAD_SECONDS,
+    )
+
+
+product_search = build_product_search()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Sync the product title embeddings with amazon_product_data.")
+    parser.add_argument("--dry-run", action="store_true", help="report what would be embedded and deleted")
+    args = parser.parse_args()
+    print(sync_product_index(dry_run=args.dry_run).as_dict())
@@ -0,0 +1,68 @@
+"""Compact encoding of database rows for the comprehension prompt.
+
+Rows become a pipe-separated table with the header written once, prices and
+ratings rounded, discounts as percentages, long titles cut at a word boundary
+and Amazon links reduced to their canonical ``/dp/<ASIN>`` form. As many rows
+as fit the token budget are included, in result order.
+"""
+import math
+import re
+from dataclasses import dataclass
+
+# Same heuristic as langchain's count_tokens_approximately (context_window.count_tokens)
+CHARS_PER_TOKEN = 4.0
+TITLE_MAX_CHARS = 80
+VALUE_MAX_CHARS = 120
+AMAZON_LINK = re.compile(r"^https?://(?:www\.)?amazon\.com/(?:[^/?#]+/)?dp/(\w+)")
+
+
+def count_text_tokens(text: str) -> int:
+    return math.ceil(len(text) / CHARS_PER_TOKEN)
+
+
+def _truncate(value: str, limit: int) -> str:
+    if len(value) <= limit:
+        return value
+    return value[:limit].rsplit(" ", 1)[0].rstrip(" ,-/") + "…"
+
+
+def format_value(column: str, value) -> str:
+    if value is None or (isinstance(value, float) and math.isnan(value)):
+        return ""
+    if column == "price":
+        return f"{float(value):.2f}"
+    if column == "avg_rating":
+        return f"{float(value):.1f}"
+    if column == "discount":
+        return f"{round(float(value) * 100)}%"
+    if column == "product_link":
+        link = AMAZON_LINK.match(str(value))
+        return f"https://www.amazon.com/dp/{link.group(1)}" if link else str(value)
+    if isinstance(value, float):
+        return f"{value:.2f}".rstrip("0").rstrip(".")
+    text = " ".join(str(value).split()).replace("|", "/")
+    return _truncate(text, TITLE_MAX_CHARS if column == "title" else VALUE_MAX_CHARS)
+
+
+@dataclass
+class EncodedRows:
+    text: str
+    rows: int  # rows included
+    tokens: int
+
+
+def encode_rows(rows: list[dict], token_budget: int) -> EncodedRows:
+    """Header plus as many rows as fit ``token_budget`` (always at least one)."""
+    if not rows:
+        return EncodedRows("", 0, 0)
+    columns = list(rows[0])
+    lines = ["|".join(columns)]
+    tokens = count_text_tokens(lines[0])
+    for row in rows:
+        line = "|".join(format_value(c, row.get(c)) for c in columns)
+        line_tokens = count_text_tokens(line) + 1  # newline
+        if len(lines) > 1 and tokens + line_tokens > token_budget:
+            break
+        lines.append(line)
+        tokens += line_tokens
+    return EncodedRows("\n".join(lines), len(lines) - 1, tokens)
@@ -0,0 +1,56 @@
+import copy
+import threading
+
+from app.core.cache import MISSING, TTLCache
+from app.core.logging import log_event
+from app.services.normalize import normalize_query
+
+
+class FaqRetrievalCache:
+    """Two-level cache for FAQ retrieval.
+
+    - ``embeddings``: normalized query -> query embedding. Only depends on the
+      text and the embedding model, so it survives collection changes.
+    - ``results``: (normalized query, k, generation) -> top-k results, with TTL.
+      ``invalidate()`` bumps the generation, so results computed against the old
+      collection can never be served again, even if a worker thread stores them
+      after the invalidation.
+
+    Callers always receive a private copy of the cached results.
+    """
+
+    def __init__(self, maxsize: int, embedding_maxsize: int, ttl_seconds: float):
+        self.embeddings = TTLCache(embedding_maxsize)
+        self.results = TTLCache(maxsize, ttl_seconds)
+        self._generation = 0
+        self._lock = threading.Lock()
+
+    def get_embedding(self, query: str):
+        return self.embeddings.get(normalize_query(query))
+
+    def set_embedding(self, query: str, embedding):
+        self.embeddings.set(normalize_query(query), embedding)
+
+    def _results_key(self, query: str, n_results: int):
+        return normalize_query(query), n_results, self._generation
+
+    def get_results(self, query: str, n_results: int):
+        results = self.results.get(self._results_key(query, n_results))
+        return MISSING if results is MISSING else copy.deepcopy(results)
+
+    def set_results(self, query: str, n_results: int, results: dict, generation: int):
+        if generation == self._generation:
+            self.results.set((normalize_query(query), n_results, generation), copy.deepcopy(results))
+
+    @property
+    def generation(self) -> int:
+        return self._generation
+
+    def invalidate(self, reason: str):
+        with self._lock:
+            self._generation += 1
+            self.results.clear()
+        log_event("faq.cache.invalidate", reason=reason, generation=self._generation)
+
+    def stats(self) -> dict:
+        return {"embeddings": self.embeddings.stats(), "results": self.results.stats(), "generation": self._generation}
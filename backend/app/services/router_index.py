@@ -0,0 +1,101 @@
+"""Persisted route index for the semantic router.
+
+Route utterances are encoded once and saved as ``routes.npy`` next to a
+``routes.json`` manifest recording, per route, a hash of its utterances and
+the encoder name plus its row range. On boot the array is memory-mapped;
+only routes whose hash changed are re-encoded.
+
+Rebuild offline (e.g. in the Docker build) from ``backend/``::
+
+    python -m app.services.router_index --index-dir .cache/router_index
+"""
+import argparse
+import hashlib
+import json
+from pathlib import Path
+
+import numpy as np
+
+from app.core.files import atomic_write
+from app.core.logging import log_event
+
+INDEX_FILE = "routes.npy"
+MANIFEST_FILE = "routes.json"
+
+
+def route_fingerprint(encoder_name: str, utterances: list[str]) -> str:
+    digest = hashlib.sha256(encoder_name.encode())
+    digest.update(json.dumps(list(utterances), ensure_ascii=False).encode())
+    return digest.hexdigest()[:16]
+
+
+def _read_saved(index_dir: Path, encoder_name: str):
+    try:
+        manifest = json.loads((index_dir / MANIFEST_FILE).read_text())
+        matrix = np.load(index_dir / INDEX_FILE, mmap_mode="r")
+    except (OSError, ValueError):
+        return None, None
+    if manifest.get("encoder") != encoder_name:
+        return None, None
+    if max((entry["stop"] for entry in manifest["routes"].values()), default=0) != len(matrix):
+        # Array and manifest of different saves: re-encode
+        return None, None
+    return manifest["routes"], matrix
+
+
+def _save(index_dir: Path, encoder_name: str, layout: dict, matrix: np.ndarray):
+    # Unique temp files and rename: workers booting at once never share a temp file,
+    # and none maps a half-written array
+    index_dir.mkdir(parents=True, exist_ok=True)
+    with atomic_write(index_dir / INDEX_FILE) as f:
+        np.save(f, matrix)
+    with atomic_write(index_dir / MANIFEST_FILE, "w") as f:
+        json.dump({"encoder": encoder_name, "routes": layout}, f)
+
+
+def load_route_embeddings(routes, encode, encoder_name: str, index_dir: str):
+    """Embeddings for every utterance of ``routes``, reusing the persisted index.
+
+    Returns ``(matrix, route_names, utterances)`` with one row per utterance.
+    When nothing changed, ``matrix`` is the memory-mapped file itself.
+    """
+    index_dir = Path(index_dir)
+    saved, saved_matrix = _read_saved(index_dir, encoder_name)
+    blocks, layout, encoded = [], {}, []
+    start = 0
+    for route in routes:
+        key = route_fingerprint(encoder_name, route.utterances)
+        entry = (saved or {}).get(route.name)
+        if entry is not None and entry["hash"] == key:
+            blocks.append(saved_matrix[entry["start"]:entry["stop"]])
+        else:
+            blocks.append(np.asarray(encode(route.utterances), dtype=np.float32))
+            encoded.append(route.name)
+        layout[route.name] = {"hash": key, "start": start, "stop": start + len(route.utterances)}
+        start += len(route.utterances)
+
+    if layout == saved:
+        matrix = saved_matrix
+    else:
+        matrix = np.concatenate(blocks)
+        try:
+            _save(index_dir, encoder_name, layout, matrix)
+            matrix = np.load(index_dir / INDEX_FILE, mmap_mode="r")
+        except OSError as e:
+            # Read-only filesystem etc.: still route, just re-encode on the next boot
+            log_event("router_index.save.error", error=str(e))
+    log_event("router_index.load", rows=len(matrix), encoded_routes=encoded, path=str(index_dir))
+
+    route_names = [route.name for route in routes for _ in route.utterances]
+    utterances = [u for route in routes for u in route.utterances]
+    return matrix, route_names, utterances
+
+
+if __name__ == "__main__":
+    from app.core.config import router_config
+    from app.services.router_search import build_router
+
+    parser = argparse.ArgumentParser(description="Encode the semantic-router routes and persist the index.")
+    parser.add_argument("--index-dir", default=router_config.ROUTER_INDEX_DIR or ".cache/router_index")
+    args = parser.parse_args()
+    build_router(index_dir=args.index_dir)
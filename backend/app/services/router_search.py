@@ -1,101 +1,247 @@
-from semantic_router import Route
-from semantic_router.encoders import FastEmbedEncoder
-from semantic_router.routers import SemanticRouter
-
-
-faq = Route(
-  name="faq",
-  utterances=[
-    "What is the return policy of the products?",
-    "How can I track my order?",
-    "What payment methods are accepted?",
-    "How do I contact customer support?",
-    "Can I change or cancel my order?",
-    "Are there any ongoing sales or promotions?",
-    "What is the warranty on your products?",
-    "How do I create an account?",
-    "What are the shipping options available?",
-    "How do I reset my password?",
-    "How can I return a product I bought?",
-  ]
-)
-
-small_talk = Route(
-  name="small_talk",
-  utterances=[
-    "Hello",
-    "Hi there",
-    "How are you?",
-    "What's up?",
-    "Tell me a joke",
-    "Goodbye",
-    "See you later",
-    "Thanks",
-    "Thank you",
-    "You're welcome",
-    "How are you?",
-    "What is your name?",
-    "Are you a robot?",
-    "What are you?",
-    "What do you do?"
-  ]
-)
-
-product_inquiry = Route(
-    name="product_inquiry",
-    utterances=[
-      # Price & Discount (ถามราคาแบบระบุ Brand หรือ Category กว้างๆ)
-      "How much are Nike shoes?",
-      "Show me the price of mobile phones.",
-      "Are there any discounts on shirts today?",
-      "Find cheap running shoes.",
-      "What is the price of Samsung mobile phones?",
-
-      # Ratings & Reviews (ถามหาสินค้าดี/ยอดนิยม)
-      "Which mobile phones have the best rating?",
-      "Show me top rated shirts.",
-      "Find shoes with 5 star ratings.",
-      "Are Adidas shirts popular?",
-      "Recommend mobile phones with good reviews.",
-      "Which of those is the cheapest?",
-      "What products did you send me previously?",
-
-      # Availability (ถามว่ามีของไหม โดยระบุยี่ห้อหรือประเภท)
-      "Are Puma shoes in stock?",
-      "Check if you have any mobile phones available.",
-      "Do you have shirts in stock?",
-
-      # Brand & Category (ค้นหาสินค้า)
-      "I want to buy a mobile phone.",
-      "Show me shirts from Nike.",
-      "Do you sell shoes for running?",
-      "List all available mobile phones.",
-
-      # Link (ขอลิงก์ซื้อ)
-      "Send me a link to buy shoes.",
-      "Where can I order shirts?",
-    ]
-)
-
-
-router = SemanticRouter(
-    routes=[faq, product_inquiry, small_talk],
-    encoder=FastEmbedEncoder(),
-    auto_sync="local"
-)
-
-router.set_threshold(route_name="faq", threshold=0.25)
-router.set_threshold(route_name="product_inquiry", threshold=0.25)
-router.set_threshold(route_name="small_talk", threshold=0.25)
+import asyncio
+import threading
+import numpy as np
+
+from app.core.config import router_config
+from app.services.router_index import load_route_embeddings
+
+
+def build_router(index_dir: str | None = router_config.ROUTER_INDEX_DIR):
+    """Load the FastEmbed model and build the route index (slow; done once, lazily).
+
+    With ``index_dir`` set, utterance embeddings come from the persisted index
+    (see ``app.services.router_index``) instead of being encoded on every boot.
+    """
+    from semantic_router import Route
+    from semantic_router.encoders import FastEmbedEncoder
+    from semantic_router.index import LocalIndex
+    from semantic_router.routers import SemanticRouter
+
+    faq = Route(
+      name="faq",
+      utterances=[
+        "What is the return policy of the products?",
+        "How can I track my order?",
+        "What payment methods are accepted?",
+        "How do I contact customer support?",
+        "Can I change or cancel my order?",
+        "Are there any ongoing sales or promotions?",
+        "What is the warranty on your products?",
+        "How do I create an account?",
+        "What are the shipping options available?",
+        "How do I reset my password?",
+        "How can I return a product I bought?",
+      ]
+    )
+
+    small_talk = Route(
+      name="small_talk",
+      utterances=[
+        "Hello",
+        "Hi there",
+        "How are you?",
+        "What's up?",
+        "Tell me a joke",
+        "Goodbye",
+        "See you later",
+        "Thanks",
+        "Thank you",
+        "You're welcome",
+        "How are you?",
+        "What is your name?",
+        "Are you a robot?",
+        "What are you?",
+        "What do you do?"
+      ]
+    )
+
+    product_inquiry = Route(
+        name="product_inquiry",
+        utterances=[
+          # Price & Discount (ถามราคาแบบระบุ Brand หรือ Category กว้างๆ)
+          "How much are Nike shoes?",
+          "Show me the price of mobile phones.",
+          "Are there any discounts on shirts today?",
+          "Find cheap running shoes.",
+          "What is the price of Samsung mobile phones?",
+
+          # Ratings & Reviews (ถามหาสินค้าดี/ยอดนิยม)
+          "Which mobile phones have the best rating?",
+          "Show me top rated shirts.",
+          "Find shoes with 5 star ratings.",
+          "Are Adidas shirts popular?",
+          "Recommend mobile phones with good reviews.",
+          "Which of those is the cheapest?",
+          "What products did you send me previously?",
+
+          # Availability (ถามว่ามีของไหม โดยระบุยี่ห้อหรือประเภท)
+          "Are Puma shoes in stock?",
+          "Check if you have any mobile phones available.",
+          "Do you have shirts in stock?",
+
+          # Brand & Category (ค้นหาสินค้า)
+          "I want to buy a mobile phone.",
+          "Show me shirts from Nike.",
+          "Do you sell shoes for running?",
+          "List all available mobile phones.",
+
+          # Link (ขอลิงก์ซื้อ)
+          "Send me a link to buy shoes.",
+          "Where can I order shirts?",
+        ]
+    )
+
+    routes = [faq, product_inquiry, small_talk]
+    encoder = FastEmbedEncoder()
+
+    if index_dir:
+        matrix, route_names, utterances = load_route_embeddings(routes, encoder, encoder.name, index_dir)
+        # Fill the index directly: LocalIndex.add would copy the memory-mapped array
+        index = LocalIndex()
+        index.index = matrix
+        index.routes = np.array(route_names)
+        index.utterances = np.array(utterances)
+        index.metadata = np.array([{} for _ in utterances], dtype=object)
+        index.dimensions = matrix.shape[1]
+        # auto_sync off: the index already matches the routes, nothing to re-encode
+        router = SemanticRouter(routes=routes, encoder=encoder, index=index)
+    else:
+        router = SemanticRouter(
+            routes=routes,
+            encoder=encoder,
+            auto_sync="local"
+        )
+
+    router.set_threshold(route_name="faq", threshold=0.25)
+    router.set_threshold(route_name="product_inquiry", threshold=0.25)
+    router.set_threshold(route_name="small_talk", threshold=0.25)
+    return router
+
+
+_router = None
+_router_lock = threading.Lock()
+
+
+def get_router():
+    global _router
+    if _router is None:
+        with _router_lock:
+            if _router is None:
+                _router = build_router()
+    return _router
 
 
 def check_route(user_query: str):
-    matched_route = router(user_query)
+    matched_route = get_router()(user_query)
     if matched_route is None:
         return None
     
     return matched_route.name
 
+
+async def acheck_route(user_query: str):
+    # FastEmbed encoding is CPU-bound; run it in a worker thread so the event loop stays free
+    return await asyncio.to_thread(check_route, user_query)
+
+
+def score_routes(vectors: np.ndarray):
+    """Per-route scores of many query embeddings, matching ``SemanticRouter.__call__``.
+
+    Per query: cosine similarity to every utterance, the router's top-k
+    utterances aggregated per route (mean/sum/max), and the routes that pass
+    their threshold. All queries are scored with a few matrix operations
+    instead of one index query each. Returns ``(route_names, totals, passing)``
+    where ``totals`` is ``-inf`` for routes without a top-k utterance and
+    ``passing`` additionally for routes under their threshold.
+    """
+    router = get_router()
+    utterances = np.asarray(router.index.index, dtype=np.float32)
+    utterances = utterances / np.linalg.norm(utterances, axis=1, keepdims=True)
+    queries = np.asarray(vectors, dtype=np.float32)
+    queries = queries / np.linalg.norm(queries, axis=1, keepdims=True)
+    scores = queries @ utterances.T  # (queries, utterances)
+
+    route_names = [route.name for route in router.routes]
+    membership = (np.asarray(router.index.routes)[:, None] == np.array(route_names)[None, :]).astype(np.float32)
+    k = min(router.top_k, scores.shape[1])
+    top = np.zeros_like(scores, dtype=bool)
+    np.put_along_axis(top, np.argpartition(scores, -k, axis=1)[:, -k:], True, axis=1)
+
+    hits = top.astype(np.float32) @ membership  # top-k utterances per (query, route)
+    if router.aggregation == "max":
+        masked = np.where(top[:, :, None] & (membership[None] > 0), scores[:, :, None], -np.inf)
+        totals = masked.max(axis=1)
+    else:
+        totals = np.where(top, scores, 0.0) @ membership
+        if router.aggregation == "mean":
+            totals = totals / np.maximum(hits, 1)
+    totals = np.where(hits > 0, totals, -np.inf)
+
+    # A route without a (non-zero) threshold always passes, as in the router
+    thresholds = np.array([
+        (route.score_threshold if route.score_threshold is not None else router.score_threshold) or -np.inf
+        for route in router.routes
+    ], dtype=np.float32)
+    passing = np.where((hits > 0) & (totals >= thresholds), totals, -np.inf)
+    return route_names, totals, passing
+
+
+def routes_for_vectors(vectors: np.ndarray) -> list[str | None]:
+    """Route many query embeddings at once: the best route passing its threshold, else ``None``."""
+    route_names, _, passing = score_routes(vectors)
+    best = passing.argmax(axis=1)
+    return [route_names[b] if np.isfinite(passing[i, b]) else None for i, b in enumerate(best)]
+
+
+def check_route_scores(user_query: str) -> tuple[str | None, list[tuple[str, float]], np.ndarray]:
+    """``check_route`` plus every scored route, best first (used to judge how close a call was), and the query vector."""
+    vectors = encode_queries([user_query])
+    route_names, totals, passing = score_routes(vectors)
+    best = int(passing[0].argmax())
+    route = route_names[best] if np.isfinite(passing[0, best]) else None
+    ranked = sorted(((name, float(score)) for name, score in zip(route_names, totals[0]) if np.isfinite(score)),
+                    key=lambda item: item[1], reverse=True)
+    return route, ranked, vectors[0]
+
+
+async def acheck_route_scores(user_query: str):
+    return await asyncio.to_thread(check_route_scores, user_query)
+
+
+def check_route_vector(user_query: str) -> tuple[str | None, np.ndarray]:
+    """``check_route`` that also returns the query vector, for the intent classifier."""
+    vectors = encode_queries([user_query])
+    return routes_for_vectors(vectors)[0], vectors[0]
+
+
+async def acheck_route_vector(user_query: str):
+    return await asyncio.to_thread(check_route_vector, user_query)
+
+
+def check_routes(user_queries: list[str]) -> list[str | None]:
+    """Batch ``check_route``: one encoder call and one vectorized scoring pass."""
+    if not user_queries:
+        return []
+    return routes_for_vectors(encode_queries(user_queries))
+
+
+async def acheck_routes(user_queries: list[str]) -> list[str | None]:
+    return await asyncio.to_thread(check_routes, user_queries)
+
+
+def encoder_name() -> str:
+    return get_router().encoder.name
+
+
+def encode_queries(texts: list[str]) -> np.ndarray:
+    """Embed texts with the router's FastEmbed model as unit-length float32 rows."""
+    vectors = np.asarray(get_router().encoder(texts), dtype=np.float32)
+    return vectors / np.linalg.norm(vectors, axis=1, keepdims=True)
+
+
+async def aencode_queries(texts: list[str]) -> np.ndarray:
+    return await asyncio.to_thread(encode_queries, texts)
+
 # if __name__ == "__main__":
 #     test_questions = [
 #         "How can I return a product?",
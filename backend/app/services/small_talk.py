@@ -1,20 +1,19 @@
-from app.core.config import groq_config
-
-from langchain_groq import ChatGroq
-
 from langchain_core.messages import SystemMessage, HumanMessage
 
+from app.services.llm_gateway import llm_gateway
+from app.services.streaming import ANSWER_TAG
+
 class SmallTalkService:
     def __init__(self):
-        self._client_groq = ChatGroq(
-            api_key=groq_config.GROQ_API_KEY,
-            model="openai/gpt-oss-20b",
+        self._client_groq = llm_gateway.chat(
+            "groq",
+            "openai/gpt-oss-20b",
+            purpose="small_talk",
             temperature=0.7,
-            max_tokens=512,
-            model_kwargs={"stream": False}
+            max_tokens=512
         )
 
-    def get_response(self, user_query: str, history: list = []) -> str:
+    async def get_response(self, user_query: str, history: list = []) -> str:
         prompt = f"""
         You are a friendly and helpful customer support assistant for an e-commerce platform. 
         Engage in small talk with users while subtly promoting our products and services. 
@@ -34,12 +33,12 @@ class SmallTalkService:
         # Add current user prompt as HumanMessage
         messages.append(HumanMessage(content=prompt))
         
-        response = self._client_groq.invoke(messages)
+        response = await self._client_groq.ainvoke(messages, config={"tags": [ANSWER_TAG]})
 
         return response.content
 
 # if __name__ == "__main__":
 #     small_talk_service = SmallTalkService()
 #     user_input = "Hi there! How's it going?"
-#     response = small_talk_service.get_response(user_input)
+#     response = asyncio.run(small_talk_service.get_response(user_input))
 #     print(response)
\ No newline at end of file
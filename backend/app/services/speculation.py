@@ -0,0 +1,91 @@
+"""Speculative work started by the router before the route is known.
+
+A ``Speculation`` lives for one chat turn (it travels in the graph config).
+The router node starts the LLM router and the preparation step of likely
+destinations (FAQ retrieval, product SQL) as tasks; once the route is decided
+the other tasks are cancelled and the destination node picks up its result.
+Every speculative start spends one unit of a shared per-minute budget; when
+it is exhausted the turn runs sequentially as without speculation.
+"""
+import asyncio
+import time
+from collections import deque
+
+from app.core.cache import MISSING
+from app.core.logging import log_event
+
+
+class SpeculationBudget:
+    """Cost cap: at most ``max_per_minute`` speculative starts across all requests."""
+
+    def __init__(self, max_per_minute: int):
+        self.max_per_minute = max_per_minute
+        self._starts: deque[float] = deque()
+        self.counters = {"started": 0, "used": 0, "cancelled": 0, "failed": 0, "denied": 0}
+
+    def acquire(self) -> bool:
+        now = time.monotonic()
+        while self._starts and now - self._starts[0] > 60:
+            self._starts.popleft()
+        if len(self._starts) >= self.max_per_minute:
+            self.counters["denied"] += 1
+            return False
+        self._starts.append(now)
+        self.counters["started"] += 1
+        return True
+
+    def stats(self) -> dict:
+        started = self.counters["started"]
+        return {
+            **self.counters,
+            "use_ratio": round(self.counters["used"] / started, 4) if started else 0.0,
+            "starts_last_minute": len(self._starts),
+        }
+
+
+class Speculation:
+    """Speculative tasks of one turn, keyed by name (``router_llm`` or a route)."""
+
+    def __init__(self, budget: SpeculationBudget):
+        self._budget = budget
+        self._tasks: dict[str, asyncio.Task] = {}
+
+    def start(self, name: str, factory) -> bool:
+        """Run ``factory()`` (a coroutine function) as task ``name`` if the budget allows."""
+        if name in self._tasks:
+            return True
+        if not self._budget.acquire():
+            return False
+        self._tasks[name] = asyncio.create_task(factory())
+        return True
+
+    def started(self, name: str) -> bool:
+        return name in self._tasks
+
+    async def take(self, name: str):
+        """Result of task ``name``, or ``MISSING`` if it was not started, was cancelled or failed."""
+        task = self._tasks.pop(name, None)
+        if task is None:
+            return MISSING
+        try:
+            await asyncio.wait({task})
+        except asyncio.CancelledError:
+            task.cancel()  # the caller itself was cancelled
+            raise
+        if task.cancelled():
+            return MISSING
+        if task.exception() is not None:
+            self._budget.counters["failed"] += 1
+            log_event("speculation.failed", task=name, error=str(task.exception()))
+            return MISSING
+        self._budget.counters["used"] += 1
+        return task.result()
+
+    def keep(self, *names: str):
+        """Cancel every task except ``names`` (the losing branches)."""
+        for name in [n for n in self._tasks if n not in names]:
+            self._tasks.pop(name).cancel()
+            self._budget.counters["cancelled"] += 1
+
+    def cancel(self):
+        self.keep()
@@ -0,0 +1,256 @@
+"""Rule-based SQL for templated product questions ("cheapest Nike shoes", "top rated shirts").
+
+``extract_product_query`` pulls slots (category, brand, price bounds, rating
+floor, sort intent, stock/discount filters) out of a question and scores how
+much of the question it understood; ``build_product_sql`` turns the slots into
+a parameterized query over ``amazon_product_data``. Questions that are not
+fully explained by the slots (unknown words, follow-ups such as "which of
+those...") go to the LLM SQL generator instead.
+"""
+import re
+from dataclasses import dataclass, field
+
+from sqlalchemy import text
+
+from app.core.cache import MISSING, TTLCache
+
+# Canonical category values of amazon_product_data.category and the words that select them
+CATEGORY_SYNONYMS = {
+    "shoes": ["shoes", "shoe", "sneakers", "sneaker", "footwear", "boots", "sandals", "heels", "loafers"],
+    "watch": ["watches", "watch", "wristwatch", "wristwatches", "smartwatch", "smartwatches"],
+    "shirts": ["t-shirts", "t-shirt", "tshirts", "tshirt", "shirts", "shirt", "tees", "tee", "blouses", "blouse", "tops"],
+    "camera picture": ["cameras", "camera", "camcorders", "camcorder"],
+    "mobile phones": ["mobile phones", "mobile phone", "cell phones", "cell phone", "smartphones", "smartphone",
+                      "phones", "phone", "mobiles", "mobile"],
+}
+
+SORT_PHRASES = {
+    "price_asc": ["cheapest", "lowest price", "lowest prices", "least expensive", "most affordable", "cheaper",
+                  "cheap", "affordable", "budget"],
+    "price_desc": ["most expensive", "highest price", "priciest", "premium", "luxury"],
+    "rating_desc": ["top rated", "top-rated", "best rated", "best-rated", "highest rated", "best rating",
+                    "best ratings", "best reviews", "good reviews", "good ratings", "highly rated",
+                    "most popular", "popular", "best"],
+    "discount_desc": ["biggest discount", "biggest discounts", "discounts", "discount", "discounted",
+                      "on sale", "sale", "deals", "deal", "promotions", "promotion", "promo"],
+}
+
+# Price sorts also filter out NULL prices, so both directions can walk the plain price index
+ORDER_BY = {
+    "price_asc": "price ASC",
+    "price_desc": "price DESC",
+    "rating_desc": "avg_rating DESC NULLS LAST, total_ratings DESC NULLS LAST",
+    "discount_desc": "discount DESC NULLS LAST",
+}
+
+IN_STOCK_PHRASES = ["in stock", "in-stock", "available", "availability"]
+
+# Words that carry no slot information in a shopping question
+STOPWORDS = set("""
+a an the and or of for to in on with from at by is are am be do does did can could would will should
+i me my we you your yours our us it's im i'm please pls any some all every each there here
+what which who where when how much many show list find get give see tell send check search look looking
+want need buy order sell sells selling have has got carry offer recommend suggest browse compare
+price prices priced cost costs product products item items stuff thing things one ones link links today
+now currently right some other options option anything something good nice new store shop if that this
+""".split())
+
+# Follow-up questions depend on the previous results; leave them to the history-aware LLM
+ANAPHORA = re.compile(r"\b(those|these|them|they|that one|this one|the first|the second|previous|previously|above|same|it)\b")
+
+NUMBER = r"(\d[\d,]*(?:\.\d+)?)\s*(k)?\s*(?:baht|thb|฿)?"
+PRICE_RANGE = re.compile(rf"(?:between|from)\s+{NUMBER}\s*(?:and|to|-)\s*{NUMBER}|{NUMBER}\s*-\s*{NUMBER}")
+PRICE_MAX = re.compile(rf"(?:under|below|less than|cheaper than|lower than|max|maximum|at most|up to|within|no more than)\s+{NUMBER}")
+PRICE_MIN = re.compile(rf"(?:over|above|more than|at least|min|minimum|starting at|higher than)\s+{NUMBER}")
+RATING = re.compile(r"(\d(?:\.\d)?)\s*\+?\s*(?:-\s*)?stars?(?:\s+(?:ratings?|reviews?|and up|or more|& up|plus))?")
+WORD = re.compile(r"[\w&'-]+")
+
+
+def _phrase_pattern(phrases) -> re.Pattern:
+    ordered = sorted(phrases, key=len, reverse=True)
+    return re.compile(r"(?<![\w-])(" + "|".join(re.escape(p) for p in ordered) + r")(?![\w-])")
+
+
+CATEGORY_PATTERN = _phrase_pattern(p for words in CATEGORY_SYNONYMS.values() for p in words)
+CATEGORY_BY_WORD = {p: category for category, words in CATEGORY_SYNONYMS.items() for p in words}
+SORT_PATTERN = _phrase_pattern(p for phrases in SORT_PHRASES.values() for p in phrases)
+SORT_BY_PHRASE = {p: sort for sort, phrases in SORT_PHRASES.items() for p in phrases}
+IN_STOCK_PATTERN = _phrase_pattern(IN_STOCK_PHRASES)
+
+
+@dataclass
+class ProductQuery:
+    category: str | None = None
+    brand: str | None = None
+    min_price: float | None = None
+    max_price: float | None = None
+    min_rating: float | None = None
+    sort: str | None = None
+    in_stock: bool = False
+    discounted: bool = False
+    confidence: float = 0.0
+    unexplained: list[str] = field(default_factory=list)
+
+
+def _amount(number: str, thousands: str | None) -> float:
+    value = float(number.replace(",", ""))
+    return value * 1000 if thousands else value
+
+
+def _consume(pattern: re.Pattern, question: str):
+    """Matches of ``pattern`` and the question with them blanked out."""
+    matches = list(pattern.finditer(question))
+    return matches, pattern.sub(" ", question)
+
+
+def extract_product_query(question: str, brand_pattern: re.Pattern | None) -> ProductQuery:
+    q = question.lower().replace("’", "'")
+    slots = ProductQuery()
+    if ANAPHORA.search(q):
+        slots.unexplained = ["<follow-up>"]
+        return slots
+
+    matches, q = _consume(PRICE_RANGE, q)
+    for m in matches:
+        low, low_k, high, high_k = m.groups()[:4] if m.group(1) else m.groups()[4:]
+        slots.min_price, slots.max_price = _amount(low, low_k), _amount(high, high_k)
+    matches, q = _consume(PRICE_MAX, q)
+    for m in matches:
+        slots.max_price = _amount(*m.groups())
+    matches, q = _consume(PRICE_MIN, q)
+    for m in matches:
+        slots.min_price = _amount(*m.groups())
+    matches, q = _consume(RATING, q)
+    for m in matches:
+        stars = float(m.group(1))
+        # "5 star" products rarely average exactly 5.0
+        slots.min_rating = min(stars, 4.5)
+
+    # Brands before sort/category words, so multi-word brands ("Amazon Essentials") win
+    if brand_pattern is not None:
+        matches, q = _consume(brand_pattern, q)
+        if matches:
+            slots.brand = matches[0].group(1)
+    matches, q = _consume(CATEGORY_PATTERN, q)
+    categories = {CATEGORY_BY_WORD[m.group(1)] for m in matches}
+    if len(categories) > 1:
+        slots.unexplained = ["<several categories>"]
+        return slots
+    slots.category = next(iter(categories), None)
+    matches, q = _consume(SORT_PATTERN, q)
+    sorts = {SORT_BY_PHRASE[m.group(1)] for m in matches}
+    if len(sorts) > 1:
+        slots.unexplained = ["<several sort orders>"]
+        return slots
+    slots.sort = next(iter(sorts), None)
+    slots.discounted = slots.sort == "discount_desc"
+    matches, q = _consume(IN_STOCK_PATTERN, q)
+    slots.in_stock = bool(matches)
+
+    slots.unexplained = [w for w in WORD.findall(q) if w not in STOPWORDS]
+    explained = sum(x is not None for x in (slots.category, slots.brand, slots.min_price, slots.max_price,
+                                             slots.min_rating, slots.sort)) + slots.in_stock
+    if slots.category is None and slots.brand is None:
+        # Nothing to filter on: let the LLM decide what was meant
+        return slots
+    slots.confidence = explained / (explained + len(slots.unexplained))
+    return slots
+
+
+def product_filters(slots: ProductQuery, brand_names: dict[str, str]) -> tuple[list[str], dict]:
+    """``(conditions, params)`` of the WHERE clause that ``slots`` select."""
+    where, params = [], {}
+    if slots.category:
+        where.append("category = :category")
+        params["category"] = slots.category
+    if slots.brand:
+        where.append("brand = :brand")
+        params["brand"] = brand_names[slots.brand]
+    if slots.min_price is not None:
+        where.append("price >= :min_price")
+        params["min_price"] = slots.min_price
+    if slots.max_price is not None:
+        where.append("price <= :max_price")
+        params["max_price"] = slots.max_price
+    if slots.min_rating is not None:
+        where.append("avg_rating >= :min_rating")
+        params["min_rating"] = slots.min_rating
+    if slots.discounted:
+        where.append("discount > 0")
+    if slots.in_stock:
+        where.append("(availability ILIKE '%in stock%' OR availability ILIKE 'available%') "
+                     "AND availability NOT ILIKE '%out of stock%'")
+    if slots.sort in ("price_asc", "price_desc"):
+        where.append("price IS NOT NULL")
+    return where, params
+
+
+def build_product_sql(slots: ProductQuery, brand_names: dict[str, str], limit: int = 10):
+    """Parameterized SELECT for ``slots``; returns ``(sql, params)``."""
+    where, params = product_filters(slots, brand_names)
+    sql = "SELECT title, price, avg_rating, product_link, discount FROM public.amazon_product_data"
+    if where:
+        sql += " WHERE " + " AND ".join(where)
+    sql += f" ORDER BY {ORDER_BY.get(slots.sort, 'total_ratings DESC NULLS LAST')} LIMIT :limit"
+    params["limit"] = limit
+    return sql, params
+
+
+class BrandVocabulary:
+    """Distinct catalog brands as one compiled matcher, refreshed every ``ttl_seconds``."""
+
+    def __init__(self, ttl_seconds: float):
+        self._cache = TTLCache(maxsize=1, ttl_seconds=ttl_seconds)
+
+    @staticmethod
+    def compile(brands) -> tuple[re.Pattern | None, dict[str, str]]:
+        # Lowercased brand -> catalog spelling; very short names ("BLU", "TCL") still need whole-word matches
+        names = {b.strip().lower(): b for b in brands if b and b.strip()}
+        return (_phrase_pattern(names) if names else None), names
+
+    async def get(self, db):
+        vocabulary = self._cache.get("brands")
+        if vocabulary is MISSING:
+            result = await db.execute(text(
+                "SELECT DISTINCT brand FROM public.amazon_product_data WHERE brand IS NOT NULL"
+            ))
+            vocabulary = self.compile(row[0] for row in result.fetchall())
+            self._cache.set("brands", vocabulary)
+        return vocabulary
+
+
+class FastPathStats:
+    """Fast-path hit rate and the LLM SQL-generation time it avoided."""
+
+    def __init__(self):
+        self.hits = 0
+        self.misses = 0
+        self.extract_ms_total = 0.0
+        self.llm_calls = 0
+        self.llm_ms_total = 0.0
+
+    def record_hit(self, extract_ms: float):
+        self.hits += 1
+        self.extract_ms_total += extract_ms
+
+    def record_miss(self, extract_ms: float, llm_ms: float | None):
+        """``llm_ms`` is ``None`` when the rows came without an LLM call (plan cache or product search)."""
+        self.misses += 1
+        self.extract_ms_total += extract_ms
+        if llm_ms is not None:
+            self.llm_calls += 1
+            self.llm_ms_total += llm_ms
+
+    def stats(self) -> dict:
+        total = self.hits + self.misses
+        avg_llm_ms = self.llm_ms_total / self.llm_calls if self.llm_calls else 0.0
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / total, 4) if total else 0.0,
+            "avg_extract_ms": round(self.extract_ms_total / total, 3) if total else 0.0,
+            "avg_llm_sql_ms": round(avg_llm_ms, 1),
+            # Each hit skips one LLM SQL generation; estimated with the observed average
+            "estimated_ms_saved": round(self.hits * avg_llm_ms, 1),
+        }
+
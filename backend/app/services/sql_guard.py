@@ -0,0 +1,92 @@
+"""Checks every product query must pass before it reaches the database.
+
+LLM-written SQL is untrusted input: ``guard_sql`` accepts a single read-only
+SELECT (or WITH ... SELECT) that only calls the functions in
+``ALLOWED_FUNCTIONS``, and caps how many rows it can return. The statement
+timeout is applied per transaction by ``SQLQueryService``; an allow-list
+keeps a query from calling ``set_config`` to lift it for the pooled session,
+or any other settings or admin function.
+"""
+import re
+
+# A single-quoted literal (kept as is) or a comment (dropped), scanned left to right
+LITERAL_OR_COMMENT = re.compile(r"('(?:[^']|'')*')|--[^\n]*|/\*.*?\*/", re.DOTALL)
+LITERAL = re.compile(r"'(?:[^']|'')*'")
+FENCE = re.compile(r"^```(?:sql)?\s*|\s*```$", re.IGNORECASE)
+SELECT = re.compile(r"^\s*\(?\s*(select|with)\b", re.IGNORECASE)
+FORBIDDEN = re.compile(
+    r"\b(insert|update|delete|merge|drop|alter|create|truncate|grant|revoke|copy|call|do|execute|prepare|"
+    r"vacuum|analyze|cluster|reindex|refresh|lock|listen|notify|set|reset|discard|into|"
+    r"set_config|current_setting|pg_\w+|information_schema|lo_\w+|dblink\w*)\b",
+    re.IGNORECASE,
+)
+# A name (bare or double-quoted) followed by "(": a function call, a keyword, a type modifier or a column list
+CALL = re.compile(r'(?:\b(\w+)|"((?:[^"]|"")*)")\s*\(')
+# Names a query defines with a column list: "AS alias(a, b)" and "WITH cte(a, b) AS (...)"
+DEFINED = re.compile(
+    r"\bas\s+(\w+)\s*\(|(?:\bwith(?:\s+recursive)?|,)\s*(\w+)\s*\([^()]*\)\s*as\s*(?:not\s+)?(?:materialized\s+)?\(",
+    re.IGNORECASE,
+)
+ALLOWED_FUNCTIONS = frozenset("""
+    count sum avg min max stddev variance bool_and bool_or string_agg array_agg percentile_cont percentile_disc mode
+    row_number rank dense_rank percent_rank cume_dist ntile lag lead first_value last_value nth_value
+    coalesce nullif greatest least cast abs ceil ceiling floor round trunc sign sqrt power ln log exp mod
+    lower upper initcap length char_length character_length substring substr trim btrim ltrim rtrim replace
+    concat concat_ws position strpos left right split_part lpad rpad reverse regexp_replace regexp_match
+    regexp_matches to_char to_number to_date to_timestamp date_trunc date_part extract now age make_date unnest
+    to_tsvector to_tsquery plainto_tsquery phraseto_tsquery websearch_to_tsquery ts_rank ts_rank_cd setweight
+    similarity word_similarity strict_word_similarity
+""".split())
+# Keywords and type names that may precede "(" in a plain SELECT
+SYNTAX = frozenset("""
+    select from where and or not in any all some exists as on using join lateral over filter within values
+    when then else case is like ilike similar between by having limit offset union intersect except distinct
+    with recursive materialized row array rows range escape
+    numeric decimal varchar char character varying float timestamp time interval bit
+""".split())
+# A query whose select list is only "*" or "alias.*"
+STAR = re.compile(r"^\s*select\s+(?:\w+\.)?\*\s+from\b", re.IGNORECASE)
+TRAILING_LIMIT = re.compile(r"\blimit\s+(\d+|:\w+)(?:\s+offset\s+(?:\d+|:\w+))?\s*$", re.IGNORECASE)
+
+
+class UnsafeQueryError(ValueError):
+    """The query is not a single read-only SELECT."""
+
+
+def guard_sql(sql: str, params: dict | None, max_rows: int, columns: tuple[str, ...] = ()) -> str:
+    """Return ``sql`` as a statement safe to execute, or raise ``UnsafeQueryError``.
+
+    Markdown fences and comments are removed. A query without a trailing
+    ``LIMIT`` of at most ``max_rows`` is wrapped in one. With ``columns``, a
+    ``SELECT *`` query is wrapped to return only those, so the database never
+    sends the other columns (``search_tsv``, descriptions, ...).
+    """
+    statement = FENCE.sub("", sql.strip())
+    statement = LITERAL_OR_COMMENT.sub(lambda m: m.group(1) or " ", statement).strip().rstrip(";").strip()
+    code = LITERAL.sub("''", statement)  # the query with string contents blanked out
+    if not SELECT.match(code):
+        raise UnsafeQueryError("only SELECT queries are allowed")
+    if ";" in code:
+        raise UnsafeQueryError("multiple statements")
+    if "'" in code.replace("''", "") or "$" in code:
+        raise UnsafeQueryError("unterminated or dollar-quoted string")
+    forbidden = FORBIDDEN.search(code)
+    if forbidden:
+        raise UnsafeQueryError(f"{forbidden.group(1).upper()} is not allowed")
+    # Only where it is defined: a CTE named after a function must not let the function itself through
+    definitions = {match.start(g) for match in DEFINED.finditer(code) for g in (1, 2) if match.group(g)}
+    for call in CALL.finditer(code):
+        # A quoted name is case-sensitive: only its exact lowercase spelling is the allowed function
+        name = call.group(1).lower() if call.group(1) is not None else call.group(2)
+        if name not in ALLOWED_FUNCTIONS and name not in SYNTAX and call.start() not in definitions:
+            raise UnsafeQueryError(f"function {name}() is not allowed")
+
+    if columns and STAR.match(code):
+        return f"SELECT {', '.join(columns)} FROM ({statement}) AS guarded LIMIT {max_rows}"
+    limit = TRAILING_LIMIT.search(code)
+    if limit:
+        value = limit.group(1)
+        value = (params or {}).get(value[1:]) if value.startswith(":") else int(value)
+        if isinstance(value, int) and 0 <= value <= max_rows:
+            return statement
+    return f"SELECT * FROM ({statement}) AS guarded LIMIT {max_rows}"
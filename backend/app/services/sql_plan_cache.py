@@ -0,0 +1,179 @@
+"""Reuse LLM-generated SQL for questions already answered with different wording.
+
+Entries are keyed by the embedding of the normalized question with its
+numbers masked, plus a fingerprint of the history the SQL depended on.
+Numbers from the question become bind parameters (``under 500 baht`` and
+``under 1,000 baht`` share one plan), and a hit is re-validated against the
+new question before it is used. Every entry belongs to one schema/prompt
+fingerprint; when ``amazon_data_model.py`` or the SQL prompt changes, the
+cache is cleared.
+"""
+import hashlib
+import re
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+
+import numpy as np
+
+from app.core.logging import log_event
+from app.models.amazon_data_model import amazonProductSchema
+from app.services.normalize import normalize_query
+from app.services.sql_fast_path import ANAPHORA
+
+NUMBER = re.compile(r"(?<![\w.])\d[\d,]*(?:\.\d+)?(?![\w.])")
+LITERAL_WORD = re.compile(r"[^\W\d_]{3,}")
+SELECT = re.compile(r"^\s*(select|with)\b", re.IGNORECASE)
+
+
+def schema_fingerprint(sql_prompt: str) -> str:
+    """Hash of the product table's columns and the SQL prompt: the inputs a plan is valid for."""
+    columns = [(c.name, str(c.type)) for c in amazonProductSchema.__table__.columns]
+    return hashlib.sha256(repr((columns, sql_prompt)).encode()).hexdigest()[:16]
+
+
+def history_fingerprint(question: str, history: list) -> str:
+    """Only follow-ups ("which of those...") depend on the history; other plans are shared."""
+    if not ANAPHORA.search(question.lower()) or not history:
+        return ""
+    return hashlib.sha256("\n".join(str(m.content) for m in history).encode()).hexdigest()[:16]
+
+
+def _numbers(question: str) -> list[float]:
+    return [float(n.replace(",", "")) for n in NUMBER.findall(question)]
+
+
+def _masked(question: str) -> str:
+    return NUMBER.sub("0", normalize_query(question))
+
+
+def _format_number(value: float) -> str:
+    return str(int(value)) if value == int(value) else str(value)
+
+
+def parameterize(sql: str, question: str) -> tuple[str, int] | None:
+    """Replace numeric literals that came from the question with ``:pN`` binds.
+
+    Returns the template and how many numbers the question had, or ``None``
+    if the SQL is not a single SELECT.
+    """
+    statement = sql.strip().rstrip(";")
+    if not SELECT.match(statement) or ";" in statement:
+        return None
+    distinct = list(dict.fromkeys(map(_format_number, _numbers(question))))
+    numbers = {value: i for i, value in enumerate(distinct)}
+    # Even-indexed parts are outside single-quoted string literals
+    parts = statement.split("'")
+    for i in range(0, len(parts), 2):
+        parts[i] = NUMBER.sub(
+            lambda m: f":p{numbers[m.group(0)]}" if m.group(0) in numbers else m.group(0), parts[i]
+        )
+    return "'".join(parts), len(numbers)
+
+
+@dataclass
+class SqlPlan:
+    template: str
+    question: str
+    history_key: str
+    n_numbers: int
+    similarity: float = 1.0
+
+    def bind(self, question: str) -> tuple[str, dict] | None:
+        """``(sql, params)`` for ``question``, or ``None`` if the plan does not fit it."""
+        distinct = list(dict.fromkeys(map(_format_number, _numbers(question))))
+        if len(distinct) != self.n_numbers:
+            return None
+        # Words of string literals that came from the original question ('%nike%') must be in the new one
+        asked, original = set(LITERAL_WORD.findall(question.lower())), set(LITERAL_WORD.findall(self.question.lower()))
+        for literal in self.template.split("'")[1::2]:
+            for word in LITERAL_WORD.findall(literal.lower()):
+                if word in original and word not in asked:
+                    return None
+        # Integral numbers stay ints: they may bind to LIMIT or integer columns
+        return self.template, {f"p{i}": float(v) if "." in v else int(v) for i, v in enumerate(distinct)}
+
+
+class SqlPlanCache:
+    """Fixed-capacity LRU of SQL plans searched by question embedding."""
+
+    def __init__(self, encode, *, capacity: int, threshold: float):
+        self._encode = encode
+        self.capacity = capacity
+        self.threshold = threshold
+        self._fingerprint: str | None = None
+        self._matrix: np.ndarray | None = None
+        self._entries: OrderedDict[int, SqlPlan] = OrderedDict()  # slot -> plan, LRU order
+        self._history_keys = np.empty(capacity, dtype=object)
+        self._free = list(range(capacity - 1, -1, -1))
+        self.counters = {"hits": 0, "misses": 0, "rejected": 0, "stores": 0, "invalidations": 0, "lookup_ms_total": 0.0}
+
+    def invalidate(self, reason: str):
+        self._entries.clear()
+        self._history_keys[:] = None
+        self._free = list(range(self.capacity - 1, -1, -1))
+        self.counters["invalidations"] += 1
+        log_event("sql_plan_cache.invalidate", reason=reason)
+
+    def _check_fingerprint(self, fingerprint: str):
+        if fingerprint != self._fingerprint:
+            if self._fingerprint is not None:
+                self.invalidate(reason="schema")
+            self._fingerprint = fingerprint
+
+    async def lookup(self, question: str, history: list, fingerprint: str):
+        """Return ``(bound, vector)``: ``(sql, params)`` on a hit, and the query vector for ``store``."""
+        t0 = time.perf_counter()
+        self._check_fingerprint(fingerprint)
+        vector = (await self._encode([_masked(question)]))[0]
+        bound, plan = None, None
+        if self._entries:
+            history_key = history_fingerprint(question, history)
+            scores = self._matrix @ vector
+            scores[self._history_keys != history_key] = -np.inf
+            slot = int(np.argmax(scores))
+            if scores[slot] >= self.threshold:
+                plan = self._entries[slot]
+                bound = plan.bind(question)
+                if bound is None:
+                    self.counters["rejected"] += 1
+                else:
+                    self._entries.move_to_end(slot)
+                    plan.similarity = float(scores[slot])
+        self.counters["hits" if bound else "misses"] += 1
+        self.counters["lookup_ms_total"] += (time.perf_counter() - t0) * 1000
+        log_event(
+            "sql_plan_cache.hit" if bound else "sql_plan_cache.miss",
+            similarity=round(plan.similarity, 4) if bound else None,
+            ms=round((time.perf_counter() - t0) * 1000, 1),
+        )
+        return bound, vector
+
+    def store(self, question: str, history: list, vector: np.ndarray, sql: str):
+        """Cache ``sql`` (already executed successfully) as a plan for ``question``."""
+        parameterized = parameterize(sql, question)
+        if parameterized is None:
+            return
+        template, n_numbers = parameterized
+        if self._matrix is None:
+            self._matrix = np.zeros((self.capacity, vector.shape[0]), dtype=np.float32)
+        if not self._free:
+            oldest = next(iter(self._entries))
+            del self._entries[oldest]
+            self._history_keys[oldest] = None
+            self._free.append(oldest)
+        slot = self._free.pop()
+        history_key = history_fingerprint(question, history)
+        self._matrix[slot] = vector
+        self._history_keys[slot] = history_key
+        self._entries[slot] = SqlPlan(template, question, history_key, n_numbers)
+        self.counters["stores"] += 1
+
+    def stats(self) -> dict:
+        lookups = self.counters["hits"] + self.counters["misses"]
+        return {
+            **self.counters,
+            "hit_ratio": round(self.counters["hits"] / lookups, 4) if lookups else 0.0,
+            "avg_lookup_ms": round(self.counters["lookup_ms_total"] / lookups, 2) if lookups else 0.0,
+            "entries": len(self._entries),
+        }
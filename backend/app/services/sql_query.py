@@ -1,21 +1,50 @@
-from app.core.config import groq_config
+from app.core.config import sql_config
+from app.core.logging import log_event
+from app.core.cache import MISSING
+from app.core.metrics import REGISTRY, annotate, cache_result, span
 
-from langchain_groq import ChatGroq
 from sqlalchemy import text
-from sqlalchemy.orm import Session
-import pandas as pd
+from sqlalchemy.ext.asyncio import AsyncSession
 from langchain_core.messages import SystemMessage, HumanMessage
+from app.services.streaming import ANSWER_TAG
+from app.services.llm_gateway import llm_gateway
+from app.services.sql_fast_path import ANAPHORA, BrandVocabulary, FastPathStats, build_product_sql, extract_product_query
+from app.services.sql_plan_cache import SqlPlanCache, schema_fingerprint
+from app.services.sql_result_cache import SqlResultCache
+from app.services.product_engine import product_engine
+from app.services.product_search import product_search
+from app.services.sql_guard import UnsafeQueryError, guard_sql
+from app.services.result_encoding import count_text_tokens, encode_rows
+from app.services.router_search import aencode_queries
+import time
+
+# Columns the comprehension prompt formats; anything else the SQL selected is dropped
+RESULT_COLUMNS = ("title", "price", "avg_rating", "product_link", "discount")
+
+# Shared across requests: the catalog brand matcher, the fast-path counters, the SQL plan and result caches
+BRANDS = BrandVocabulary(ttl_seconds=sql_config.SQL_BRANDS_TTL_SECONDS)
+FAST_PATH_STATS = FastPathStats()
+SQL_PLAN_CACHE = SqlPlanCache(
+    aencode_queries,
+    capacity=sql_config.SQL_PLAN_CACHE_CAPACITY,
+    threshold=sql_config.SQL_PLAN_CACHE_THRESHOLD,
+) if sql_config.SQL_PLAN_CACHE_ENABLED else None
+SQL_RESULT_CACHE = SqlResultCache(
+    capacity=sql_config.SQL_RESULT_CACHE_CAPACITY,
+    max_bytes=sql_config.SQL_RESULT_CACHE_MAX_BYTES,
+    ttl_seconds=sql_config.SQL_RESULT_CACHE_TTL_SECONDS,
+    version_check_seconds=sql_config.SQL_RESULT_CACHE_VERSION_CHECK_SECONDS,
+) if sql_config.SQL_RESULT_CACHE_ENABLED else None
+if SQL_RESULT_CACHE is not None:
+    REGISTRY.collector(SQL_RESULT_CACHE.collect)
 
 
 class SQLQueryService:
-    def __init__(self, db: Session):
+    def __init__(self, db: AsyncSession):
         self._db = db
-        self._client_groq = ChatGroq(
-            api_key=groq_config.GROQ_API_KEY,
-            model="openai/gpt-oss-20b",
-            temperature=0.2,
-            model_kwargs={"stream": False}
-        )
+        # One pooled client; separate purposes keep SQL and summary latencies (and hedge delays) apart
+        self._client_groq = llm_gateway.chat("groq", "openai/gpt-oss-20b", purpose="sql", temperature=0.2)
+        self._summary_groq = llm_gateway.chat("groq", "openai/gpt-oss-20b", purpose="product_answer", temperature=0.2)
         
         # PROMPT 1: SQL Generation (Context-Aware)
         self.sql_prompt = """
@@ -55,7 +84,7 @@ class SQLQueryService:
             Prices range from roughly 3,000 to 6,500 THB depending on the model. Would you like to narrow it down by budget?"
         """
 
-    def generate_sql_query(self, user_question: str, history: list = []):
+    async def generate_sql_query(self, user_question: str, history: list = []):
         """Generates a PostgreSQL query based on user input and conversation history."""
         messages = [SystemMessage(content=self.sql_prompt)]
         
@@ -63,56 +92,197 @@ class SQLQueryService:
         messages.extend(history) 
         messages.append(HumanMessage(content=user_question))
         
-        response = self._client_groq.invoke(messages)
+        with span("sql.generate"):
+            response = await self._client_groq.ainvoke(messages)
         return response.content.strip()
 
-    def run_sql_query(self, sql_query: str):
-        """Executes the generated SQL query and returns a Pandas DataFrame."""
+    async def fast_path_query(self, user_question: str):
+        """``(slots, brand_names)`` of a templated question, or ``None`` to use the LLM.
+
+        Also returns the extraction time in ms.
+        """
+        t0 = time.perf_counter()
+        if not sql_config.SQL_FAST_PATH_ENABLED:
+            return None, 0.0
+        brand_pattern, brand_names = await BRANDS.get(self._db)
+        slots = extract_product_query(user_question, brand_pattern)
+        extract_ms = (time.perf_counter() - t0) * 1000
+        if slots.confidence < sql_config.SQL_FAST_PATH_MIN_CONFIDENCE:
+            log_event("sql.fast_path.miss", confidence=round(slots.confidence, 2), unexplained=slots.unexplained[:5])
+            return None, extract_ms
+        log_event("sql.fast_path.hit", category=slots.category, brand=slots.brand, sort=slots.sort,
+                  extract_ms=round(extract_ms, 2))
+        return (slots, brand_names), extract_ms
+
+    def product_engine_rows(self, slots, brand_names) -> list[dict] | None:
+        """Rows of a fast-path query from the in-memory catalog, or ``None`` to query Postgres."""
+        if product_engine is None:
+            return None
+        with span("sql.product_engine"):
+            rows = product_engine.query(slots, brand_names)
+        cache_result("product_engine", rows is not None)
+        return rows
+
+    async def product_search_rows(self, user_question: str) -> list[dict] | None:
+        """Rows of the hybrid title search, or ``None`` to generate SQL (disabled, no index, follow-up, no match)."""
+        if product_search is None or ANAPHORA.search(user_question.lower()):
+            return None
+        brand_pattern, brand_names = await BRANDS.get(self._db)
+        slots = extract_product_query(user_question, brand_pattern)
+        try:
+            with span("sql.product_search"):
+                rows = await product_search.search(self._db, user_question, slots, brand_names)
+        except Exception as e:
+            log_event("product_search.error", error=str(e))
+            rows = None
+        cache_result("product_search", rows is not None)
+        return rows
+
+    async def cached_sql_plan(self, user_question: str, history: list):
+        """``((sql, params), vector)`` from the plan cache; the plan is ``None`` on a miss."""
+        if SQL_PLAN_CACHE is None:
+            return None, None
+        try:
+            return await SQL_PLAN_CACHE.lookup(user_question, history, schema_fingerprint(self.sql_prompt))
+        except Exception as e:
+            log_event("sql_plan_cache.error", error=str(e))
+            return None, None
+
+    async def run_sql_query(self, sql_query: str, params: dict | None = None) -> list[dict]:
+        """Executes the SQL query and returns the first rows the summary needs, as dicts.
+
+        Rows are streamed from a server-side cursor and the cursor is closed
+        after ``SQL_RESULT_ROWS``, so a broad query never loads more than that.
+        Identical queries are answered from ``SQL_RESULT_CACHE`` until the
+        catalog version moves.
+        """
         try:
-            result = self._db.execute(text(sql_query))
-            data = result.fetchall()
-            return pd.DataFrame(data, columns=result.keys())
+            # Read-only, row-capped and time-boxed, whoever wrote the SQL
+            statement = guard_sql(sql_query, params, sql_config.SQL_MAX_ROWS, RESULT_COLUMNS)
+            key, version = None, None
+            if SQL_RESULT_CACHE is not None:
+                key = SQL_RESULT_CACHE.key(statement, params)
+                version = await SQL_RESULT_CACHE.check_version(self._db)
+                cached = SQL_RESULT_CACHE.get(key)
+                cache_result("sql_result", cached is not MISSING)
+                if cached is not MISSING:
+                    return cached
+            t0 = time.perf_counter()
+            await self._db.execute(
+                text("SELECT set_config('statement_timeout', :timeout, true)"),
+                {"timeout": str(sql_config.SQL_STATEMENT_TIMEOUT_MS)},
+            )
+            limit = sql_config.SQL_RESULT_ROWS
+            with span("sql.execute"):
+                result = await self._db.stream(text(statement).execution_options(yield_per=limit), params or {})
+                try:
+                    keys = list(result.keys())
+                    # guard_sql already projected a SELECT *; this drops extras an explicit select list added
+                    columns = [k for k in keys if k in RESULT_COLUMNS] or keys
+                    positions = [keys.index(c) for c in columns]
+                    rows = [tuple(row[i] for i in positions) for row in await result.fetchmany(limit)]
+                finally:
+                    await result.close()
+            if key is not None:
+                SQL_RESULT_CACHE.set(key, columns, rows, (time.perf_counter() - t0) * 1000, version)
+            return [dict(zip(columns, row)) for row in rows]
+        except UnsafeQueryError as e:
+            log_event("sql.guard.rejected", reason=str(e), sql=sql_query[:200])
+            return []
         except Exception as e:
-            print(f"SQL Execution Error: {e}")
-            return pd.DataFrame()
+            log_event("sql.error", error=str(e), sql=sql_query[:200])
+            annotate(sql_error=type(e).__name__)
+            return []
 
-    def data_comprehension(self, user_question: str, data: pd.DataFrame, history: list = []):
+    async def data_comprehension(self, user_question: str, rows: list[dict], history: list = []):
         """Converts raw database rows into a natural language response."""
-        data_list = data.to_dict(orient='records')[:10] # Limit to top 10 for context window
-        
+        # As many rows as fit the token budget, as a compact table instead of per-row dicts
+        encoded = encode_rows(rows, sql_config.SQL_RESULT_TOKEN_BUDGET)
+        repr_tokens = count_text_tokens(str(rows[:encoded.rows]))
+        log_event("sql.result_encoding", rows_fetched=len(rows), rows_included=encoded.rows, tokens=encoded.tokens,
+                  repr_tokens=repr_tokens, tokens_saved=repr_tokens - encoded.tokens)
+
         messages = [SystemMessage(content=self.comprehension_prompt)]
         messages.extend(history) # Let the assistant remember what it said before
         
-        context_query = f"User Question: {user_question}\nDatabase Results: {data_list}"
+        context_query = (f"User Question: {user_question}\n"
+                         f"Database Results (one row per line, columns separated by |):\n{encoded.text}")
         messages.append(HumanMessage(content=context_query))
         
-        response = self._client_groq.invoke(messages, temperature=0.3)
+        # Only the summary is streamed to the user; the SQL generation call stays untagged
+        with span("sql.summarize"):
+            response = await self._summary_groq.ainvoke(messages, config={"tags": [ANSWER_TAG]}, temperature=0.3)
         return response.content
 
-    def sql_chain(self, user_question: str, history: list = []):
-        """Main entry point: Question -> SQL -> Data -> Answer."""
-        # 1. Generate SQL (Looking at history to handle 'those/them')
-        sql_query = self.generate_sql_query(user_question, history)
+    async def fetch_rows(self, user_question: str, history: list = []) -> list[dict]:
+        """Question -> SQL -> rows; the part of ``sql_chain`` before the summary."""
+        # 1. Templated questions ("cheapest Casio watches") get rule-based SQL;
+        #    everything else is generated by the LLM (looking at history to handle 'those/them')
+        with span("sql.fast_path"):
+            fast_path, extract_ms = await self.fast_path_query(user_question)
+        cache_result("sql_fast_path", fast_path is not None)
+        plan, vector = None, None
+        if fast_path is not None:
+            FAST_PATH_STATS.record_hit(extract_ms)
+            # Structured queries skip the database once the in-memory catalog is loaded
+            rows = self.product_engine_rows(*fast_path)
+            if rows is not None:
+                return rows
+            sql_query, params = build_product_sql(*fast_path)
+        else:
+            # Free-form product questions ("sneakers for trail running") are searched by meaning first
+            rows = await self.product_search_rows(user_question)
+            if rows is not None:
+                FAST_PATH_STATS.record_miss(extract_ms, None)
+                return rows
+            # Reuse SQL generated earlier for an equivalent question, else ask the LLM
+            with span("sql.plan_cache"):
+                plan, vector = await self.cached_sql_plan(user_question, history)
+            if SQL_PLAN_CACHE is not None:
+                cache_result("sql_plan", plan is not None)
+            if plan is not None:
+                sql_query, params = plan
+                FAST_PATH_STATS.record_miss(extract_ms, None)
+            else:
+                t0 = time.perf_counter()
+                sql_query, params = await self.generate_sql_query(user_question, history), None
+                FAST_PATH_STATS.record_miss(extract_ms, (time.perf_counter() - t0) * 1000)
         
         # 2. Execute SQL
-        result_df = self.run_sql_query(sql_query)
+        rows = await self.run_sql_query(sql_query, params)
+
+        # Only SQL that ran and found rows is worth reusing
+        if plan is None and vector is not None and rows:
+            SQL_PLAN_CACHE.store(user_question, history, vector, sql_query)
+        return rows
+
+    async def sql_chain(self, user_question: str, history: list = [], rows: list[dict] | None = None):
+        """Main entry point: Question -> SQL -> Data -> Answer.
+
+        ``rows`` skips the SQL step when it already ran (speculatively, see
+        ``app.services.speculation``).
+        """
+        if rows is None:
+            rows = await self.fetch_rows(user_question, history)
         
-        if result_df.empty:
+        if not rows:
             return "I'm sorry, I couldn't find any products matching that request right now."
 
         # 3. Formulate Answer (Looking at history to stay consistent)
-        answer = self.data_comprehension(user_question, result_df, history)
+        answer = await self.data_comprehension(user_question, rows, history)
         return answer
 
 
 # if __name__ == "__main__":
-#     with get_db() as db:
-#         test = SQLQueryService(db)
-#         question = "Do you have shirts product in stock?"
-#         sql_query = test.generate_sql_query(question)
-#         print(sql_query)
-#         # sql_query = """SELECT * FROM public.amazon_product_data ORDER BY id ASC"""
-#         res = test.run_sql_query(sql_query)
-#         print(res)
-#         answer = test.data_comprehension(question, res)
-#         print(answer)
+#     async def main():
+#         async with get_async_db() as db:
+#             test = SQLQueryService(db)
+#             question = "Do you have shirts product in stock?"
+#             sql_query = await test.generate_sql_query(question)
+#             print(sql_query)
+#             # sql_query = """SELECT * FROM public.amazon_product_data ORDER BY id ASC"""
+#             res = await test.run_sql_query(sql_query)
+#             print(res)
+#             answer = await test.data_comprehension(question, res)
+#             print(answer)
+#     asyncio.run(main())
@@ -0,0 +1,158 @@
+"""Results of product queries, reused until the catalog changes.
+
+Popular searches ("cheapest mobile phones", "top rated shirts") produce the
+same SQL and parameters over and over. ``run_sql_query`` looks the guarded
+statement up here before it goes to the database:
+
+- the key is the SQL with whitespace and keyword case normalized (string
+  literals and quoted identifiers are kept as written) plus the parameters;
+- a result is stored as a tuple of column names and a tuple of row tuples,
+  not as dicts, and callers get fresh dicts on every hit;
+- entries expire after ``ttl_seconds`` and the least recently used ones are
+  evicted beyond ``capacity`` entries or ``max_bytes`` of estimated size;
+- every entry belongs to one catalog version (bumped by
+  ``app.db.catalog_loader``). The version is re-read at most every
+  ``version_check_seconds``, and when it moved, the whole cache is dropped.
+
+Each worker checks the version itself, so every worker drops its results
+after a load. Edits made outside the loader are picked up after the TTL.
+"""
+import re
+import sys
+import threading
+import time
+from collections import OrderedDict
+
+from app.core.cache import MISSING
+from app.core.logging import log_event
+from app.db.catalog_loader import read_catalog_version
+
+# String literals and quoted identifiers are case- and whitespace-sensitive; the rest of the SQL is not
+QUOTED = re.compile(r"""('(?:[^']|'')*'|"(?:[^"]|"")*")""")
+WHITESPACE = re.compile(r"\s+")
+
+
+def normalize_sql(sql: str) -> str:
+    parts = QUOTED.split(sql.strip().rstrip(";").strip())
+    return "".join(part if i % 2 else WHITESPACE.sub(" ", part).lower() for i, part in enumerate(parts))
+
+
+def result_size(columns: tuple, rows: tuple) -> int:
+    """Estimated bytes held by one cached result (containers and values)."""
+    size = sys.getsizeof(columns) + sys.getsizeof(rows)
+    for row in rows:
+        size += sys.getsizeof(row) + sum(sys.getsizeof(value) for value in row)
+    return size
+
+
+class SqlResultCache:
+    """LRU + TTL cache of query results, bounded by entries and bytes, scoped to one catalog version."""
+
+    def __init__(self, *, capacity: int, max_bytes: int, ttl_seconds: float, version_check_seconds: float):
+        self.capacity = capacity
+        self.max_bytes = max_bytes
+        self.ttl_seconds = ttl_seconds
+        self.version_check_seconds = version_check_seconds
+        # key -> (expires_at, columns, rows, size, db_ms)
+        self._data: OrderedDict = OrderedDict()
+        self._lock = threading.Lock()
+        self.bytes = 0
+        self.version: int | None = None
+        self._checked_at = 0.0
+        self.counters = {"hits": 0, "misses": 0, "stores": 0, "expired": 0, "evictions": 0, "too_large": 0,
+                         "invalidations": 0, "version_errors": 0}
+        self.db_ms_saved = 0.0
+
+    @staticmethod
+    def key(sql: str, params: dict | None) -> tuple:
+        return normalize_sql(sql), repr(sorted((params or {}).items()))
+
+    async def check_version(self, db) -> int | None:
+        """Re-read the catalog version when due and drop every result if it moved; returns the current version."""
+        if time.monotonic() - self._checked_at < self.version_check_seconds:
+            return self.version
+        self._checked_at = time.monotonic()
+        try:
+            version = await read_catalog_version(db)
+        except Exception as e:
+            # Without a version, keep serving within the TTL rather than failing the query
+            self.counters["version_errors"] += 1
+            log_event("sql_result_cache.version_error", error=str(e))
+            return self.version
+        if self.version is not None and version != self.version:
+            self.invalidate(f"catalog version {self.version} -> {version}")
+        self.version = version
+        return version
+
+    def get(self, key: tuple):
+        """Rows as fresh dicts, or ``MISSING``."""
+        with self._lock:
+            item = self._data.get(key)
+            if item is not None and item[0] <= time.monotonic():
+                self._drop(key)
+                self.counters["expired"] += 1
+                item = None
+            if item is None:
+                self.counters["misses"] += 1
+                return MISSING
+            self._data.move_to_end(key)
+            self.counters["hits"] += 1
+            self.db_ms_saved += item[4]
+            _, columns, rows = item[:3]
+        return [dict(zip(columns, row)) for row in rows]
+
+    def set(self, key: tuple, columns, rows, db_ms: float, version: int | None):
+        """Store a result read under catalog ``version``; dropped if the version moved meanwhile."""
+        columns, rows = tuple(columns), tuple(tuple(row) for row in rows)
+        size = result_size(columns, rows)
+        with self._lock:
+            if version != self.version:
+                return
+            if size > self.max_bytes // 8:
+                # One huge result would push out many small popular ones
+                self.counters["too_large"] += 1
+                return
+            if key in self._data:
+                self._drop(key)
+            self._data[key] = (time.monotonic() + self.ttl_seconds, columns, rows, size, db_ms)
+            self.bytes += size
+            self.counters["stores"] += 1
+            while len(self._data) > self.capacity or self.bytes > self.max_bytes:
+                self._drop(next(iter(self._data)))
+                self.counters["evictions"] += 1
+
+    def _drop(self, key: tuple):
+        self.bytes -= self._data.pop(key)[3]
+
+    def invalidate(self, reason: str):
+        with self._lock:
+            self._data.clear()
+            self.bytes = 0
+            self.counters["invalidations"] += 1
+        log_event("sql_result_cache.invalidate", reason=reason)
+
+    def __len__(self):
+        return len(self._data)
+
+    def stats(self) -> dict:
+        with self._lock:
+            hits, lookups = self.counters["hits"], self.counters["hits"] + self.counters["misses"]
+            return {
+                **self.counters,
+                "hit_ratio": round(hits / lookups, 4) if lookups else 0.0,
+                "entries": len(self._data),
+                "bytes": self.bytes,
+                "version": self.version,
+                # Each hit skips the query; estimated with the time it took when it was cached
+                "db_ms_saved": round(self.db_ms_saved, 1),
+            }
+
+    def collect(self):
+        """Metric families for ``GET /metrics``."""
+        stats = self.stats()
+        yield ("sql_result_cache_db_ms_saved_total", "counter",
+               "Database time the SQL result cache saved, in ms (query time when cached).",
+               [({}, stats["db_ms_saved"])])
+        yield ("sql_result_cache_bytes", "gauge", "Estimated size of the cached SQL results.",
+               [({}, stats["bytes"])])
+        yield ("sql_result_cache_entries", "gauge", "Cached SQL results.", [({}, stats["entries"])])
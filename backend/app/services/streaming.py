@@ -0,0 +1,13 @@
+import json
+
+# Tag attached to the LLM call whose tokens form the user-visible answer.
+# Other LLM calls inside a node (SQL generation, routing) are not streamed.
+ANSWER_TAG = "answer"
+
+# Nodes that produce the final AI message of a turn
+ANSWER_NODES = ("faq", "product_inquiry", "small_talk", "default")
+
+
+def sse_event(event: str, data: dict) -> str:
+    """Format a single Server-Sent Event frame with a JSON payload."""
+    return f"event: {event}\ndata: {json.dumps(data, ensure_ascii=False)}\n\n"
@@ -0,0 +1,94 @@
+"""Routing throughput: per-query ``check_route`` versus batched ``check_routes``.
+
+Uses the real ``SemanticRouter`` and route definitions. The encoder is a stub
+with a fixed per-call overhead (``--call-ms``) plus a per-text cost
+(``--item-ms``) and bag-of-words vectors, or the real FastEmbed model with
+``--real-encoder``. Also reports how often the batched decision agrees with
+the per-query router.
+
+Usage (from ``backend/``)::
+
+    uv run python -m benchmarks.batch_routing_benchmark --queries 10000
+"""
+import argparse
+import logging
+import os
+import random
+import tempfile
+import time
+import zlib
+
+import numpy as np
+
+# semantic_router imports litellm, which otherwise fetches its model price list over the network
+os.environ.setdefault("LITELLM_LOCAL_MODEL_COST_MAP", "True")
+
+
+def install_stub_encoder(call_ms: float, item_ms: float, dim: int = 384):
+    import semantic_router.encoders as encoders
+    from semantic_router.encoders import DenseEncoder
+
+    class StubEncoder(DenseEncoder):
+        name: str = "stub-bag-of-words"
+
+        def __call__(self, docs):
+            time.sleep((call_ms + item_ms * len(docs)) / 1000)
+            vectors = []
+            for doc in docs:
+                vector = np.zeros(dim, dtype=np.float32)
+                for word in doc.lower().split():
+                    vector += np.random.default_rng(zlib.crc32(word.strip("?.!,").encode())).standard_normal(dim)
+                vectors.append(vector.tolist())
+            return vectors
+
+    encoders.FastEmbedEncoder = StubEncoder
+
+
+def logged_questions(router, n: int, seed: int = 0):
+    """Route utterances with words dropped and noise appended, like real traffic."""
+    rng = random.Random(seed)
+    utterances = [u for route in router.routes for u in route.utterances]
+    noise = ["please", "today", "thanks", "asap", "hmm", "again", "for my mom", "in bangkok"]
+    questions = []
+    for _ in range(n):
+        words = rng.choice(utterances).split()
+        if len(words) > 3:
+            words.pop(rng.randrange(len(words)))
+        questions.append(" ".join(words + rng.sample(noise, rng.randint(0, 2))))
+    return questions
+
+
+def main(args):
+    if not args.real_encoder:
+        install_stub_encoder(args.call_ms, args.item_ms)
+    from app.core.config import router_config
+    router_config.ROUTER_INDEX_DIR = None
+    from app.services import router_search
+    logging.getLogger("app").setLevel(logging.WARNING)
+    logging.getLogger("semantic_router").setLevel(logging.ERROR)
+
+    router_search._router = router_search.build_router(index_dir=tempfile.mkdtemp())
+    questions = logged_questions(router_search.get_router(), args.queries)
+
+    t0 = time.perf_counter()
+    single = [router_search.check_route(q) for q in questions]
+    single_s = time.perf_counter() - t0
+
+    t0 = time.perf_counter()
+    batched = router_search.check_routes(questions)
+    batched_s = time.perf_counter() - t0
+
+    agreement = sum(a == b for a, b in zip(single, batched)) / len(questions)
+    print(f"{'mode':>22} {'seconds':>10} {'queries/s':>12} {'speedup':>9}")
+    print(f"{'check_route (loop)':>22} {single_s:>10.2f} {len(questions) / single_s:>12.0f} {1:>8.1f}x")
+    print(f"{'check_routes (batch)':>22} {batched_s:>10.2f} {len(questions) / batched_s:>12.0f} {single_s / batched_s:>8.1f}x")
+    print(f"decision agreement: {agreement:.2%} over {len(questions)} queries")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--queries", type=int, default=10_000)
+    parser.add_argument("--call-ms", type=float, default=2.0, help="stub encoder overhead per call")
+    parser.add_argument("--item-ms", type=float, default=0.3, help="stub encoder cost per text")
+    parser.add_argument("--real-encoder", action="store_true", help="use the FastEmbed model (downloads it)")
+    main(parser.parse_args())
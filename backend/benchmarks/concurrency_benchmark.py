@@ -0,0 +1,58 @@
+"""Throughput of the async /api/v1/chat path as in-flight requests grow.
+
+LLM, Chroma, semantic-router and Postgres are replaced by latency stubs, so the
+numbers isolate how well the request path overlaps I/O. With a fully async path
+throughput should scale roughly linearly with concurrency until the stubs'
+latency is saturated.
+
+Usage (from ``backend/``)::
+
+    uv run python -m benchmarks.concurrency_benchmark --requests 200
+"""
+import argparse
+import asyncio
+import contextlib
+import io
+import time
+
+from benchmarks._stubs import install_stub_backends, synthetic_questions
+
+
+async def run_level(chat_bot_route, ChatBotRequest, questions, concurrency: int):
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def one(i: int, question: str):
+        async with semaphore:
+            await chat_bot_route(ChatBotRequest(question=question, thread_id=f"bench-{concurrency}-{i}"))
+
+    t0 = time.perf_counter()
+    await asyncio.gather(*(one(i, q) for i, q in enumerate(questions)))
+    return time.perf_counter() - t0
+
+
+async def main(args):
+    module = install_stub_backends(llm_latency=args.llm_latency, db_latency=args.db_latency)
+    from app.core.startup import warm_up
+    from app.models.chat_bot_model import ChatBotRequest
+
+    # Build every component up front, as the app lifespan does
+    await warm_up()
+
+    questions = synthetic_questions(args.requests)
+    print(f"{'in-flight':>10} {'seconds':>10} {'req/s':>10} {'speedup':>10}")
+    baseline = None
+    for concurrency in args.levels:
+        with contextlib.redirect_stdout(io.StringIO()):
+            elapsed = await run_level(module.chat_bot_route, ChatBotRequest, questions, concurrency)
+        rps = len(questions) / elapsed
+        baseline = baseline or rps
+        print(f"{concurrency:>10} {elapsed:>10.2f} {rps:>10.1f} {rps / baseline:>9.1f}x")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--requests", type=int, default=200)
+    parser.add_argument("--levels", type=int, nargs="+", default=[1, 5, 10, 25, 50])
+    parser.add_argument("--llm-latency", type=float, default=0.2)
+    parser.add_argument("--db-latency", type=float, default=0.02)
+    asyncio.run(main(parser.parse_args()))
@@ -0,0 +1,117 @@
+"""FAQ ingestion: full re-ingestion versus the incremental, content-addressed pipeline.
+
+Writes a synthetic FAQ file of ``--rows`` rows and syncs a ``LocalFaqIndex``
+with it through a stub embedding API that takes ``--call-ms`` per call plus
+``--row-ms`` per row (a remote API: the wait releases the GIL, so concurrent
+calls overlap). Scenarios:
+
+- ``full``: the previous ingestion. Every row is embedded again in one
+  sequential pass whenever the file changes;
+- ``initial``: the pipeline on an empty collection;
+- ``rerun``: the pipeline again, nothing changed;
+- ``edit``: ``--edit-share`` of the rows edited, as many deleted and as many added.
+
+Reports rows/s (rows in the file per second of ingestion), the rows and
+calls sent to the embedding API, and how many of them the pipeline saved
+against a full re-ingestion.
+
+Usage (from ``backend/``)::
+
+    uv run python -m benchmarks.faq_ingest_benchmark --rows 100000 --concurrency 4
+"""
+import argparse
+import logging
+import random
+import tempfile
+import threading
+import time
+
+import numpy as np
+import pandas as pd
+
+from app.db.faq_index import LocalFaqIndex
+from app.services.faq_ingest import ingest, read_faq_rows
+
+logging.getLogger("app").setLevel(logging.WARNING)
+
+
+class StubEmbeddingApi:
+    def __init__(self, call_ms: float, row_ms: float, dim: int = 384):
+        self.call_ms = call_ms
+        self.row_ms = row_ms
+        self.dim = dim
+        self.calls = 0
+        self.rows = 0
+        self._lock = threading.Lock()
+        self._rng = np.random.default_rng(0)
+
+    def __call__(self, texts):
+        with self._lock:
+            self.calls += 1
+            self.rows += len(texts)
+            vectors = self._rng.standard_normal((len(texts), self.dim), dtype=np.float32)
+        time.sleep((self.call_ms + self.row_ms * len(texts)) / 1000)
+        return vectors
+
+
+def write_faq(path: str, faq: list[tuple[str, str]]):
+    pd.DataFrame(faq, columns=["question", "answer"]).to_csv(path, index=False)
+
+
+def edit_faq(faq: list[tuple[str, str]], share: float, seed: int = 0) -> list[tuple[str, str]]:
+    rng = random.Random(seed)
+    n = max(1, int(len(faq) * share))
+    faq = list(faq)
+    for i in rng.sample(range(len(faq)), n):
+        faq[i] = (faq[i][0], faq[i][1] + " (updated)")
+    for i in sorted(rng.sample(range(len(faq)), n), reverse=True):
+        del faq[i]
+    return faq + [(f"new question {i}?", f"new answer {i}.") for i in range(n)]
+
+
+def main(args):
+    directory = tempfile.mkdtemp()
+    path = f"{directory}/faq.csv"
+    faq = [(f"How do I do thing number {i}?", f"You do thing {i} from the account page.") for i in range(args.rows)]
+    write_faq(path, faq)
+    print(f"{args.rows} rows, embedding API {args.call_ms:.0f} ms/call + {args.row_ms} ms/row, "
+          f"batch {args.batch_size}, concurrency {args.concurrency}")
+    print(f"{'scenario':>9} {'seconds':>8} {'rows/s':>9} {'embedded':>9} {'calls':>6} {'deleted':>8} {'saved':>7}")
+
+    # The previous ingestion: one sequential pass over every row, on every change
+    api = StubEmbeddingApi(args.call_ms, args.row_ms)
+    rows = read_faq_rows(path)
+    t0 = time.perf_counter()
+    ingest(LocalFaqIndex(api, "bench"), api, rows, batch_size=args.batch_size, concurrency=1)
+    full_seconds = time.perf_counter() - t0
+    full_rows, full_calls = api.rows, api.calls
+    print(f"{'full':>9} {full_seconds:>8.2f} {len(rows) / full_seconds:>9.0f} {api.rows:>9} {api.calls:>6} "
+          f"{'-':>8} {'-':>7}")
+
+    index = LocalFaqIndex(api, "bench", index_dir=f"{directory}/index")
+    for scenario in ("initial", "rerun", "edit"):
+        if scenario == "edit":
+            write_faq(path, edit_faq(faq, args.edit_share))
+        rows = read_faq_rows(path)
+        api.calls = api.rows = 0
+        report = ingest(index, api, rows, batch_size=args.batch_size, concurrency=args.concurrency)
+        index.persist()
+        saved = 1 - api.rows / len(rows)
+        print(f"{scenario:>9} {report.seconds:>8.2f} {report.rows_per_second:>9.0f} {api.rows:>9} {api.calls:>6} "
+              f"{report.deleted:>8} {saved:>7.1%}")
+    # Also what a restart sees: the persisted index, loaded memory-mapped
+    t0 = time.perf_counter()
+    reloaded = LocalFaqIndex(api, "bench", index_dir=f"{directory}/index")
+    print(f"\nreload of the persisted index: {reloaded.count()} rows in {(time.perf_counter() - t0) * 1000:.0f} ms; "
+          f"a full re-ingestion would embed {full_rows} rows in {full_calls} calls")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--rows", type=int, default=100_000)
+    parser.add_argument("--batch-size", type=int, default=256)
+    parser.add_argument("--concurrency", type=int, default=4)
+    parser.add_argument("--call-ms", type=float, default=150.0, help="embedding API latency per call")
+    parser.add_argument("--row-ms", type=float, default=0.5, help="embedding API time per row")
+    parser.add_argument("--edit-share", type=float, default=0.01, help="share edited (and deleted, and added)")
+    main(parser.parse_args())
@@ -0,0 +1,87 @@
+"""FAQ retrieval latency: in-process LocalFaqIndex versus a remote Chroma round-trip.
+
+The remote path is a stub that sleeps for a Google embedding call plus a Chroma
+Cloud query (the two network hops of the "chroma" backend). The local path
+encodes with ``--encode-ms`` of simulated CPU time, or with the real FastEmbed
+model when ``--real-encoder`` is given, then runs the vectorized top-k. Caches
+are bypassed so every query pays the full retrieval cost.
+
+Usage (from ``backend/``)::
+
+    uv run python -m benchmarks.faq_retrieval_benchmark --queries 200
+"""
+import argparse
+import logging
+import statistics
+import time
+import zlib
+
+import numpy as np
+
+from app.db.faq_index import LocalFaqIndex
+
+logging.getLogger("app").setLevel(logging.WARNING)
+
+
+def stub_encoder(encode_ms: float, dim: int = 384):
+    def encode(texts):
+        time.sleep(encode_ms / 1000)
+        return np.stack([
+            np.random.default_rng(zlib.crc32(text.encode())).standard_normal(dim).astype(np.float32)
+            for text in texts
+        ])
+    return encode
+
+
+class RemoteChromaStub:
+    """Embedding API call + Chroma Cloud query, as two sequential network hops."""
+
+    def __init__(self, embed_ms: float, query_ms: float):
+        self.embed_ms = embed_ms
+        self.query_ms = query_ms
+
+    def query(self, query_texts, n_results=5):
+        time.sleep(self.embed_ms / 1000)
+        time.sleep(self.query_ms / 1000)
+        return {"documents": [["doc"] * n_results], "metadatas": [[{}] * n_results], "distances": [[0.0] * n_results]}
+
+
+def measure(fn, queries):
+    latencies = []
+    for query in queries:
+        t0 = time.perf_counter()
+        fn(query)
+        latencies.append((time.perf_counter() - t0) * 1000)
+    cuts = statistics.quantiles(latencies, n=100)
+    return cuts[49], cuts[94]
+
+
+def main(args):
+    if args.real_encoder:
+        from app.services.router_search import encode_queries as encode
+    else:
+        encode = stub_encoder(args.encode_ms)
+    queries = [f"how do I return item {i}?" for i in range(args.queries)]
+
+    print(f"{'backend':>24} {'corpus':>8} {'p50 ms':>9} {'p95 ms':>9}")
+    remote = RemoteChromaStub(args.embed_ms, args.query_ms)
+    p50, p95 = measure(lambda q: remote.query(query_texts=[q], n_results=5), queries)
+    print(f"{'chroma (stubbed remote)':>24} {'-':>8} {p50:>9.2f} {p95:>9.2f}")
+
+    for size in args.corpus_sizes:
+        index = LocalFaqIndex(encode, "bench")
+        documents = [f"faq question {i}" for i in range(size)]
+        index.add([str(i) for i in range(size)], documents, [{"answer": "a"}] * size)
+        p50, p95 = measure(lambda q: index.query(query_texts=[q], n_results=5), queries)
+        print(f"{'local':>24} {size:>8} {p50:>9.2f} {p95:>9.2f}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--corpus-sizes", type=int, nargs="+", default=[10, 1_000, 50_000])
+    parser.add_argument("--encode-ms", type=float, default=4.0, help="simulated local FastEmbed encode time")
+    parser.add_argument("--embed-ms", type=float, default=120.0, help="simulated remote embedding call")
+    parser.add_argument("--query-ms", type=float, default=80.0, help="simulated Chroma Cloud query")
+    parser.add_argument("--real-encoder", action="store_true")
+    main(parser.parse_args())
@@ -0,0 +1,90 @@
+"""Intent classifier versus the LLM router on a synthetic routing log.
+
+Builds the real ``SemanticRouter`` (stub bag-of-words encoder by default, as
+in ``batch_routing_benchmark``), generates traffic from the route utterances
+with words dropped and noise added, and writes the app log the router would
+have produced: ``router.decision`` events (``semantic`` when the semantic
+router matched, otherwise ``llm`` with the utterance's route, a share of them
+flipped to model LLM mistakes) and ``router.llm`` latencies. Then runs the
+classifier's ``report``: held-out agreement with the LLM decisions, how many
+ambiguous queries it answers confidently, and latency next to the LLM's.
+
+Usage (from ``backend/``)::
+
+    uv run python -m benchmarks.intent_classifier_benchmark --queries 5000 --min-confidence 0.9
+"""
+import argparse
+import json
+import logging
+import random
+import tempfile
+import time
+
+from benchmarks.batch_routing_benchmark import install_stub_encoder
+
+
+def synthetic_log(router, n: int, path: str, llm_ms: float, llm_error: float, noise_words: int, seed: int = 0):
+    from app.services.router_search import check_routes
+    rng = random.Random(seed)
+    examples = [(u, route.name) for route in router.routes for u in route.utterances]
+    noise = ["please", "today", "thanks", "asap", "hmm", "again", "for my mom", "in bangkok", "i guess", "quickly",
+             "by friday", "or something", "my friend said", "a while ago", "not sure", "honestly"]
+    questions, truth = [], []
+    for _ in range(n):
+        utterance, route = rng.choice(examples)
+        words = utterance.split()
+        for _ in range(rng.randint(0, 2)):
+            if len(words) > 2:
+                words.pop(rng.randrange(len(words)))
+        questions.append(" ".join(words + rng.sample(noise, rng.randint(0, noise_words))))
+        truth.append(route)
+    routes = check_routes(questions)
+    names = [route.name for route in router.routes]
+    with open(path, "w", encoding="utf-8") as f:
+        for question, semantic, label in zip(questions, routes, truth):
+            if semantic is not None:
+                event = {"event": "router.decision", "query": question, "route": semantic, "source": "semantic"}
+            else:
+                if rng.random() < llm_error:
+                    label = rng.choice([name for name in names if name != label])
+                ms = rng.lognormvariate(0, 0.35) * llm_ms
+                f.write(json.dumps({"ts": "", "level": "INFO", "msg": json.dumps({"event": "router.llm", "ms": ms})}) + "\n")
+                event = {"event": "router.decision", "query": question, "route": label, "source": "llm"}
+            f.write(json.dumps({"ts": "", "level": "INFO", "msg": json.dumps(event)}) + "\n")
+    return sum(route is None for route in routes)
+
+
+def main(args):
+    if not args.real_encoder:
+        install_stub_encoder(0.0, 0.0)
+    from app.core.config import router_config
+    router_config.ROUTER_INDEX_DIR = None
+    from app.services import router_search
+    from app.services.intent_classifier import report
+    logging.getLogger("app").setLevel(logging.WARNING)
+    logging.getLogger("semantic_router").setLevel(logging.ERROR)
+
+    router_search._router = router_search.build_router(index_dir=tempfile.mkdtemp())
+    if args.route_threshold is not None:
+        # Bag-of-words vectors match far more easily than real embeddings; raise the bar to get ambiguous traffic
+        for route in router_search.get_router().routes:
+            router_search.get_router().set_threshold(route_name=route.name, threshold=args.route_threshold)
+    log_path = tempfile.mktemp(suffix=".log")
+    t0 = time.perf_counter()
+    ambiguous = synthetic_log(router_search.get_router(), args.queries, log_path, args.llm_ms, args.llm_error,
+                              args.noise_words)
+    print(f"{args.queries} queries, {ambiguous} ambiguous (LLM-routed); log built in {time.perf_counter() - t0:.1f}s")
+    report([log_path], args.min_confidence, args.test_share)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--queries", type=int, default=5_000)
+    parser.add_argument("--min-confidence", type=float, default=0.9)
+    parser.add_argument("--test-share", type=float, default=0.2)
+    parser.add_argument("--llm-ms", type=float, default=600.0, help="median LLM-router latency in the log")
+    parser.add_argument("--llm-error", type=float, default=0.03, help="share of LLM decisions that are wrong")
+    parser.add_argument("--noise-words", type=int, default=6, help="max filler phrases added per query")
+    parser.add_argument("--route-threshold", type=float, default=0.6, help="semantic-router threshold (all routes)")
+    parser.add_argument("--real-encoder", action="store_true", help="use the FastEmbed model (downloads it)")
+    main(parser.parse_args())
@@ -0,0 +1,130 @@
+"""LLM call latency and errors: direct client calls versus the LLM gateway.
+
+The provider is a stub with lognormal latency, occasional stalls (``--stall-rate``
+calls take ``--stall-factor`` times longer), random connection errors and a
+capacity: calls beyond ``--capacity`` in flight are rejected with 429, as a
+rate-limited API would. ``--requests`` calls run through each mode twice: as a
+burst (twice ``--capacity`` callers in flight) and as steady traffic (half of it):
+
+- ``direct``: one call per request, no limits or retries (the previous services);
+- ``gateway``: per-provider semaphore at the capacity, retries with backoff;
+- ``gateway+hedge``: the same plus hedged requests after the recent p95.
+
+Reports p50/p95/p99, failed requests and the extra provider calls spent.
+
+Usage (from ``backend/``)::
+
+    uv run python -m benchmarks.llm_gateway_benchmark --requests 2000 --capacity 32
+"""
+import argparse
+import asyncio
+import logging
+import random
+import statistics
+import time
+
+import httpx
+
+
+class StubProviderError(Exception):
+    def __init__(self, status_code: int):
+        super().__init__(f"HTTP {status_code}")
+        self.status_code = status_code
+
+
+class StubProvider:
+    """Chat-model stand-in (``ainvoke`` only) with tail latency, failures and a concurrency cap."""
+
+    def __init__(self, args, seed: int = 0):
+        self.args = args
+        self.rng = random.Random(seed)
+        self.in_flight = 0
+        self.calls = 0
+
+    async def ainvoke(self, messages, config=None, **kwargs):
+        self.calls += 1
+        if self.in_flight >= self.args.capacity:
+            await asyncio.sleep(0.005)
+            raise StubProviderError(429)
+        self.in_flight += 1
+        try:
+            latency = self.rng.lognormvariate(0, 0.3) * self.args.latency
+            if self.rng.random() < self.args.stall_rate:
+                latency *= self.args.stall_factor
+            await asyncio.sleep(latency)
+            if self.rng.random() < self.args.error_rate:
+                raise httpx.ConnectError("connection reset")
+            return "ok"
+        finally:
+            self.in_flight -= 1
+
+
+def percentile(values, q: int) -> float:
+    return statistics.quantiles(values, n=100, method="inclusive")[q - 1] if len(values) > 1 else values[0]
+
+
+async def run(label: str, invoke, provider: StubProvider, concurrency: int, args):
+    semaphore = asyncio.Semaphore(concurrency)
+    latencies, failures = [], 0
+
+    async def one():
+        nonlocal failures
+        async with semaphore:
+            t0 = time.perf_counter()
+            try:
+                await invoke()
+            except Exception:
+                failures += 1
+                return
+            latencies.append((time.perf_counter() - t0) * 1000)
+
+    await asyncio.gather(*(one() for _ in range(args.requests)))
+    extra = provider.calls / args.requests - 1
+    if not latencies:
+        print(f"{label:>14} {'-':>8} {'-':>8} {'-':>8} {failures:>8} {extra:>11.1%}")
+        return
+    print(f"{label:>14} {percentile(latencies, 50):>8.0f} {percentile(latencies, 95):>8.0f} "
+          f"{percentile(latencies, 99):>8.0f} {failures:>8} {extra:>11.1%}")
+
+
+async def main(args):
+    from app.core.config import llm_config
+    from app.services import llm_gateway as gateway_module
+
+    llm_config.LLM_MAX_CONCURRENCY = {"stub": args.capacity}
+    llm_config.LLM_TIMEOUT_SECONDS = args.timeout
+    llm_config.LLM_RETRY_BACKOFF_SECONDS = 0.05
+    logging.getLogger("app").setLevel(logging.WARNING)
+
+    for scenario, concurrency in (("burst", args.capacity * 2), ("steady", max(1, args.capacity // 2))):
+        print(f"{scenario} ({concurrency} callers, provider capacity {args.capacity})")
+        print(f"{'mode':>14} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8} {'failed':>8} {'extra calls':>11}")
+        provider = StubProvider(args)
+        await run("direct", lambda: provider.ainvoke([]), provider, concurrency, args)
+
+        for label, hedge in (("gateway", False), ("gateway+hedge", True)):
+            llm_config.LLM_HEDGE_ENABLED = hedge
+            provider = StubProvider(args)
+            gateway_module.PROVIDERS["stub"] = lambda gateway, model, **params: provider
+            gateway = gateway_module.LlmGateway()
+            chat = gateway.chat("stub", "stub-model", purpose="bench")
+            # Warm the latency histogram so hedging has a p95 from the start
+            for ms in (provider.rng.lognormvariate(0, 0.3) * args.latency * 1000 for _ in range(200)):
+                gateway._model_stats(chat.label).observe(ms)
+            await run(label, lambda: chat.ainvoke([]), provider, concurrency, args)
+            stats = gateway.stats()["models"][chat.label]
+            print(f"{'':>14} retries {stats['retries']}, timeouts {stats['timeouts']}, "
+                  f"hedges {stats['hedges']} (won {stats['hedge_wins']})")
+        print()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--requests", type=int, default=2000)
+    parser.add_argument("--capacity", type=int, default=32, help="provider calls in flight before 429s")
+    parser.add_argument("--latency", type=float, default=0.3, help="median provider seconds")
+    parser.add_argument("--stall-rate", type=float, default=0.05)
+    parser.add_argument("--stall-factor", type=float, default=6.0)
+    parser.add_argument("--error-rate", type=float, default=0.02, help="share of calls failing with a reset")
+    parser.add_argument("--timeout", type=float, default=5.0, help="LLM_TIMEOUT_SECONDS")
+    asyncio.run(main(parser.parse_args()))
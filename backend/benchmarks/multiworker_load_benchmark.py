@@ -0,0 +1,164 @@
+"""Throughput of ``app.serve`` as workers are added, with shared state.
+
+Starts the real server (``python -m app.serve``) on stubbed backends with 1, 2,
+4, ... workers, the SQLite checkpointer and the SQLite rate-limit storage,
+and drives it over HTTP:
+
+- throughput: ``--threads`` conversations of ``--turns`` turns each, without
+  keep-alive so consecutive turns of a conversation land on whichever worker
+  accepts the connection. Afterwards every thread's checkpoint must hold all
+  its turns, i.e. no turn lost its history by switching workers;
+- rate limit: ``--limit-requests`` requests from one client against a
+  ``--limit`` per minute limit, with the shared storage (accepted = limit
+  however many workers) and with per-process ``memory://`` (accepted grows
+  with the workers).
+
+Throughput only scales while there are free cores; the core count is printed.
+
+Usage (from ``backend/``)::
+
+    uv run python -m benchmarks.multiworker_load_benchmark --workers 1 2 4 --threads 200 --turns 3
+"""
+import argparse
+import asyncio
+import os
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+
+import httpx
+
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+class Server:
+    """``app.serve`` in a subprocess, on the stub backends."""
+
+    def __init__(self, workers: int, env: dict, llm_latency: float):
+        self.port = free_port()
+        self.url = f"http://127.0.0.1:{self.port}"
+        self.process = subprocess.Popen(
+            [sys.executable, "-m", "benchmarks.multiworker_load_benchmark", "--serve", str(workers),
+             "--port", str(self.port), "--llm-latency", str(llm_latency)],
+            env={**os.environ, **env, "STARTUP_WARMUP": "blocking", "LITELLM_LOCAL_MODEL_COST_MAP": "True"},
+            stdout=subprocess.DEVNULL,  # keep the app's prints out of the report
+        )
+
+    async def __aenter__(self):
+        async with httpx.AsyncClient() as client:
+            for _ in range(600):
+                if self.process.poll() is not None:
+                    raise RuntimeError(f"server exited with {self.process.returncode}")
+                try:
+                    if (await client.get(f"{self.url}/ping")).status_code == 200:
+                        return self
+                except httpx.TransportError:
+                    pass
+                await asyncio.sleep(0.1)
+        raise RuntimeError("server did not start")
+
+    async def __aexit__(self, *exc):
+        self.process.terminate()
+        self.process.wait(timeout=30)
+
+
+async def drive(url: str, threads: int, turns: int, concurrency: int, prefix: str) -> tuple[float, int]:
+    """Run every conversation's turns in order; returns (seconds, failed requests)."""
+    semaphore = asyncio.Semaphore(concurrency)
+    failed = 0
+    # No keep-alive: every turn is a new connection, accepted by any worker
+    limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=0)
+    async with httpx.AsyncClient(base_url=url, limits=limits, timeout=60) as client:
+        async def conversation(i: int):
+            nonlocal failed
+            for turn in range(turns):
+                async with semaphore:
+                    response = await client.post("/api/v1/chat", json={
+                        "question": f"product_inquiry question {i} turn {turn}", "thread_id": f"{prefix}-{i}"})
+                if response.status_code != 200:
+                    failed += 1
+
+        t0 = time.perf_counter()
+        await asyncio.gather(*(conversation(i) for i in range(threads)))
+        return time.perf_counter() - t0, failed
+
+
+def thread_turns(path: str, thread_ids: list[str]) -> list[int]:
+    """Human messages in each thread's latest checkpoint."""
+    from app.db.checkpointer import SqliteSaver
+    saver = SqliteSaver(path, ttl_seconds=3600)
+    counts = []
+    for thread_id in thread_ids:
+        result = saver.get_tuple({"configurable": {"thread_id": thread_id, "checkpoint_ns": ""}})
+        messages = result.checkpoint["channel_values"].get("messages", []) if result else []
+        counts.append(sum(m.type == "human" for m in messages))
+    return counts
+
+
+async def main(args):
+    workdir = tempfile.mkdtemp()
+    print(f"{os.cpu_count()} CPU cores; LLM stub latency {args.llm_latency * 1000:.0f} ms")
+    print(f"{'workers':>8} {'requests':>9} {'seconds':>8} {'req/s':>8} {'failed':>7} {'threads intact':>15}")
+    for workers in args.workers:
+        checkpoints = os.path.join(workdir, f"checkpoints-{workers}.sqlite")
+        env = {
+            "CHECKPOINTER": "sqlite",
+            "CHECKPOINT_SQLITE_PATH": checkpoints,
+            "RATE_LIMIT_STORAGE_URI": f"sqlite:///{workdir}/limits-{workers}.sqlite",
+            "RATE_LIMIT_CHAT": "1000000/minute",
+        }
+        async with Server(workers, env, args.llm_latency) as server:
+            await drive(server.url, args.concurrency, 1, args.concurrency, "warmup")
+            seconds, failed = await drive(server.url, args.threads, args.turns, args.concurrency, "bench")
+        counts = thread_turns(checkpoints, [f"bench-{i}" for i in range(args.threads)])
+        intact = sum(count == args.turns for count in counts)
+        requests = args.threads * args.turns
+        print(f"{workers:>8} {requests:>9} {seconds:>8.2f} {requests / seconds:>8.1f} {failed:>7} "
+              f"{intact:>7}/{args.threads:<7}")
+
+    print(f"\nrate limit {args.limit}/minute, {args.limit_requests} requests from one client")
+    print(f"{'workers':>8} {'storage':>8} {'accepted':>9}")
+    for workers in args.workers:
+        for storage in ("memory", "sqlite"):
+            uri = "memory://" if storage == "memory" else f"sqlite:///{workdir}/limit-check-{workers}.sqlite"
+            env = {"RATE_LIMIT_STORAGE_URI": uri, "RATE_LIMIT_CHAT": f"{args.limit}/minute"}
+            async with Server(workers, env, args.llm_latency) as server:
+                async with httpx.AsyncClient(base_url=server.url, timeout=60,
+                                             limits=httpx.Limits(max_keepalive_connections=0)) as client:
+                    responses = await asyncio.gather(*(
+                        client.post("/api/v1/chat", json={"question": "faq question", "thread_id": f"limit-{i}"})
+                        for i in range(args.limit_requests)
+                    ))
+            accepted = sum(r.status_code == 200 for r in responses)
+            print(f"{workers:>8} {storage:>8} {accepted:>9}")
+
+
+def serve(workers: int, port: int, llm_latency: float):
+    from benchmarks._stubs import install_stub_backends
+    install_stub_backends(llm_latency=llm_latency)
+    from app.serve import serve as run
+    run("127.0.0.1", port, workers, argparse.Namespace(log_level="warning"))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, 2, 4])
+    parser.add_argument("--threads", type=int, default=200, help="conversations")
+    parser.add_argument("--turns", type=int, default=3, help="turns per conversation")
+    parser.add_argument("--concurrency", type=int, default=64, help="requests in flight")
+    parser.add_argument("--llm-latency", type=float, default=0.05)
+    parser.add_argument("--limit", type=int, default=20, help="requests per minute in the rate-limit check")
+    parser.add_argument("--limit-requests", type=int, default=100)
+    parser.add_argument("--serve", type=int, metavar="WORKERS", help=argparse.SUPPRESS)
+    parser.add_argument("--port", type=int, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+    if args.serve:
+        serve(args.serve, args.port, args.llm_latency)
+    else:
+        asyncio.run(main(args))
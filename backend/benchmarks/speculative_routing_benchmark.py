@@ -0,0 +1,83 @@
+"""Turn latency with and without speculative routing (SPECULATIVE_ROUTING).
+
+Every fourth question is ambiguous for the semantic router, so it needs the
+LLM router; the LLM, vector store and Postgres are latency stubs (see
+``benchmarks._stubs``). With speculation the LLM router starts together with
+the semantic router and the likely destinations' retrieval/SQL step runs
+while it decides. Reports p50/p95 per mode, for all turns and for the
+ambiguous ones, plus what the speculation budget spent.
+
+Usage (from ``backend/``)::
+
+    uv run python -m benchmarks.speculative_routing_benchmark --requests 200 --llm-latency 0.6
+"""
+import argparse
+import asyncio
+import contextlib
+import io
+import statistics
+import time
+
+from benchmarks._stubs import install_stub_backends, synthetic_questions
+
+
+def percentile(values, q: float) -> float:
+    return statistics.quantiles(values, n=100, method="inclusive")[q - 1] if len(values) > 1 else values[0]
+
+
+async def run(module, ChatBotRequest, questions, concurrency: int, label: str):
+    semaphore = asyncio.Semaphore(concurrency)
+    latencies = [0.0] * len(questions)
+
+    async def one(i: int, question: str):
+        async with semaphore:
+            t0 = time.perf_counter()
+            await module.chat_bot_route(ChatBotRequest(question=question, thread_id=f"{label}-{i}"))
+            latencies[i] = (time.perf_counter() - t0) * 1000
+
+    # The graph nodes print route decisions; keep the report readable
+    with contextlib.redirect_stdout(io.StringIO()):
+        await asyncio.gather(*(one(i, q) for i, q in enumerate(questions)))
+    return latencies
+
+
+async def main(args):
+    module = install_stub_backends(llm_latency=args.llm_latency, db_latency=args.db_latency,
+                                   vector_latency=args.vector_latency, encode_latency=args.encode_latency)
+    from app.core.config import speculation_config
+    from app.core.startup import warm_up
+    from app.models.chat_bot_model import ChatBotRequest
+    from app.services.speculation import SpeculationBudget
+
+    if not args.plan_cache:
+        # Ambiguous product questions are mostly first-seen: their SQL comes from the LLM
+        from app.services import sql_query
+        sql_query.SQL_PLAN_CACHE = None
+    await warm_up()
+    questions = synthetic_questions(args.requests)
+    ambiguous = [i for i, q in enumerate(questions) if q.startswith("ambiguous")]
+
+    print(f"{'speculation':>12} {'p50 ms':>8} {'p95 ms':>8} {'ambig p50':>10} {'ambig p95':>10} "
+          f"{'starts':>7} {'used':>5} {'cancelled':>9} {'denied':>7}")
+    for enabled in (False, True):
+        speculation_config.SPECULATIVE_ROUTING = enabled
+        module.SPECULATION_BUDGET = SpeculationBudget(args.max_starts_per_minute)
+        latencies = await run(module, ChatBotRequest, questions, args.concurrency, f"spec-{enabled}")
+        hard = [latencies[i] for i in ambiguous]
+        stats = module.SPECULATION_BUDGET.stats()
+        print(f"{'on' if enabled else 'off':>12} {percentile(latencies, 50):>8.0f} {percentile(latencies, 95):>8.0f} "
+              f"{percentile(hard, 50):>10.0f} {percentile(hard, 95):>10.0f} {stats['started']:>7} "
+              f"{stats['used']:>5} {stats['cancelled']:>9} {stats['denied']:>7}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--requests", type=int, default=200)
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--llm-latency", type=float, default=0.6, help="seconds per LLM call")
+    parser.add_argument("--db-latency", type=float, default=0.02)
+    parser.add_argument("--vector-latency", type=float, default=0.05, help="FAQ retrieval seconds")
+    parser.add_argument("--encode-latency", type=float, default=0.02, help="semantic-router seconds")
+    parser.add_argument("--plan-cache", action="store_true", help="keep the SQL plan cache on")
+    parser.add_argument("--max-starts-per-minute", type=int, default=100_000, help="speculation cost cap")
+    asyncio.run(main(parser.parse_args()))
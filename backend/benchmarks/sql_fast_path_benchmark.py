@@ -0,0 +1,86 @@
+"""SQL fast path: share of product questions answered without LLM SQL generation.
+
+Runs product questions through ``SQLQueryService.sql_chain`` twice, with the
+rule-based fast path on and off. The LLM and Postgres are latency stubs, so
+the difference is the SQL-generation round-trip the fast path skips.
+
+Usage (from ``backend/``)::
+
+    uv run python -m benchmarks.sql_fast_path_benchmark --llm-latency 0.6
+"""
+import argparse
+import asyncio
+import random
+import statistics
+import time
+
+from benchmarks._stubs import FakeAsyncSession, catalog_brands, install_stub_backends
+
+# The product_inquiry route utterances (app/services/router_search.py)
+ROUTE_UTTERANCES = [
+    "How much are Nike shoes?", "Show me the price of mobile phones.", "Are there any discounts on shirts today?",
+    "Find cheap running shoes.", "What is the price of Samsung mobile phones?",
+    "Which mobile phones have the best rating?", "Show me top rated shirts.", "Find shoes with 5 star ratings.",
+    "Are Adidas shirts popular?", "Recommend mobile phones with good reviews.", "Which of those is the cheapest?",
+    "What products did you send me previously?", "Are Puma shoes in stock?",
+    "Check if you have any mobile phones available.", "Do you have shirts in stock?",
+    "I want to buy a mobile phone.", "Show me shirts from Nike.", "Do you sell shoes for running?",
+    "List all available mobile phones.", "Send me a link to buy shoes.", "Where can I order shirts?",
+]
+
+
+def templated_questions(n: int, seed: int = 0):
+    """Logged-traffic style mix: templated asks plus free-form and follow-up questions."""
+    rng = random.Random(seed)
+    brands = catalog_brands()
+    categories = ["shoes", "watches", "shirts", "cameras", "phones"]
+    templates = [
+        "cheapest {brand} {category}", "top rated {category}", "{category} under {price} baht",
+        "show me {brand} {category} in stock", "best {category} between {low} and {price} THB",
+        "any discounts on {category}?", "{brand} {category} with 4 stars or more",
+        # Free-form / follow-up: these need the LLM
+        "{category} for my dad who likes hiking", "which of those is waterproof?",
+        "something like the {brand} one but in blue",
+    ]
+    questions = []
+    for _ in range(n):
+        price = rng.choice([500, 1000, 2000, 5000])
+        questions.append(rng.choice(templates).format(
+            brand=rng.choice(brands), category=rng.choice(categories), price=price, low=price // 2,
+        ))
+    return questions
+
+
+async def run(sql_query, questions, enabled: bool, db_latency: float):
+    sql_query.sql_config.SQL_FAST_PATH_ENABLED = enabled
+    sql_query.FAST_PATH_STATS = stats = sql_query.FastPathStats()
+    # Every query pays the database round-trip, so only SQL generation differs between the runs
+    sql_query.SQL_RESULT_CACHE = None
+    latencies = []
+    for question in questions:
+        service = sql_query.SQLQueryService(db=FakeAsyncSession(db_latency))
+        t0 = time.perf_counter()
+        await service.sql_chain(question)
+        latencies.append((time.perf_counter() - t0) * 1000)
+    return statistics.median(latencies), statistics.mean(latencies), stats.stats()
+
+
+async def main(args):
+    install_stub_backends(llm_latency=args.llm_latency, db_latency=args.db_latency)
+    from app.services import sql_query
+
+    print(f"{'questions':>22} {'fast path':>10} {'hit rate':>9} {'p50 ms':>9} {'mean ms':>9} {'saved ms':>10}")
+    for label, questions in (("route utterances", ROUTE_UTTERANCES), ("templated mix", templated_questions(args.questions))):
+        off_p50, off_mean, _ = await run(sql_query, questions, False, args.db_latency)
+        p50, mean, stats = await run(sql_query, questions, True, args.db_latency)
+        print(f"{label:>22} {'off':>10} {'-':>9} {off_p50:>9.1f} {off_mean:>9.1f} {'':>10}")
+        print(f"{'':>22} {'on':>10} {stats['hit_rate']:>9.0%} {p50:>9.1f} {mean:>9.1f} "
+              f"{(off_mean - mean) * len(questions):>10.0f}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--questions", type=int, default=200)
+    parser.add_argument("--llm-latency", type=float, default=0.6, help="seconds per LLM call (SQL and summary)")
+    parser.add_argument("--db-latency", type=float, default=0.01)
+    asyncio.run(main(parser.parse_args()))
@@ -0,0 +1,119 @@
+"""SQL result cache: repeated popular product searches with and without ``SQL_RESULT_CACHE``.
+
+Draws ``--requests`` questions from ``--distinct`` templated product
+questions with Zipf popularity, as real traffic repeats a few searches
+("cheapest mobile phones", "top rated shirts") far more than the rest. Each
+question runs through ``SQLQueryService.fetch_rows`` (fast-path SQL, then
+``run_sql_query``) against a stub database that sleeps ``--db-latency`` per
+query. The LLM is a zero-latency stub.
+
+Halfway through the cached run, the catalog version is bumped, as a
+``catalog_loader`` run would. The version is re-read on every query here
+(``version_check_seconds=0``), so the drop is immediate and shows up in the
+hit ratio. Reports request latency, queries that reached the database, hit
+ratio, database time saved, and the cache's size, with the size of one
+cached result as tuples versus as a DataFrame.
+
+Usage (from ``backend/``)::
+
+    uv run python -m benchmarks.sql_result_cache_benchmark --requests 5000 --db-latency 0.02
+"""
+import argparse
+import asyncio
+import random
+import statistics
+import time
+import tracemalloc
+
+import numpy as np
+
+from benchmarks._stubs import FakeAsyncSession, FakeResult, install_stub_backends
+from benchmarks.sql_fast_path_benchmark import templated_questions
+
+CATALOG_VERSION = [1]
+
+
+class VersionedSession(FakeAsyncSession):
+    """Stub session with a ``catalog_version`` table; counts the product queries that reach it."""
+
+    queries = 0
+
+    async def execute(self, statement, params=None):
+        sql = str(statement)
+        if "to_regclass" in sql:
+            return FakeResult([("catalog_version",)], ["to_regclass"])
+        if "FROM catalog_version" in sql:
+            return FakeResult([(CATALOG_VERSION[0],)], ["version"])
+        if "set_config" not in sql and "DISTINCT brand" not in sql:
+            VersionedSession.queries += 1
+        return await super().execute(statement, params)
+
+
+def zipf_workload(questions: list[str], n: int, seed: int = 0) -> list[str]:
+    rng = random.Random(seed)
+    weights = [1 / rank ** 1.1 for rank in range(1, len(questions) + 1)]
+    return rng.choices(questions, weights=weights, k=n)
+
+
+async def run(sql_query, workload: list[str], db_latency: float, cache) -> list[float]:
+    sql_query.SQL_RESULT_CACHE = cache
+    VersionedSession.queries = 0
+    latencies = []
+    for i, question in enumerate(workload):
+        if cache is not None and i == len(workload) // 2:
+            CATALOG_VERSION[0] += 1
+        service = sql_query.SQLQueryService(db=VersionedSession(db_latency))
+        t0 = time.perf_counter()
+        await service.fetch_rows(question)
+        latencies.append((time.perf_counter() - t0) * 1000)
+    return latencies
+
+
+def allocated(build, copies: int = 1000) -> int:
+    # Many copies, so allocator free lists do not hide the cost of the first few
+    tracemalloc.start()
+    values = [build() for _ in range(copies)]
+    size, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    del values
+    return size // copies
+
+
+def tuple_vs_dataframe(rows: list[dict]) -> tuple[int, int]:
+    """Bytes allocated to hold ``rows`` (values shared) as the cache's tuples and as a DataFrame."""
+    import pandas as pd
+
+    compact = allocated(lambda: (tuple(rows[0]), tuple(tuple(r.values()) for r in rows)))
+    return compact, allocated(lambda: pd.DataFrame(rows))
+
+
+async def main(args):
+    install_stub_backends(llm_latency=0.0, db_latency=args.db_latency)
+    from app.services import sql_query
+    from app.services.sql_result_cache import SqlResultCache
+
+    workload = zipf_workload(templated_questions(args.distinct), args.requests)
+    print(f"{args.requests} requests over {args.distinct} distinct questions (Zipf), "
+          f"db latency {args.db_latency * 1000:.0f} ms")
+    print(f"{'cache':>8} {'p50 ms':>8} {'p99 ms':>8} {'mean ms':>8} {'db queries':>11}")
+    for label in ("off", "on"):
+        cache = SqlResultCache(capacity=args.capacity, max_bytes=args.max_bytes, ttl_seconds=600,
+                               version_check_seconds=0) if label == "on" else None
+        latencies = await run(sql_query, workload, args.db_latency, cache)
+        print(f"{label:>8} {statistics.median(latencies):>8.2f} {np.percentile(latencies, 99):>8.2f} "
+              f"{statistics.mean(latencies):>8.2f} {VersionedSession.queries:>11}")
+    print(f"\ncache: {cache.stats()}")
+
+    rows = await sql_query.SQLQueryService(db=VersionedSession(0)).fetch_rows("cheapest shoes")
+    compact, frame = tuple_vs_dataframe(rows)
+    print(f"one {len(rows)}-row result allocates {compact:,} bytes as tuples, {frame:,} bytes as a DataFrame")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--requests", type=int, default=5000)
+    parser.add_argument("--distinct", type=int, default=500, help="distinct questions in the traffic")
+    parser.add_argument("--db-latency", type=float, default=0.02, help="seconds per stub database query")
+    parser.add_argument("--capacity", type=int, default=2048)
+    parser.add_argument("--max-bytes", type=int, default=32 * 2**20)
+    asyncio.run(main(parser.parse_args()))
@@ -0,0 +1,98 @@
+"""Memory of one product query: the previous fetchall + DataFrame path versus streaming.
+
+The query is an unbounded ``SELECT *`` over a large product table (the query
+guard's row cap is lifted to the table size to show the worst case the
+streaming path protects against). Peak Python allocations are measured with
+``tracemalloc``.
+
+By default the table is a stub session generating ``--rows`` catalog-shaped
+rows, handed out lazily when streamed (a server-side cursor) and all at once
+by ``fetchall``. With ``--table`` the query runs against the real database
+behind ``DATABASE_URL`` (e.g. the ``bench`` schema left by
+``product_index_benchmark --keep``).
+
+Usage (from ``backend/``)::
+
+    uv run python -m benchmarks.sql_result_memory_benchmark --rows 1000000
+"""
+import argparse
+import asyncio
+import time
+import tracemalloc
+
+from benchmarks._stubs import FakeResult, install_stub_backends
+
+COLUMNS = ["id", "product_link", "title", "brand", "discount", "avg_rating", "total_ratings", "availability",
+           "category", "price", "search_tsv"]
+
+
+class LargeTableSession:
+    """``SELECT *`` over ``rows`` synthetic products; nothing exists until it is fetched."""
+
+    def __init__(self, rows: int):
+        self.rows = rows
+
+    def _rows(self):
+        for i in range(self.rows):
+            title = f"Brand {i % 2000} Waterproof Running Sneakers {i:08x}"
+            yield (i, f"https://www.amazon.com/dp/B{i:09d}", title, f"Brand {i % 2000}", 0.15, 4.3, i % 5000,
+                   "In Stock", "shoes", 1490.0 + i % 500, f"'brand':1 'run':4 'sneaker':5 'waterproof':3 '{i:08x}':6")
+
+    async def execute(self, statement, params=None):
+        if "set_config" in str(statement):
+            return FakeResult([("",)], ["set_config"])
+        if "to_regclass" in str(statement):
+            return FakeResult([(None,)], ["to_regclass"])
+        return FakeResult(self._rows(), COLUMNS)
+
+    async def stream(self, statement, params=None):
+        return FakeResult(self._rows(), COLUMNS)
+
+
+async def materialize(db, sql: str):
+    """The previous ``run_sql_query`` + ``data_comprehension`` row handling."""
+    import pandas as pd
+    from sqlalchemy import text
+    result = await db.execute(text(sql))
+    df = pd.DataFrame(result.fetchall(), columns=result.keys())
+    return df.to_dict(orient="records")[:10]
+
+
+async def measure(label: str, fn, db, sql: str):
+    tracemalloc.start()
+    t0 = time.perf_counter()
+    rows = await fn(db, sql)
+    seconds = time.perf_counter() - t0
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    print(f"{label:>24} {peak / 2**20:>12.2f} {seconds * 1000:>10.1f} {len(rows):>6}")
+
+
+async def main(args):
+    if args.table is None:
+        install_stub_backends(llm_latency=0.0, db_latency=0.0)
+    from app.core.config import sql_config
+    from app.services.sql_query import SQLQueryService
+
+    sql = f"SELECT * FROM {args.table or 'public.amazon_product_data'}"
+
+    async def stream(db, sql):
+        # Lift the guard's LIMIT so both paths see the same unbounded query
+        sql_config.SQL_MAX_ROWS = args.rows
+        return await SQLQueryService(db).run_sql_query(sql)
+
+    print(f"{'path':>24} {'peak MiB':>12} {'ms':>10} {'rows':>6}")
+    for label, fn in (("fetchall + DataFrame", materialize), ("stream (run_sql_query)", stream)):
+        if args.table is None:
+            await measure(label, fn, LargeTableSession(args.rows), sql)
+        else:
+            from app.db.postgresdb import get_async_db
+            async with get_async_db() as db:
+                await measure(label, fn, db, sql)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--rows", type=int, default=250_000, help="stub table size (row cap with --table)")
+    parser.add_argument("--table", help="real table to query instead of the stub, e.g. bench.amazon_product_data")
+    asyncio.run(main(parser.parse_args()))
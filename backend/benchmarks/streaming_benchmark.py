@@ -0,0 +1,53 @@
+"""Time-to-first-token of /chat/stream versus the buffered /chat response.
+
+Uses the stubbed backends from ``benchmarks._stubs``; the stub LLM spreads its
+latency over the reply tokens when streamed, like a real provider would.
+
+Usage (from ``backend/``)::
+
+    uv run python -m benchmarks.streaming_benchmark --requests 30
+"""
+import argparse
+import asyncio
+import contextlib
+import io
+import statistics
+import time
+
+from benchmarks._stubs import install_stub_backends
+
+
+def pct(values, q):
+    return statistics.quantiles(values, n=100)[q - 1] * 1000 if len(values) > 1 else values[0] * 1000
+
+
+async def main(args):
+    module = install_stub_backends(llm_latency=args.llm_latency)
+    from app.models.chat_bot_model import ChatBotRequest
+
+    questions = [f"{route} question {i}" for i in range(args.requests) for route in ("product_inquiry", "small_talk")]
+    buffered, first_token, stream_total = [], [], []
+    with contextlib.redirect_stdout(io.StringIO()):
+        for i, question in enumerate(questions):
+            t0 = time.perf_counter()
+            await module.chat_bot_route(ChatBotRequest(question=question, thread_id=f"buffered-{i}"))
+            buffered.append(time.perf_counter() - t0)
+
+            t0 = time.perf_counter()
+            first = None
+            async for frame in module.chat_bot_stream(ChatBotRequest(question=question, thread_id=f"stream-{i}")):
+                if first is None and frame.startswith("event: token"):
+                    first = time.perf_counter() - t0
+            first_token.append(first)
+            stream_total.append(time.perf_counter() - t0)
+
+    print(f"{'mode':>22} {'p50 ms':>10} {'p95 ms':>10}")
+    for name, values in (("/chat (first byte)", buffered), ("/chat/stream TTFT", first_token), ("/chat/stream total", stream_total)):
+        print(f"{name:>22} {pct(values, 50):>10.1f} {pct(values, 95):>10.1f}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--requests", type=int, default=30)
+    parser.add_argument("--llm-latency", type=float, default=0.3)
+    asyncio.run(main(parser.parse_args()))